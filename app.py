@@ -1,39 +1,19 @@
 import streamlit as st
-import pandas as pd
 import logging
 import os
-import psycopg2
-import torch
+import uuid
 import datetime
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import mplcyberpunk
 
-from utils.cv_reader import read_resume_from_file
-from utils.github_reader import extract_github_links_from_text
 from utils.constants import (
     competency_list,
     profession_matrix,
     profession_names,
     recommendations,
-    THRESHOLD)
-from utils.email import (
-    get_gmail_service,
-    send_email_custom,
-    send_bulk_mail,
-    send_confirmation_email,
-)
-from utils.cached_app_utils import (
-    preprocess_cached,
-    collect_github_text_cached,
-    load_model_safe,
-    validate_candidate_form,
-    save_application_to_db,
-)
+    GITHUB_ENRICHMENT,
+    HR_STATEMENT_TIMEOUT_MS)
 
-import psycopg2
-import psycopg2.errors
+# Тяжёлые модули (torch/transformers, matplotlib, psycopg2, Google API)
+# импортируются лениво внутри ветки нужной роли — экран выбора роли их не ждёт.
 
 # ─── Общие настройки ────────────────────────────────────────────────────────────
 os.makedirs("logs", exist_ok=True)
@@ -42,7 +22,6 @@ logging.basicConfig(
     level=logging.ERROR,
     format="%(asctime)s — %(levelname)s — %(message)s"
 )
-plt.style.use('cyberpunk')
 st.set_page_config(
     page_title="Анализ резюме по матрице Альянса ИИ",
     page_icon="others/logo.png",
@@ -60,14 +39,33 @@ if st.session_state.role is None:
     choice = st.radio("", ["Кандидат", "HR-специалист"])
     if st.button("Продолжить"):
         st.session_state.role = "candidate" if choice == "Кандидат" else "hr"
+        # Сразу показываем выбранный поток, а не ждём следующего действия
+        st.rerun()
     st.stop()
 
 # ─── Поток кандидата ───────────────────────────────────────────────────────────
 if st.session_state.role == "candidate":
+    import psycopg2.errors
+    from utils.cached_app_utils import (
+        build_candidate_pipeline,
+        validate_candidate_form,
+        save_application_to_db,
+        start_enrichment_worker,
+    )
+    from utils.email import send_confirmation_email
+    from utils.pipeline import StageState, run_dag
+    from utils.predictions import thresholds_vector
+    from utils.session_store import blob_path, candidate_sessions, put_blob
+
+    start_enrichment_worker()
+
     st.title("Анализ резюме по матрице Альянса ИИ")
 
     if "form_filled" not in st.session_state:
         st.session_state.form_filled = False
+    # В состоянии сессии только ссылки; тексты и векторы — в candidate_sessions
+    if "candidate_sid" not in st.session_state:
+        st.session_state.candidate_sid = uuid.uuid4().hex
 
     # Шаг 1: форма
     if not st.session_state.form_filled:
@@ -137,105 +135,151 @@ if st.session_state.role == "candidate":
             st.error("❌ Файл больше 10 MB, загрузите меньший.")
             st.stop()
 
-        tmp_dir = "temp"
-        os.makedirs(tmp_dir, exist_ok=True)
-        tmp_path = os.path.join(tmp_dir, uploaded_file.name)
-        with open(tmp_path, "wb") as f:
-            f.write(uploaded_file.read())
+        # Файл пишется один раз в хранилище по хешу содержимого; в сессии — только handle
+        cv_blob = put_blob(uploaded_file.getvalue(), uploaded_file.name)
+        st.session_state.cv_blob = cv_blob
+
+        stages = build_candidate_pipeline(blob_path(cv_blob))
+        stage_icons = {"pending": "⏸️", "running": "⏳", "done": "✅", "error": "❌", "skipped": "⏭️"}
+        with st.status("⏳ Анализ резюме...", expanded=True) as status_box:
+            stage_rows = {s.name: st.empty() for s in stages}
+            labels = {s.name: s.label for s in stages}
+
+            def show_stage(name, state):
+                timing = f" — {state.elapsed:.1f} с" if state.status in ("done", "error") else ""
+                stage_rows[name].markdown(f"{stage_icons[state.status]} {labels[name]}{timing}")
+
+            for s in stages:
+                show_stage(s.name, StageState())
+            result = run_dag(stages, on_update=show_stage)
+            status_box.update(
+                label=f"Анализ завершён за {result.total_seconds:.1f} с",
+                state="error" if result.failed() else "complete",
+                expanded=False,
+            )
 
-        try:
-            with st.spinner("⏳ Извлечение и предобработка текста..."):
-                raw = read_resume_from_file(tmp_path)
-                if not raw or not raw.strip():
-                    st.error("❌ Не удалось извлечь текст резюме.")
-                    st.stop()
-
-                links = extract_github_links_from_text(raw)
-                st.session_state.gh_links = links
-                gh_text = ""
-                if links:
-                    st.markdown("🔗 **GitHub-ссылки:**")
-                    for link in links:
-                        st.markdown(f"- {link}")
-                        try:
-                            gh_text += " " + collect_github_text_cached(link)
-                        except Exception:
-                            st.warning(f"Ошибка при загрузке GitHub-текста {link}")
-                combined = raw + " " + gh_text
-                text = preprocess_cached(combined)
-
-            with st.spinner("🤖 Загрузка модели и анализ резюме..."):
-                tokenizer, model = load_model_safe()
-                inputs = tokenizer(text, return_tensors="pt", padding=True,
-                                   truncation=True, max_length=512)
-                with torch.no_grad():
-                    logits = model(**inputs).logits
-                probs = torch.sigmoid(logits).squeeze().cpu().numpy()
-                preds = (probs > THRESHOLD).astype(int)
-
-                st.session_state.prob_vector = probs
-                st.session_state.pred_vector = preds
-                st.session_state.uploaded_file = uploaded_file
-
-            tab = st.tabs(["Оценка грейдов"])[0]
-            with tab:
-                st.subheader("Оцените уровень владения компетенциями (0–3):")
-                user_grades = []
-                c1, c2 = st.columns(2)
-                for i, comp in enumerate(competency_list):
-                    default = 1 if preds[i] else 0
-                    with (c1 if i % 2 == 0 else c2):
-                        grade = st.radio(comp, [0, 1, 2, 3], index=default,
-                                         horizontal=True, key=f"grade_{i}")
-                        user_grades.append(grade)
-                st.session_state.user_grades = user_grades
-                st.success("✅ Грейды сохранены!")
-
-                # Кнопка отправки заявки
-                if not st.session_state.get("submitted"):
-                    if st.button("Отправить заявку"):
-                        try:
-                            rec_id = save_application_to_db()
-                        except psycopg2.errors.UniqueViolation as e:
-                            cn = e.diag.constraint_name
-                            if cn == "uq_resume_phone":
-                                st.error("Заявка с этим номером телефона уже отправлена.")
-                            elif cn == "uq_resume_sender_email":
-                                st.error("Заявка с этим email уже отправлена.")
-                            elif cn == "uq_resume_telegram_handle":
-                                st.error("Заявка с этим Telegram-никнеймом уже отправлена.")
-                            else:
-                                st.error("Заявка с такими данными уже существует.")
-                            logging.warning("Duplicate application prevented", exc_info=True)
-                        except Exception as e:
-                            st.error("Произошла ошибка при сохранении заявки. Попробуйте ещё раз.")
-                            logging.error("Error saving application", exc_info=True)
+        failed = result.failed()
+        if "extract" in failed:
+            st.error("❌ Не удалось извлечь текст резюме.")
+            st.stop()
+        if result.states["inference"].status != "done":
+            st.error("Не удалось загрузить модель. Проверьте токен или соединение.")
+            st.stop()
+
+        links = result["links"]
+        if links:
+            st.markdown("🔗 **GitHub-ссылки:**")
+            for link in links:
+                st.markdown(f"- {link}")
+            for link in result["github"][1]:
+                st.warning(f"Ошибка при загрузке GitHub-текста {link}")
+            if GITHUB_ENRICHMENT == "async":
+                st.info("Репозитории GitHub будут проанализированы после отправки заявки — "
+                        "оценка обновится автоматически.")
+
+        probs, embedding = result["inference"]
+        preds = (probs > thresholds_vector()).astype("int8")
+
+        st.session_state.pred_vector = preds
+        if not st.session_state.get("submitted"):
+            candidate_sessions.put(
+                st.session_state.candidate_sid, cv_blob,
+                filename=uploaded_file.name,
+                links=links,
+                probs=probs,
+                embedding=embedding,
+                resume_text=result["extract"],
+                github_text=result["github"][0],
+            )
+
+        tab = st.tabs(["Оценка грейдов"])[0]
+        with tab:
+            st.subheader("Оцените уровень владения компетенциями (0–3):")
+            user_grades = []
+            c1, c2 = st.columns(2)
+            for i, comp in enumerate(competency_list):
+                default = 1 if preds[i] else 0
+                with (c1 if i % 2 == 0 else c2):
+                    grade = st.radio(comp, [0, 1, 2, 3], index=default,
+                                     horizontal=True, key=f"grade_{i}")
+                    user_grades.append(grade)
+            st.session_state.user_grades = user_grades
+            st.success("✅ Грейды сохранены!")
+
+            # Кнопка отправки заявки
+            if not st.session_state.get("submitted"):
+                if st.button("Отправить заявку"):
+                    try:
+                        rec_id = save_application_to_db()
+                    except psycopg2.errors.UniqueViolation as e:
+                        cn = e.diag.constraint_name
+                        if cn == "uq_resume_phone":
+                            st.error("Заявка с этим номером телефона уже отправлена.")
+                        elif cn == "uq_resume_sender_email":
+                            st.error("Заявка с этим email уже отправлена.")
+                        elif cn == "uq_resume_telegram_handle":
+                            st.error("Заявка с этим Telegram-никнеймом уже отправлена.")
                         else:
-                            # пробуем отправить письмо и смотрим на результат
-                            sent = send_confirmation_email(
-                                st.session_state.email,
-                                rec_id,
-                                st.session_state.name,
-                                st.session_state.selected_professions
+                            st.error("Заявка с такими данными уже существует.")
+                        logging.warning("Duplicate application prevented", exc_info=True)
+                    except Exception as e:
+                        st.error("Произошла ошибка при сохранении заявки. Попробуйте ещё раз.")
+                        logging.error("Error saving application", exc_info=True)
+                    else:
+                        # пробуем отправить письмо и смотрим на результат
+                        sent = send_confirmation_email(
+                            st.session_state.email,
+                            rec_id,
+                            st.session_state.name,
+                            st.session_state.selected_professions
+                        )
+                        if sent:
+                            st.success(
+                                f"✅ Ваша заявка №{rec_id} принята! "
+                                f"Письмо подтверждения отправлено на {st.session_state.email}"
                             )
-                            if sent:
-                                st.success(
-                                    f"✅ Ваша заявка №{rec_id} принята! "
-                                    f"Письмо подтверждения отправлено на {st.session_state.email}"
-                                )
-                                st.session_state.submitted = True
-                            # если sent == False, то внутри функции уже вывели st.error, флаг submitted не ставим
-                else:
-                    st.info("Вы уже отправили заявку.")
+                            st.session_state.submitted = True
+                            candidate_sessions.discard(st.session_state.candidate_sid)
+                        # если sent == False, то внутри функции уже вывели st.error, флаг submitted не ставим
+            else:
+                st.info("Вы уже отправили заявку.")
 
-        finally:
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
 
 # ─── Поток HR-специалиста ─────────────────────────────────────────────────────
 elif st.session_state.role == "hr":
+    import numpy as np
+    import pandas as pd
+    import psycopg2
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm
+    import mplcyberpunk
+    from utils.email import send_bulk_mail
+    from utils.cache import CACHES, all_cache_stats
+    from utils.vector_store import get_index as get_vector_index
+    from utils.dedup import (
+        DUPLICATE_THRESHOLD, duplicate_clusters, recent_duplicates, ensure_schema as ensure_dedup_schema,
+    )
+    from utils.scoring import score_columns
+    from utils.hr_queries import build_where, candidates_sql, cv_files_sql, overview_sql
+    from utils.query_cache import cached_read_sql, feed as change_feed
+    from utils.query_runner import QueryCancelled, QueryTimeout, stats as query_stats
+    from utils.predictions import ensure_schema as ensure_predictions_schema
+    from utils.search import ensure_schema as ensure_search_schema, escape_markdown, snippet_markdown
+    from utils.export import (
+        FORMATS as EXPORT_FORMATS, XLSX_MAX_ROWS, discard as discard_export, get_job as get_export_job,
+        read_result as read_export, start_export,
+    )
+
+    plt.style.use('cyberpunk')
+
+    # Виджеты разделов HR, чьё состояние нужно сохранять при переключении
+    HR_WIDGET_PREFIXES = (
+        "filter_date_", "filter_hr_", "filter_git_", "req1_", "req2_", "req3_",
+        "filter_secprof_", "min_score_", "max_score_", "filter_search_", "filter_sort_",
+        "bulk_thr_", "export_fmt_", "cv_zip_scope_",
+        "sim_mode", "sim_k", "sim_id", "sim_query", "dup_threshold", "trend_by",
+    )
+
     # 1. Флаг аутентификации
     if "hr_authenticated" not in st.session_state:
         st.session_state.hr_authenticated = False
@@ -247,6 +291,7 @@ elif st.session_state.role == "hr":
         if st.button("Войти"):
             if pwd == "duduki":
                 st.session_state.hr_authenticated = True
+                st.rerun()
             else:
                 st.error("Неверный пароль")
         st.stop()
@@ -254,241 +299,332 @@ elif st.session_state.role == "hr":
     # 3. Главное окно HR
     st.title("Панель HR-специалиста")
 
-    # 5 вкладок: 4×профессии + Общая сводка
+    # 5 разделов: 4×профессии + Общая сводка. В отличие от st.tabs,
+    # на каждом перезапуске выполняется только выбранный раздел
     tab_labels = profession_names + ["Общая сводка"]
-    tabs = st.tabs(tab_labels)
+    view = st.radio("Раздел", tab_labels, horizontal=True, key="hr_view", label_visibility="collapsed")
+
+    # Значения по умолчанию кладутся в session_state один раз, а виджеты создаются
+    # без value=/index=: иначе переприсваивание ниже вызывает предупреждение
+    # Streamlit о значении, заданном и параметром, и через Session State
+    hr_defaults = {"sim_k": 10, "dup_threshold": DUPLICATE_THRESHOLD}
+    for i in range(len(profession_names)):
+        hr_defaults.update({
+            f"filter_date_{i}": (datetime.date.today() - datetime.timedelta(days=30), datetime.date.today()),
+            f"min_score_{i}": 0.0,
+            f"max_score_{i}": 100.0,
+            f"filter_sort_{i}": "По убыванию",
+            f"bulk_thr_{i}": 50.0,
+        })
+    for key, value in hr_defaults.items():
+        if key not in st.session_state:
+            st.session_state[key] = value
+
+    # Streamlit удаляет состояние виджетов, которые не были отрисованы;
+    # переприсваивание сохраняет фильтры невыбранных разделов
+    for key in list(st.session_state.keys()):
+        if key.startswith(HR_WIDGET_PREFIXES):
+            st.session_state[key] = st.session_state[key]
+
+    # Метка сессии для запросов HR: новый запрос раздела отменяет прежний
+    if "hr_query_session" not in st.session_state:
+        st.session_state.hr_query_session = uuid.uuid4().hex[:12]
+
+    def hr_read_sql(section, sql, params=None, **kwargs):
+        """
+        cached_read_sql с индикатором выполнения. Обновление индикатора даёт
+        Streamlit прервать устаревший прогон — запрос тогда отменяется в БД.
+        """
+        status = st.empty()
+        session = st.session_state.hr_query_session
+        try:
+            df = cached_read_sql(section, sql, params, session=session,
+                                 on_wait=lambda s: status.caption(f"⏳ Запрос выполняется… {s:.1f} с"),
+                                 **kwargs)
+        except QueryCancelled:
+            status.info("Запрос отменён: фильтры изменились.")
+            st.stop()
+        except QueryTimeout:
+            status.warning(f"Запрос прерван: дольше {HR_STATEMENT_TIMEOUT_MS / 1000:g} с. Сузьте фильтры.")
+            st.stop()
+        last = query_stats.last(session, section)
+        if last is None or last["status"] == "cache":
+            status.caption("Данные из кэша")
+        else:
+            status.caption(f"Запрос выполнен за {last['ms']:.0f} мс")
+        return df
+
+    def export_download_button(job, key):
+        """
+        Готовая выгрузка отдаётся только внутри сессии HR; после скачивания
+        файл и задание удаляются.
+        """
+        data = read_export(job)
+        if data is None:
+            st.info("Файл уже скачан или устарел — сформируйте его заново.")
+            return
+        st.download_button(f"⬇️ Скачать {job.filename}", data, file_name=job.filename, mime=job.mime,
+                           key=key, on_click=discard_export, args=(job.id,))
+
+    change_feed.start()
+    feed_mode = {"listen": "LISTEN/NOTIFY", "polling": "опрос БД"}.get(change_feed.mode, "подключение")
+    st.caption(f"Данные обновлены {datetime.datetime.fromtimestamp(change_feed.last_change):%H:%M:%S} "
+               f"(отслеживание изменений: {feed_mode})")
 
     # Маппинг профессии на столбец score
-    score_mapping = {
-        "Аналитик данных":           "datan_score",
-        "Менеджер в ИИ":             "ai_manager_score",
-        "Технический аналитик в ИИ": "techan_score",
-        "Инженер данных":            "daten_score",
-    }
-
-    for idx, prof in enumerate(profession_names):
-        with tabs[idx]:
-            st.subheader(f"Вакансия: {prof}")
-
-            # —— Фильтры ——————————————————————————————————————
-            with st.expander("🔍 Фильтры", expanded=True):
-                # Даты
-                date_range = st.date_input(
-                    "Период заявок",
-                    value=(
-                        datetime.date.today() - datetime.timedelta(days=30),
-                        datetime.date.today()
-                    ),
-                    key=f"filter_date_{idx}"
-                )
-                # HR-email
-                hr_emails = st.multiselect(
-                    "HR Email",
-                    options=[],
-                    key=f"filter_hr_{idx}"
-                )
-                # GitHub
-                git_choice = st.selectbox(
-                    "GitHub",
-                    ["Любой", "Да", "Нет"],
-                    key=f"filter_git_{idx}"
-                )
-                # Обязательные компетенции по грейдам
-                st.markdown("**Обязательные компетенции по грейдам**")
-                req1 = st.multiselect(
-                    "Грейд 1",
-                    options=competency_list,
-                    key=f"req1_{idx}"
-                )
-                req2 = st.multiselect(
-                    "Грейд 2",
-                    options=[c for c in competency_list if c not in req1],
-                    key=f"req2_{idx}"
-                )
-                req3 = st.multiselect(
-                    "Грейд 3",
-                    options=[c for c in competency_list if c not in req1 + req2],
-                    key=f"req3_{idx}"
-                )
-                # Вторая профессия
-                other_profs = ["Не важно"] + [p for p in profession_names if p != prof]
-                sec_prof = st.selectbox(
-                    "Ещё одна профессия",
-                    other_profs,
-                    key=f"filter_secprof_{idx}"
-                )
-                # Диапазон % соответствия
-                col1, col2 = st.columns(2)
-                min_score = col1.number_input(
-                    "% от", min_value=0.0, max_value=100.0, value=0.0, step=0.1,
-                    key=f"min_score_{idx}"
-                )
-                max_score = col2.number_input(
-                    "% до", min_value=0.0, max_value=100.0, value=100.0, step=0.1,
-                    key=f"max_score_{idx}"
-                )
-                # Сортировка по score
-                sort_asc = st.radio(
-                    "Сортировать по % соответствия",
-                    ["По убыванию", "По возрастанию"],
-                    index=0,
-                    key=f"filter_sort_{idx}"
-                )
-
-            # —— Запрос данных и сортировка ——————————————————————
-            score_col = score_mapping[prof]
-            conditions = ["%s = ANY(selected_professions)"]
-            params = [prof]
-
-            start_date, end_date = date_range
-            conditions.append("uploaded_at::date BETWEEN %s AND %s")
-            params += [start_date, end_date]
-            if hr_emails:
-                conditions.append("hr_email = ANY(%s)")
-                params.append(hr_emails)
-            if git_choice != "Любой":
-                conditions.append("git_available = %s")
-                params.append(git_choice == "Да")
-            for comp in req1:
-                conditions.append("%s = ANY(grade1)")
-                params.append(comp)
-            for comp in req2:
-                conditions.append("%s = ANY(grade2)")
-                params.append(comp)
-            for comp in req3:
-                conditions.append("%s = ANY(grade3)")
-                params.append(comp)
-            if sec_prof != "Не важно":
-                conditions.append("%s = ANY(selected_professions)")
-                params.append(sec_prof)
-            conditions.append(f"{score_col} BETWEEN %s AND %s")
-            params += [min_score, max_score]
-            where_clause = " AND ".join(conditions)
-
-            sql = f"""
-                SELECT
-                    id,
-                    form_submitted_at,
-                    uploaded_at,
-                    sender_email,
-                    name,
-                    surname,
-                    patronymic,
-                    telegram_handle,
-                    phone,
-                    {score_col} AS score,
-                    git_available,
-                    selected_professions,
-                    code,
-                    hr_email,
-                    grade0,
-                    grade1,
-                    grade2,
-                    grade3,
-                    original_filename
-                FROM resume_records
-                WHERE {where_clause};
-            """
-            conn = psycopg2.connect(host="localhost", dbname="resumes", user="appuser", password="duduki")
-            df = pd.read_sql(sql, conn, params=params, parse_dates=["uploaded_at"]
+    score_mapping = score_columns
+
+    if view in profession_names:
+        idx, prof = profession_names.index(view), view
+        st.subheader(f"Вакансия: {prof}")
+
+        # —— Фильтры ——————————————————————————————————————
+        with st.expander("🔍 Фильтры", expanded=True):
+            # Даты
+            date_range = st.date_input(
+                "Период заявок",
+                key=f"filter_date_{idx}"
+            )
+            # HR-email
+            hr_emails = st.multiselect(
+                "HR Email",
+                options=[],
+                key=f"filter_hr_{idx}"
+            )
+            # GitHub
+            git_choice = st.selectbox(
+                "GitHub",
+                ["Любой", "Да", "Нет"],
+                key=f"filter_git_{idx}"
+            )
+            # Обязательные компетенции по грейдам
+            st.markdown("**Обязательные компетенции по грейдам**")
+            req1 = st.multiselect(
+                "Грейд 1",
+                options=competency_list,
+                key=f"req1_{idx}"
+            )
+            req2 = st.multiselect(
+                "Грейд 2",
+                options=[c for c in competency_list if c not in req1],
+                key=f"req2_{idx}"
+            )
+            req3 = st.multiselect(
+                "Грейд 3",
+                options=[c for c in competency_list if c not in req1 + req2],
+                key=f"req3_{idx}"
+            )
+            # Вторая профессия
+            other_profs = ["Не важно"] + [p for p in profession_names if p != prof]
+            sec_prof = st.selectbox(
+                "Ещё одна профессия",
+                other_profs,
+                key=f"filter_secprof_{idx}"
+            )
+            # Диапазон % соответствия
+            col1, col2 = st.columns(2)
+            min_score = col1.number_input(
+                "% от", min_value=0.0, max_value=100.0, step=0.1,
+                key=f"min_score_{idx}"
             )
-            conn.close()
+            max_score = col2.number_input(
+                "% до", min_value=0.0, max_value=100.0, step=0.1,
+                key=f"max_score_{idx}"
+            )
+            # Полнотекстовый поиск
+            search_query = st.text_input(
+                "Поиск по тексту резюме и GitHub",
+                placeholder="например: airflow kafka, \"data vault\", spark -hadoop",
+                key=f"filter_search_{idx}"
+            ).strip()
+            # Сортировка по score
+            sort_asc = st.radio(
+                "Сортировать по % соответствия",
+                ["По убыванию", "По возрастанию"],
+                key=f"filter_sort_{idx}"
+            )
+
+        # —— Запрос данных и сортировка ——————————————————————
+        where_clause, params = build_where(
+            prof, date_range, hr_emails, git_choice, req1, req2, req3,
+            sec_prof, min_score, max_score, search_query
+        )
+        sql, sql_params = candidates_sql(prof, where_clause, params, search=search_query)
+
+        def prepare_candidates(conn):
+            ensure_predictions_schema(conn)
+            if search_query:
+                ensure_search_schema(conn)
 
-            ascending = (sort_asc == "По возрастанию")
+        df = hr_read_sql(
+            prof, sql, sql_params,
+            prepare=prepare_candidates,
+            parse_dates=["uploaded_at"]
+        )
+
+        ascending = (sort_asc == "По возрастанию")
+        if search_query:
+            # При поиске — сначала самые релевантные
+            df = df.sort_values(["rank", "score"], ascending=[False, ascending]).reset_index(drop=True)
+        else:
             df = df.sort_values("score", ascending=ascending).reset_index(drop=True)
 
-            # —— Фильтрация и рассылка —————————————————————————
-            filter_key = f"filter_passed_{idx}"
-            if filter_key not in st.session_state:
-                st.session_state[filter_key] = False
-            col_thr, col_filter, col_send = st.columns([2,1,1])
-            with col_thr:
-                bulk_threshold = st.number_input(
-                    "Порог % для массовой рассылки", min_value=0.0, max_value=100.0,
-                    value=50.0, step=0.1, key=f"bulk_thr_{idx}"
+        # —— Фильтрация и рассылка —————————————————————————
+        filter_key = f"filter_passed_{idx}"
+        if filter_key not in st.session_state:
+            st.session_state[filter_key] = False
+        col_thr, col_filter, col_send = st.columns([2,1,1])
+        with col_thr:
+            bulk_threshold = st.number_input(
+                "Порог % для массовой рассылки", min_value=0.0, max_value=100.0,
+                step=0.1, key=f"bulk_thr_{idx}"
+            )
+        with col_filter:
+            if st.button("Показать прошедших", key=f"filter_btn_{idx}"):
+                st.session_state[filter_key] = True
+        with col_send:
+            bulk_send = st.button(f"📤 Отправить письма для «{prof}»", key=f"bulk_send_{idx}")
+
+        if st.session_state[filter_key]:
+            st.subheader(f"Кандидаты с соответствием ≥ {bulk_threshold}%")
+
+            # 1) статистика — показываем сразу
+            total   = len(df)
+            passed  = len(df[df["score"] >= bulk_threshold])
+            percent = (passed / total * 100) if total else 0.0
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Всего кандидатов", total)
+            c2.metric(f"Кандидатов ≥{bulk_threshold}%", passed)
+            c3.metric("Доля прошедших", f"{percent:.1f}%")
+            st.caption("Нажмите кнопку «📤 Отправить письма», чтобы разослать уведомления выбранным кандидатам.")
+
+            # 2) затем сама таблица
+            df_passed = df[df["score"] >= bulk_threshold].reset_index(drop=True)
+            st.dataframe(df_passed, use_container_width=True)
+
+        if search_query:
+            st.subheader(f"Найдено по запросу «{search_query}»: {len(df)}")
+            for _, row in df.head(20).iterrows():
+                # Имя и фрагмент — текст кандидата: экранируем, чтобы резюме не вставило ссылки и картинки
+                st.markdown(f"**{escape_markdown(row['surname'])} {escape_markdown(row['name'])}** "
+                            f"(id {row['id']}, {row['score']:.1f}%) — …{snippet_markdown(row['snippet'])}…")
+
+        st.subheader(f"Все кандидаты по вакансии «{prof}»")
+        st.dataframe(df, use_container_width=True)
+
+        # —— Выгрузка в файл ——————————————————————————————————
+        with st.expander("📥 Выгрузить кандидатов в файл"):
+            formats = [f for f in EXPORT_FORMATS if f != "XLSX" or len(df) <= XLSX_MAX_ROWS]
+            ec1, ec2 = st.columns(2)
+            fmt_label = ec1.selectbox("Формат", formats, key=f"export_fmt_{idx}")
+            job_key = f"export_job_{idx}"
+            if ec2.button("Сформировать файл", key=f"export_btn_{idx}", disabled=df.empty):
+                order_by = "score ASC" if ascending else "score DESC"
+                if search_query:
+                    order_by = "rank DESC, " + order_by
+                job = start_export(
+                    *candidates_sql(prof, where_clause, params, order_by, search_query),
+                    EXPORT_FORMATS[fmt_label],
+                    f"candidates_{score_mapping[prof]}_{datetime.date.today():%Y%m%d}",
                 )
-            with col_filter:
-                if st.button("Показать прошедших", key=f"filter_btn_{idx}"):
-                    st.session_state[filter_key] = True
-            with col_send:
-                bulk_send = st.button(f"📤 Отправить письма для «{prof}»", key=f"bulk_send_{idx}")
-
-            if st.session_state[filter_key]:
-                st.subheader(f"Кандидаты с соответствием ≥ {bulk_threshold}%")
-
-                # 1) статистика — показываем сразу
-                total   = len(df)
-                passed  = len(df[df["score"] >= bulk_threshold])
-                percent = (passed / total * 100) if total else 0.0
-                c1, c2, c3 = st.columns(3)
-                c1.metric("Всего кандидатов", total)
-                c2.metric(f"Кандидатов ≥{bulk_threshold}%", passed)
-                c3.metric("Доля прошедших", f"{percent:.1f}%")
-                st.caption("Нажмите кнопку «📤 Отправить письма», чтобы разослать уведомления выбранным кандидатам.")
-
-                # 2) затем сама таблица
-                df_passed = df[df["score"] >= bulk_threshold].reset_index(drop=True)
-                st.dataframe(df_passed, use_container_width=True)
-
-            st.subheader(f"Все кандидаты по вакансии «{prof}»")
-            st.dataframe(df, use_container_width=True)
-
-            if bulk_send:
-                sent_A = sent_B = skipped = 0
-                for _, row in df.iterrows():
-                    above = row["score"] >= bulk_threshold
-                    ok = send_bulk_mail(row, prof, bulk_threshold, above)
-                    if ok:
-                        sent_A += above
-                        sent_B += (not above)
-                    else:
-                        skipped += 1
-                st.success(
-                    f"✅ Письма отправлены:\n"
-                    f"  Кандидаты, которые больше порога (≥{bulk_threshold}%): {sent_A}\n."
-                    f"  Кандидаты, которые меньше порога (<{bulk_threshold}%): {sent_B}\n."
-                    f"  Пропущено из-за ошибок/некорректных email: {skipped}.")
-
-            st.markdown("### 📖 Описание полей таблицы")
-            descriptions = {
-                "id":                   "Уникальный идентификатор заявки",
-                "form_submitted_at":    "Дата и время отправки формы кандидата",
-                "uploaded_at":          "Дата и время загрузки резюме",
-                "sender_email":         "Email кандидата",
-                "name":                 "Имя кандидата",
-                "surname":              "Фамилия кандидата",
-                "patronymic":           "Отчество кандидата",
-                "telegram_handle":      "Telegram-ник кандидата",
-                "phone":                "Телефон кандидата (+7XXXXXXXXXX)",
-                "score":                f"Процент соответствия профилю «{prof}»",
-                "git_available":        "Наличие GitHub-ссылки",
-                "selected_professions": "Профессии, выбранные кандидатом",
-                "code":                 "Внутренний код заявки",
-                "hr_email":             "Email HR-специалиста, принявшего заявку",
-                "grade0":               "Компетенции с грейдом 0",
-                "grade1":               "Грейды 1",
-                "grade2":               "Грейды 2",
-                "grade3":               "Грейды 3",
-                "original_filename":    "Имя загруженного файла резюме"
-            }
-            items = list(descriptions.items())
-            half = (len(items) + 1) // 2
-            col1, col2 = st.columns(2)
-            for key, txt in items[:half]: col1.markdown(f"**{key}** — {txt}")
-            for key, txt in items[half:]: col2.markdown(f"**{key}** — {txt}")
+                st.session_state[job_key] = job.id
+            job = get_export_job(st.session_state.get(job_key, ""))
+            if job is not None:
+                if job.status == "running":
+                    st.info("⏳ Файл формируется в фоне…")
+                    st.button("🔄 Обновить статус", key=f"export_refresh_{idx}")
+                elif job.status == "done":
+                    st.success(f"✅ Выгружено строк: {job.rows} за {job.finished - job.started:.1f} с")
+                    export_download_button(job, f"export_dl_{idx}")
+                else:
+                    st.error(f"Не удалось сформировать файл: {job.error}")
+
+        with st.expander("🗂️ Скачать исходные резюме (zip)"):
+            zc1, zc2 = st.columns(2)
+            zip_scope = zc1.radio(
+                "Кого включить",
+                ["Все отфильтрованные", f"Прошедшие порог (≥{bulk_threshold}%)"],
+                key=f"cv_zip_scope_{idx}"
+            )
+            zip_key = f"cv_zip_job_{idx}"
+            if zc2.button("Собрать архив", key=f"cv_zip_btn_{idx}", disabled=df.empty):
+                zip_where, zip_params = where_clause, list(params)
+                if zip_scope != "Все отфильтрованные":
+                    zip_where += f" AND {score_mapping[prof]} >= %s"
+                    zip_params.append(bulk_threshold)
+                job = start_export(
+                    cv_files_sql(zip_where), zip_params, "zip",
+                    f"cv_{score_mapping[prof]}_{datetime.date.today():%Y%m%d}",
+                )
+                st.session_state[zip_key] = job.id
+            job = get_export_job(st.session_state.get(zip_key, ""))
+            if job is not None:
+                if job.status == "running":
+                    st.info("⏳ Архив собирается в фоне…")
+                    st.button("🔄 Обновить статус", key=f"cv_zip_refresh_{idx}")
+                elif job.status == "done":
+                    st.success(f"✅ Резюме в архиве: {job.rows}")
+                    if job.note:
+                        st.warning(job.note)
+                    export_download_button(job, f"cv_zip_dl_{idx}")
+                else:
+                    st.error(f"Не удалось собрать архив: {job.error}")
+
+        if bulk_send:
+            sent_A = sent_B = skipped = 0
+            for _, row in df.iterrows():
+                above = row["score"] >= bulk_threshold
+                ok = send_bulk_mail(row, prof, bulk_threshold, above)
+                if ok:
+                    sent_A += above
+                    sent_B += (not above)
+                else:
+                    skipped += 1
+            st.success(
+                f"✅ Письма отправлены:\n"
+                f"  Кандидаты, которые больше порога (≥{bulk_threshold}%): {sent_A}\n."
+                f"  Кандидаты, которые меньше порога (<{bulk_threshold}%): {sent_B}\n."
+                f"  Пропущено из-за ошибок/некорректных email: {skipped}.")
+
+        st.markdown("### 📖 Описание полей таблицы")
+        descriptions = {
+            "id":                   "Уникальный идентификатор заявки",
+            "form_submitted_at":    "Дата и время отправки формы кандидата",
+            "uploaded_at":          "Дата и время загрузки резюме",
+            "sender_email":         "Email кандидата",
+            "name":                 "Имя кандидата",
+            "surname":              "Фамилия кандидата",
+            "patronymic":           "Отчество кандидата",
+            "telegram_handle":      "Telegram-ник кандидата",
+            "phone":                "Телефон кандидата (+7XXXXXXXXXX)",
+            "score":                f"Процент соответствия профилю «{prof}»",
+            "git_available":        "Наличие GitHub-ссылки",
+            "selected_professions": "Профессии, выбранные кандидатом",
+            "code":                 "Внутренний код заявки",
+            "hr_email":             "Email HR-специалиста, принявшего заявку",
+            "grade0":               "Компетенции с грейдом 0",
+            "grade1":               "Грейды 1",
+            "grade2":               "Грейды 2",
+            "grade3":               "Грейды 3",
+            "original_filename":    "Имя загруженного файла резюме",
+            "model_version":        "Версия модели, посчитавшей вероятности",
+            "model_competencies":   "Компетенции, которые модель видит при текущих порогах"
+        }
+        items = list(descriptions.items())
+        half = (len(items) + 1) // 2
+        col1, col2 = st.columns(2)
+        for key, txt in items[:half]: col1.markdown(f"**{key}** — {txt}")
+        for key, txt in items[half:]: col2.markdown(f"**{key}** — {txt}")
 
 # ─── Пятая вкладка — общий дашборд ─────────────────────────────────────────────
-    with tabs[-1]:
+    else:
         st.subheader("Общая сводка по всем профессиям")
 
-        # 1. Загрузим все данные из БД
-        conn = psycopg2.connect(host="localhost", dbname="resumes", user="appuser", password="duduki")
-        df_all = pd.read_sql(
-            "SELECT * FROM resume_records",
-            conn,
+        # 1. Загрузим все заявки из БД (без файлов резюме)
+        df_all = hr_read_sql(
+            "overview", overview_sql(),
             parse_dates=["uploaded_at", "form_submitted_at"]
         )
-        conn.close()
 
         # 2. Ключевые метрики
         total_apps     = len(df_all)
@@ -580,4 +716,112 @@ elif st.session_state.role == "hr":
             st.bar_chart(
                 df_top.set_index("Компетенция")["Частота"],
                 use_container_width=True
-            )
\ No newline at end of file
+            )
+
+        # ─── Квартальные тренды из колоночного снимка ──────────────────────────────
+        with st.expander("📈 Тренды по кварталам"):
+            from utils.analytics import trend, funnel
+            trend_by = st.radio("Разрез", ["Все заявки", "Профессии", "HR"], horizontal=True, key="trend_by")
+            by = {"Все заявки": None, "Профессии": "profession", "HR": "hr"}[trend_by]
+            try:
+                df_trend = trend(by)
+            except FileNotFoundError:
+                st.info("Снимок истории ещё не собран: `python -m utils.analytics export` (по расписанию).")
+            else:
+                if by is None:
+                    st.line_chart(df_trend.set_index("period")["applications"])
+                else:
+                    group_col = "profession" if by == "profession" else "hr_email"
+                    st.line_chart(df_trend.pivot(index="period", columns=group_col, values="applications"))
+                st.dataframe(df_trend, use_container_width=True)
+                st.markdown("**Воронка по профессиям**")
+                st.dataframe(funnel(), use_container_width=True)
+
+        # ─── Похожие кандидаты ────────────────────────────────────────────────────
+        with st.expander("🔎 Похожие кандидаты"):
+            sim_mode = st.radio("Искать похожих на", ["Заявку", "Текстовый запрос"],
+                                horizontal=True, key="sim_mode")
+            sim_k = st.slider("Сколько кандидатов показать", 1, 50, key="sim_k")
+            if sim_mode == "Заявку":
+                # Подписи одним проходом: format_func вызывается для каждого варианта на каждом прогоне
+                sim_labels = dict(zip(
+                    df_all["id"].tolist(),
+                    (df_all["surname"].fillna("") + " " + df_all["name"].fillna("")).str.strip().tolist(),
+                ))
+                sim_id = st.selectbox("Заявка", list(sim_labels), key="sim_id",
+                                      format_func=lambda i: f"{i} — {sim_labels[i]}")
+            else:
+                sim_query = st.text_area("Опишите нужного кандидата", key="sim_query",
+                                         placeholder="например: airflow, kafka, spark, построение витрин данных")
+            if st.button("Найти похожих", key="sim_find"):
+                conn = psycopg2.connect(host="localhost", dbname="resumes", user="appuser", password="duduki")
+                try:
+                    index = get_vector_index(conn)
+                finally:
+                    conn.close()
+                if sim_mode == "Заявку":
+                    query_vec, exclude = index.vector_of(sim_id), sim_id
+                else:
+                    from utils.cached_app_utils import load_model_safe
+                    from utils.cv_reader import preprocess_text
+                    from utils.inference_client import analyze_text
+                    query_vec, exclude = analyze_text(preprocess_text(sim_query), load_model=load_model_safe)[1], None
+                if query_vec is None:
+                    st.warning("Для этой заявки нет эмбеддинга. Запустите `python -m utils.vector_store backfill`.")
+                else:
+                    hits = index.search(query_vec, k=sim_k, exclude_id=exclude)
+                    sim_df = pd.DataFrame(hits, columns=["id", "similarity"]).merge(
+                        df_all[["id", "surname", "name", "sender_email"] + list(score_mapping.values())],
+                        on="id", how="left"
+                    )
+                    st.dataframe(sim_df, use_container_width=True)
+
+        # ─── Почти-дубликаты резюме ───────────────────────────────────────────────
+        with st.expander("🧬 Почти-дубликаты резюме"):
+            if st.button("Показать повторные подачи", key="dup_recent"):
+                conn = psycopg2.connect(host="localhost", dbname="resumes", user="appuser", password="duduki")
+                try:
+                    ensure_dedup_schema(conn)
+                    recent = recent_duplicates(conn)
+                finally:
+                    conn.close()
+                if recent:
+                    st.markdown("**Заявки, похожие на уже поданные** (найдены при отправке)")
+                    st.dataframe(pd.DataFrame(recent), use_container_width=True)
+                else:
+                    st.info("Повторных подач не найдено.")
+            dup_threshold = st.slider("Порог сходства", 0.5, 1.0, step=0.05, key="dup_threshold")
+            if st.button("Найти кластеры дубликатов", key="dup_find"):
+                conn = psycopg2.connect(host="localhost", dbname="resumes", user="appuser", password="duduki")
+                try:
+                    ensure_dedup_schema(conn)
+                    clusters = duplicate_clusters(conn, dup_threshold)
+                finally:
+                    conn.close()
+                if not clusters:
+                    st.info("Почти-дубликатов не найдено.")
+                info_cols = ["id", "surname", "name", "sender_email", "phone", "original_filename", "uploaded_at"]
+                for i, cluster in enumerate(clusters, 1):
+                    st.markdown(f"**Кластер {i}** — заявок: {len(cluster)}")
+                    st.dataframe(
+                        df_all[df_all["id"].isin(cluster)][info_cols].reset_index(drop=True),
+                        use_container_width=True
+                    )
+            st.caption("Для заявок, поданных до появления индекса, запустите `python -m utils.dedup backfill`.")
+
+        # ─── Состояние кэшей процесса ─────────────────────────────────────────────
+        with st.expander("⚙️ Кэши приложения"):
+            st.dataframe(pd.DataFrame(all_cache_stats()), use_container_width=True)
+            st.markdown("**Запросы панели HR** (ok — выполнен, cache — из кэша, cancelled — отменён, "
+                        "timeout — прерван по statement_timeout)")
+            st.dataframe(pd.DataFrame(query_stats.stats()), use_container_width=True)
+            from utils.session_store import candidate_sessions
+            session_stats = candidate_sessions.stats()
+            st.markdown(f"**Сессии кандидатов**: {session_stats['sessions']} "
+                        f"(в памяти {session_stats['in_memory']}, на диске {session_stats['on_disk']}; "
+                        f"удалено по простою {session_stats['dropped']})")
+            st.dataframe(pd.DataFrame(candidate_sessions.report()), use_container_width=True)
+            if st.button("Очистить кэши", key="clear_caches"):
+                for cache in CACHES.values():
+                    cache.clear()
+                st.success("Кэши очищены.")
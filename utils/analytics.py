@@ -0,0 +1,373 @@
+"""
+Колоночный снимок истории заявок для квартальных трендов.
+
+    python -m utils.analytics export                 # дописать новые заявки (cron раз в час/сутки)
+    python -m utils.analytics export --every 3600    # то же в цикле
+    python -m utils.analytics compact                # склеить мелкие файлы в секциях
+    python -m utils.analytics report trend --by profession
+    python -m utils.analytics report grades --since 2024-01-01
+    python -m utils.analytics report funnel
+
+Экспортёр дописывает новые строки resume_records (без файлов, текстов и
+личных данных) в Parquet, секционированный по году и месяцу загрузки:
+ANALYTICS_DIR/year=2025/month=3/part-….parquet. Водяной знак — последний
+выгруженный id; заявки выгружаются, когда им больше ANALYTICS_SETTLE_HOURS,
+чтобы успела пройти дозагрузка GitHub. Архивированные секции (utils.partitioning)
+при полной пересборке берутся из resume_summary.
+
+Отчёты читают снимок через pyarrow.dataset: только нужные колонки и
+секции, агрегации в Arrow, в pandas попадает уже свёрнутый результат.
+Тяжёлые выборки по всей истории не ходят в рабочую БД.
+"""
+import os
+import json
+import time
+import uuid
+import glob
+import logging
+import argparse
+import datetime
+
+from utils.constants import profession_names
+from utils.db import get_connection
+from utils.export import arrow_batch, arrow_schema, iter_chunks
+from utils.predictions import ensure_schema as ensure_predictions_schema
+from utils.scoring import score_columns
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR", os.path.join("analytics", "resume_records"))
+# Через сколько часов после загрузки заявка считается устоявшейся
+ANALYTICS_SETTLE_HOURS = float(os.environ.get("ANALYTICS_SETTLE_HOURS", "24"))
+CHUNK_ROWS = 20000
+
+# Без файлов, текстов и контактов кандидата
+ANALYTICS_COLUMNS = [
+    "id", "uploaded_at", "form_submitted_at", "hr_email", "git_available", "selected_professions",
+    "grade0", "grade1", "grade2", "grade3",
+    "ai_manager_score", "techan_score", "datan_score", "daten_score",
+    "competency_probs", "model_version",
+]
+SCORE_COLUMNS = list(score_columns.values())
+
+_STATE_FILE = "_state.json"
+
+
+# ─── Состояние экспорта ───────────────────────────────────────────────────────
+def _read_state(base_dir: str) -> dict:
+    path = os.path.join(base_dir, _STATE_FILE)
+    if not os.path.exists(path):
+        return {"last_id": 0, "rows": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_state(base_dir: str, state: dict):
+    path = os.path.join(base_dir, _STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def _recover(base_dir: str, state: dict) -> dict:
+    """Убирает следы прерванного запуска: недописанную выгрузку и незаконченное склеивание."""
+    run = state.pop("pending_run", None)
+    if run:
+        for path in glob.glob(os.path.join(base_dir, "**", f"part-{run}-*.parquet"), recursive=True):
+            os.remove(path)
+        logger.warning(f"Удалены файлы прерванной выгрузки {run}")
+    job = state.pop("compacting", None)
+    if job and os.path.exists(os.path.join(job["dir"], job["tmp"])):
+        # Склеенный файл записан: дочищаем исходные и открываем его
+        for name in job["files"]:
+            if os.path.exists(os.path.join(job["dir"], name)):
+                os.remove(os.path.join(job["dir"], name))
+        os.replace(os.path.join(job["dir"], job["tmp"]), os.path.join(job["dir"], job["tmp"][1:]))
+    for path in glob.glob(os.path.join(base_dir, "**", "_compact-*.parquet"), recursive=True):
+        os.remove(path)  # недописанный склеенный файл, исходные на месте
+    return state
+
+
+# ─── Выгрузка ─────────────────────────────────────────────────────────────────
+def _source(conn) -> str:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('resume_summary')")
+        found = cur.fetchone()[0]
+    conn.commit()
+    return "resume_summary" if found else "resume_records"
+
+def _upper_bound(conn, source: str, last_id: int, settle_hours: float) -> int | None:
+    """Максимальный id устоявшихся заявок; всё между водяным знаком и им выгружается целиком."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT max(id) FROM {source} WHERE id > %s "
+                    f"AND uploaded_at < now() - make_interval(secs => %s)", (last_id, settle_hours * 3600))
+        upper = cur.fetchone()[0]
+    conn.commit()
+    return upper
+
+def _with_partition_keys(batch):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    uploaded = batch.column("uploaded_at")
+    return pa.Table.from_batches([batch]).append_column(
+        "year", pc.cast(pc.year(uploaded), pa.int16())
+    ).append_column(
+        "month", pc.cast(pc.month(uploaded), pa.int8())
+    )
+
+def export(base_dir: str = ANALYTICS_DIR, settle_hours: float = ANALYTICS_SETTLE_HOURS,
+           rebuild: bool = False) -> int:
+    """Дописывает в снимок заявки с id больше водяного знака. Возвращает число строк."""
+    import shutil
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if rebuild and os.path.isdir(base_dir):
+        shutil.rmtree(base_dir)
+    os.makedirs(base_dir, exist_ok=True)
+    state = _recover(base_dir, _read_state(base_dir))
+
+    conn = get_connection()
+    try:
+        ensure_predictions_schema(conn)
+        source = _source(conn)
+        upper = _upper_bound(conn, source, state["last_id"], settle_hours)
+    finally:
+        conn.close()
+    if upper is None:
+        _write_state(base_dir, state)
+        return 0
+
+    run = uuid.uuid4().hex[:12]
+    state["pending_run"] = run
+    _write_state(base_dir, state)
+
+    partitioning = ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive")
+    options = ds.ParquetFileFormat().make_write_options(compression="zstd")
+    sql = (f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM {source} "
+           f"WHERE id > %s AND id <= %s AND uploaded_at IS NOT NULL ORDER BY id")
+    rows = 0
+    for i, (description, chunk) in enumerate(iter_chunks(sql, (state["last_id"], upper), CHUNK_ROWS)):
+        schema = arrow_schema(description)
+        batch = arrow_batch(description, chunk, schema)
+        ds.write_dataset(
+            _with_partition_keys(batch), base_dir, format="parquet", partitioning=partitioning,
+            basename_template=f"part-{run}-{i}-{{i}}.parquet", file_options=options,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        rows += len(chunk)
+
+    state.pop("pending_run")
+    state.update(last_id=upper, rows=state["rows"] + rows,
+                 updated_at=datetime.datetime.now().isoformat(timespec="seconds"))
+    _write_state(base_dir, state)
+    logger.info(f"В снимок дописано {rows} заявок, водяной знак id={upper}")
+    return rows
+
+def compact(base_dir: str = ANALYTICS_DIR) -> int:
+    """Склеивает файлы каждой секции года/месяца в один. Возвращает число склеенных секций."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    state = _recover(base_dir, _read_state(base_dir))
+    _write_state(base_dir, state)
+    done = 0
+    for part_dir in sorted(glob.glob(os.path.join(base_dir, "year=*", "month=*"))):
+        files = sorted(glob.glob(os.path.join(part_dir, "part-*.parquet")))
+        if len(files) < 2:
+            continue
+        table = pa.concat_tables([pq.read_table(f) for f in files]).sort_by("id")
+        # Файлы с "_" pyarrow не читает — склеенный станет виден только после переименования
+        name = f"_compact-{uuid.uuid4().hex[:12]}.parquet"
+        pq.write_table(table, os.path.join(part_dir, name), compression="zstd")
+        state["compacting"] = {"dir": part_dir, "tmp": name, "files": [os.path.basename(f) for f in files]}
+        _write_state(base_dir, state)
+        for f in files:
+            os.remove(f)
+        os.replace(os.path.join(part_dir, name), os.path.join(part_dir, name[1:]))
+        state.pop("compacting")
+        _write_state(base_dir, state)
+        done += 1
+    return done
+
+
+# ─── Запросы к снимку ─────────────────────────────────────────────────────────
+def dataset(base_dir: str = ANALYTICS_DIR):
+    import pyarrow.dataset as ds
+    if not os.path.isdir(base_dir) or not glob.glob(os.path.join(base_dir, "year=*")):
+        raise FileNotFoundError(f"Снимок {base_dir} пуст: python -m utils.analytics export")
+    return ds.dataset(base_dir, format="parquet", partitioning="hive")
+
+def load(columns: list[str], since: datetime.date | None = None, base_dir: str = ANALYTICS_DIR):
+    """Таблица Arrow: только columns, секции с since и новее."""
+    import pyarrow.dataset as ds
+    flt = None
+    if since is not None:
+        # Условие на year/month отсекает файлы целиком, на uploaded_at — строки в первом месяце
+        flt = (ds.field("year") > since.year) | (
+            (ds.field("year") == since.year) & (ds.field("month") >= since.month))
+        flt &= ds.field("uploaded_at") >= datetime.datetime.combine(since, datetime.time(), datetime.timezone.utc)
+    # Один чанк на колонку: индексы list_parent_indices тогда сквозные
+    return dataset(base_dir).to_table(columns=columns, filter=flt).combine_chunks()
+
+def _period(ts, freq: str):
+    """Метка периода: 2025-Q1 или 2025-03."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    year = pc.cast(pc.year(ts), pa.string())
+    if freq == "quarter":
+        return pc.binary_join_element_wise(year, pc.cast(pc.quarter(ts), pa.string()), "-Q")
+    if freq == "month":
+        return pc.binary_join_element_wise(year, pc.utf8_lpad(pc.cast(pc.month(ts), pa.string()), 2, "0"), "-")
+    raise ValueError(f"Неизвестный период: {freq}")
+
+def _explode_professions(table):
+    """Строка на каждую выбранную профессию с процентом соответствия именно ей."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    parents = pc.list_parent_indices(table.column("selected_professions"))
+    prof = pc.list_flatten(table.column("selected_professions"))
+    rows = table.take(parents)
+    score = pa.nulls(len(prof), pa.float64())
+    for name, col in score_columns.items():
+        score = pc.if_else(pc.equal(prof, name), pc.cast(rows.column(col), pa.float64()), score)
+    return rows.append_column("profession", prof).append_column("score", score)
+
+def _mean_score(table):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    total = pc.cast(table.column(SCORE_COLUMNS[0]), pa.float64())
+    for col in SCORE_COLUMNS[1:]:
+        total = pc.add(total, pc.cast(table.column(col), pa.float64()))
+    return pc.divide(total, float(len(SCORE_COLUMNS)))
+
+def trend(by: str | None = None, freq: str = "quarter", since=None, base_dir: str = ANALYTICS_DIR):
+    """
+    Заявки, средний % соответствия и доля с GitHub по периодам.
+    by: None — все заявки, "profession" — по выбранным профессиям, "hr" — по HR.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    table = load(["uploaded_at", "hr_email", "git_available", "selected_professions"] + SCORE_COLUMNS,
+                 since, base_dir)
+    if by == "profession":
+        table = _explode_professions(table)
+        keys = ["period", "profession"]
+    else:
+        table = table.append_column("score", _mean_score(table))
+        keys = ["period", "hr_email"] if by == "hr" else ["period"]
+    table = table.append_column("period", _period(table.column("uploaded_at"), freq))
+    table = table.set_column(table.schema.get_field_index("git_available"), "git_available",
+                             pc.cast(table.column("git_available"), pa.float64()))
+    df = table.group_by(keys).aggregate([
+        ("score", "count"), ("score", "mean"), ("git_available", "mean"),
+    ]).to_pandas().rename(columns={
+        "score_count": "applications", "score_mean": "avg_score", "git_available_mean": "git_share",
+    }).sort_values(keys).reset_index(drop=True)
+    # Рост к предыдущему периоду внутри группы
+    group = keys[1:] or None
+    series = df.groupby(group)["applications"] if group else df["applications"]
+    df["applications_change"] = series.pct_change()
+    return df
+
+def grade_trend(freq: str = "quarter", since=None, top: int = 10, base_dir: str = ANALYTICS_DIR):
+    """Сколько раз компетенция встречается с каждым грейдом по периодам (top самых частых на период)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    table = load(["uploaded_at", "grade0", "grade1", "grade2", "grade3"], since, base_dir)
+    period = _period(table.column("uploaded_at"), freq)
+    parts = []
+    for level in range(4):
+        col = table.column(f"grade{level}")
+        parents = pc.list_parent_indices(col)
+        comps = pc.list_flatten(col)
+        parts.append(pa.table({
+            "period": period.take(parents),
+            "grade": pa.array([level] * len(comps), pa.int8()),
+            "competency": comps,
+        }))
+    df = pa.concat_tables(parts).group_by(["period", "grade", "competency"]) \
+        .aggregate([("competency", "count")]).to_pandas() \
+        .rename(columns={"competency_count": "count"})
+    df = df.sort_values(["period", "grade", "count"], ascending=[True, True, False])
+    return df.groupby(["period", "grade"]).head(top).reset_index(drop=True)
+
+def funnel(freq: str = "quarter", pass_score: float = 50.0, strong_score: float = 75.0,
+           since=None, base_dir: str = ANALYTICS_DIR):
+    """
+    Воронка по когортам периода и профессии: заявки → соответствие ≥ pass_score →
+    ≥ strong_score → из них с GitHub.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    table = _explode_professions(load(["uploaded_at", "git_available", "selected_professions"] + SCORE_COLUMNS,
+                                      since, base_dir))
+    score = pc.fill_null(table.column("score"), 0.0)
+    strong = pc.greater_equal(score, strong_score)
+    table = table.append_column("period", _period(table.column("uploaded_at"), freq))
+    table = table.append_column("passed", pc.cast(pc.greater_equal(score, pass_score), pa.int64()))
+    table = table.append_column("strong", pc.cast(strong, pa.int64()))
+    table = table.append_column("strong_github", pc.cast(pc.and_(strong, pc.fill_null(table.column("git_available"), False)),
+                                                         pa.int64()))
+    df = table.group_by(["period", "profession"]).aggregate([
+        ("score", "count"), ("passed", "sum"), ("strong", "sum"), ("strong_github", "sum"),
+    ]).to_pandas().rename(columns={
+        "score_count": "applications", "passed_sum": "passed", "strong_sum": "strong",
+        "strong_github_sum": "strong_github",
+    })
+    df["pass_rate"] = df["passed"] / df["applications"]
+    order = {name: i for i, name in enumerate(profession_names)}
+    return df.sort_values(["period", "profession"], key=lambda s: s.map(order) if s.name == "profession" else s) \
+        .reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Колоночный снимок истории заявок")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="дописать новые заявки в снимок")
+    p.add_argument("--dir", default=ANALYTICS_DIR)
+    p.add_argument("--settle-hours", type=float, default=ANALYTICS_SETTLE_HOURS)
+    p.add_argument("--rebuild", action="store_true", help="пересобрать снимок с нуля")
+    p.add_argument("--every", type=float, help="повторять каждые N секунд")
+    p = sub.add_parser("compact", help="склеить файлы в секциях")
+    p.add_argument("--dir", default=ANALYTICS_DIR)
+    p = sub.add_parser("report", help="отчёт по снимку")
+    p.add_argument("kind", choices=["trend", "grades", "funnel"])
+    p.add_argument("--by", choices=["profession", "hr"], help="разрез для trend")
+    p.add_argument("--freq", choices=["quarter", "month"], default="quarter")
+    p.add_argument("--since", type=datetime.date.fromisoformat)
+    p.add_argument("--dir", default=ANALYTICS_DIR)
+    p.add_argument("--csv", help="сохранить результат в CSV")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+
+    if args.command == "export":
+        while True:
+            started = time.perf_counter()
+            rows = export(args.dir, args.settle_hours, args.rebuild)
+            print(f"Дописано заявок: {rows} за {time.perf_counter() - started:.1f} с")
+            if not args.every:
+                break
+            args.rebuild = False
+            time.sleep(args.every)
+        return
+    if args.command == "compact":
+        print(f"Склеено секций: {compact(args.dir)}")
+        return
+
+    import pandas as pd
+    started = time.perf_counter()
+    if args.kind == "trend":
+        df = trend(args.by, args.freq, args.since, args.dir)
+    elif args.kind == "grades":
+        df = grade_trend(args.freq, args.since, base_dir=args.dir)
+    else:
+        df = funnel(args.freq, since=args.since, base_dir=args.dir)
+    elapsed = time.perf_counter() - started
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+    with pd.option_context("display.max_rows", 200, "display.width", 200):
+        print(df)
+    print(f"\n{len(df)} строк за {elapsed * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import sys
+import time
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+
+import numpy as np
+
+# ─── Ограниченный LRU-кэш с TTL и статистикой ─────────────────────────────────
+def content_key(*parts) -> str:
+    """
+    Короткий ключ по содержимому: blake2b от аргументов вместо хранения
+    и хеширования целых текстов резюме/README самим Streamlit.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+def approx_size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class BoundedCache:
+    """
+    Потокобезопасный кэш на процесс: лимит по числу записей и по байтам,
+    вытеснение давно не использованных (LRU), время жизни записи (TTL).
+    """
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, ttl: float | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None, False
+            value, size, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, True
+
+    def put(self, key, value):
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "cache": self.name,
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Все кэши процесса — для страницы администратора
+CACHES: dict[str, BoundedCache] = {}
+
+def bounded_cache(name: str, max_entries: int, max_bytes: int, ttl: float | None = None):
+    """
+    Декоратор: результат функции кэшируется по content_key(*args).
+    """
+    cache = CACHES.setdefault(name, BoundedCache(name, max_entries, max_bytes, ttl))
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = content_key(*args)
+            value, found = cache.get(key)
+            if found:
+                return value
+            value = func(*args)
+            cache.put(key, value)
+            return value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def all_cache_stats() -> list[dict]:
+    return [c.stats() for c in CACHES.values()]
@@ -4,35 +4,66 @@ import logging
 import numpy as np
 import psycopg2
 import streamlit as st
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from huggingface_hub import login
 
 from utils.constants import (
-    competency_list,
-    profession_names,
-    profession_matrix,
     recommendations,
+    MODEL_REPO_ID,
+    MODEL_VARIANT,
+    MODEL_VERSION,
+    GITHUB_ENRICHMENT,
+    TEXT_CACHE_LIMITS,
+    GITHUB_CACHE_LIMITS,
 )
-from utils.cv_reader import preprocess_text
-from utils.github_reader import collect_github_text
+from utils.cache import bounded_cache
+from utils.db import get_connection
+from utils.enrichment import ensure_schema as ensure_enrichment_schema, enqueue, start_background_worker
+from utils.dedup import (
+    ensure_schema as ensure_dedup_schema,
+    find_near_duplicates,
+    index_record,
+    record_duplicates,
+)
+from utils.predictions import ensure_schema as ensure_predictions_schema
+from utils.search import ensure_schema as ensure_search_schema
+from utils.session_store import candidate_sessions, read_blob
+from utils.vector_store import ensure_schema as ensure_vector_schema, save_embedding
+from utils.scoring import grade_lists, profession_scores
+from utils.model import get_warm_model, has_local_snapshot, load_pretrained, load_student
+from utils.cv_reader import preprocess_text, read_resume_from_file
+from utils.github_reader import collect_github_text, collect_github_texts, extract_github_links_from_text
+from utils.inference_client import analyze_text, warm_up
+from utils.pipeline import Stage
 
 # ─── Кэшируем тяжёлые функции ─────────────────────────────────────────────────
-@st.cache_data
+@bounded_cache("text", **TEXT_CACHE_LIMITS)
 def preprocess_cached(text: str) -> str:
     return preprocess_text(text)
 
-@st.cache_data
+@bounded_cache("github", **GITHUB_CACHE_LIMITS)
 def collect_github_text_cached(link: str) -> str:
     return collect_github_text(link)
 
 @st.cache_resource
 def _load_model():
+    # Прогретая при старте модель или запечённый в образ снапшот — без обращения к хабу
+    warm = get_warm_model()
+    if warm is not None:
+        return warm
+    if MODEL_VARIANT == "student":
+        return load_student()
+    if has_local_snapshot():
+        return load_pretrained()
     login(token=st.secrets["HUGGINGFACE_TOKEN"])
-    repo_id = "KsyLight/resume-ai-competency-model"
-    tokenizer = AutoTokenizer.from_pretrained(repo_id, token=st.secrets["HUGGINGFACE_TOKEN"])
-    model = AutoModelForSequenceClassification.from_pretrained(repo_id, token=st.secrets["HUGGINGFACE_TOKEN"])
-    model.eval()
-    return tokenizer, model
+    return load_pretrained(MODEL_REPO_ID, token=st.secrets["HUGGINGFACE_TOKEN"])
+
+def start_enrichment_worker():
+    """
+    Воркер очереди GitHub при старте процесса, а не при первой заявке со
+    ссылками: задания, оставшиеся в очереди до перезапуска, не ждут.
+    """
+    if GITHUB_ENRICHMENT == "async":
+        start_background_worker(_load_model)
 
 def load_model_safe():
     try:
@@ -42,6 +73,44 @@ def load_model_safe():
         logging.error("Ошибка загрузки модели", exc_info=True)
         st.stop()
 
+# ─── Конвейер анализа кандидата ───────────────────────────────────────────────
+class EmptyResumeError(Exception):
+    """Из файла резюме не удалось извлечь текст."""
+
+def _fetch_github(links: list[str]) -> tuple[str, list[str]]:
+    # README всех профилей качаем параллельно; упавшие ссылки возвращаем отдельно
+    return collect_github_texts(links, fetch=collect_github_text_cached)
+
+def build_candidate_pipeline(file_path: str) -> list[Stage]:
+    """
+    Стадии анализа резюме. Прогрев модели идёт параллельно с извлечением
+    текста и загрузкой GitHub, поэтому общее время близко к самой долгой стадии.
+    При GITHUB_ENRICHMENT=async README не качаются: оценка только по резюме,
+    ссылки уходят в очередь дозагрузки при отправке заявки.
+    """
+    def extract():
+        raw = read_resume_from_file(file_path)
+        if not raw or not raw.strip():
+            raise EmptyResumeError(file_path)
+        return raw
+
+    def text(extract, github):
+        return preprocess_cached(extract + " " + github[0])
+
+    def inference(text, model):
+        return analyze_text(text, load_model=_load_model)
+
+    return [
+        Stage("extract", extract, label="Извлечение текста резюме"),
+        Stage("model", lambda: warm_up(_load_model), label="Прогрев модели"),
+        Stage("links", lambda extract: extract_github_links_from_text(extract), deps=("extract",), label="Поиск GitHub-ссылок"),
+        Stage("github", _fetch_github, deps=("links",), label="Загрузка README с GitHub")
+        if GITHUB_ENRICHMENT == "inline" else
+        Stage("github", lambda links: ("", []), deps=("links",), label="GitHub — после отправки заявки"),
+        Stage("text", text, deps=("extract", "github"), label="Предобработка текста"),
+        Stage("inference", inference, deps=("text", "model"), label="Анализ компетенций"),
+    ]
+
 def validate_candidate_form(surname, name, email, professions, telegram_handle, phone, consent):
     if not all([surname, name, email, professions, telegram_handle, phone]):
         return "Пожалуйста, заполните все поля формы."
@@ -54,50 +123,37 @@ def validate_candidate_form(surname, name, email, professions, telegram_handle,
     return None
 
 def save_application_to_db():
-    # Составляем grade0…grade3
+    # Составляем grade0…grade3 и проценты соответствия
     grades = st.session_state.user_grades
-    grade_lists = {i: [] for i in range(4)}
-    for comp, g in zip(competency_list, grades):
-        grade_lists[g].append(comp)
-
-    # Расчёт процентов соответствия
-    user_vector = np.array(st.session_state.user_grades)
-    percentages = []
-    for i, prof in enumerate(profession_names):
-        req = profession_matrix[:, i]
-        tot = np.count_nonzero(req)
-        match = np.count_nonzero((user_vector >= req) & (req > 0))
-        pct = match / tot * 100 if tot else 0.0
-        percentages.append(pct)
-
-    datan_score      = percentages[profession_names.index("Аналитик данных")]
-    ai_manager_score = percentages[profession_names.index("Менеджер в ИИ")]
-    techan_score     = percentages[profession_names.index("Технический аналитик в ИИ")]
-    daten_score      = percentages[profession_names.index("Инженер данных")]
-
-    # Файл резюме
-    uploaded = st.session_state.uploaded_file
-    file_bytes = uploaded.getvalue()
-    filename   = uploaded.name
-
-    # GitHub-ссылки
-    links = st.session_state.gh_links
-    git_available = bool(links)
-    url_github = links[0] if links else None
+    lists = grade_lists(grades)
+    scores = profession_scores(grades)
+
+    # Данные анализа и файл резюме — по ссылкам из сессии (utils/session_store.py)
+    data = candidate_sessions.get(st.session_state.candidate_sid)
+    if data is None:
+        raise LookupError("Сессия кандидата истекла: загрузите резюме заново")
+    file_bytes = read_blob(st.session_state.cv_blob)
+    filename   = data["filename"]
+
+    # GitHub-ссылки; в режиме async их подтвердит воркер дозагрузки
+    links = data["links"]
+    enrich_later = GITHUB_ENRICHMENT == "async" and bool(links)
+    git_available = bool(links) and not enrich_later
+    url_github = links[0] if git_available else None
 
     fields = dict(
         original_filename    = filename,
         cv_file              = psycopg2.Binary(file_bytes),
-        grade0               = grade_lists[0],
-        grade1               = grade_lists[1],
-        grade2               = grade_lists[2],
-        grade3               = grade_lists[3],
+        grade0               = lists[0],
+        grade1               = lists[1],
+        grade2               = lists[2],
+        grade3               = lists[3],
         sender_email         = st.session_state.email,
         code                 = uuid.uuid4().int & 0x7FFFFFFF,
-        ai_manager_score     = ai_manager_score,
-        techan_score         = techan_score,
-        datan_score          = datan_score,
-        daten_score          = daten_score,
+        ai_manager_score     = scores["ai_manager_score"],
+        techan_score         = scores["techan_score"],
+        datan_score          = scores["datan_score"],
+        daten_score          = scores["daten_score"],
         git_available        = git_available,
         name                 = st.session_state.name,
         surname              = st.session_state.surname,
@@ -107,15 +163,17 @@ def save_application_to_db():
         phone                = st.session_state.phone,
         consent              = st.session_state.consent,
         selected_professions = st.session_state.selected_professions,
-        form_submitted_at    = st.session_state.form_submitted_at
+        form_submitted_at    = st.session_state.form_submitted_at,
+        resume_text          = preprocess_text(data["resume_text"]),
+        github_text          = preprocess_text(data["github_text"]) or None,
+        competency_probs     = [float(p) for p in data["probs"]],
+        model_version        = MODEL_VERSION,
     )
 
-    conn = psycopg2.connect(
-        host="localhost",
-        dbname="resumes",
-        user="appuser",
-        password="duduki"
-    )
+    conn = get_connection()
+    ensure_search_schema(conn)
+    ensure_predictions_schema(conn)
+    ensure_enrichment_schema(conn)
     cur = conn.cursor()
     cur.execute("""
         INSERT INTO resume_records
@@ -123,19 +181,49 @@ def save_application_to_db():
            sender_email, code,
            ai_manager_score, techan_score, datan_score, daten_score,
            git_available, name, surname, patronymic, url_github,
-           telegram_handle, phone, consent, selected_professions, form_submitted_at)
+           telegram_handle, phone, consent, selected_professions, form_submitted_at,
+           resume_text, github_text, competency_probs, model_version)
         VALUES (
           %(original_filename)s, %(cv_file)s, %(grade0)s, %(grade1)s,
           %(grade2)s, %(grade3)s, %(sender_email)s, %(code)s,
           %(ai_manager_score)s, %(techan_score)s, %(datan_score)s, %(daten_score)s,
           %(git_available)s, %(name)s, %(surname)s, %(patronymic)s, %(url_github)s,
           %(telegram_handle)s, %(phone)s, %(consent)s, %(selected_professions)s,
-          %(form_submitted_at)s
+          %(form_submitted_at)s, %(resume_text)s, %(github_text)s, %(competency_probs)s,
+          %(model_version)s
         )
         RETURNING id;
     """, fields)
     rec_id = cur.fetchone()[0]
+    if enrich_later:
+        # Заявка и задание дозагрузки появляются вместе
+        enqueue(cur, rec_id, links, st.session_state.pred_vector)
     conn.commit()
+
+    # MinHash-сигнатура и совпадения с уже поданными резюме; ошибка здесь заявку не отменяет
+    try:
+        ensure_dedup_schema(conn)
+        if index_record(cur, rec_id, data["resume_text"]) is not None:
+            matches = find_near_duplicates(conn, data["resume_text"], exclude_id=rec_id)
+            if matches:
+                record_duplicates(cur, rec_id, matches)
+                logging.warning(f"Заявка {rec_id} похожа на уже поданные: {matches[:5]}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logging.error("Не удалось посчитать MinHash-сигнатуру заявки", exc_info=True)
+
+    # Эмбеддинг для поиска похожих кандидатов
+    if data.get("embedding") is not None:
+        try:
+            ensure_vector_schema(conn)
+            # В сессии эмбеддинг в float16; норму считаем в float32, чтобы не переполнить
+            save_embedding(cur, rec_id, data["embedding"].astype(np.float32))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logging.error("Не удалось сохранить эмбеддинг заявки", exc_info=True)
+
     cur.close()
     conn.close()
     return rec_id
\ No newline at end of file
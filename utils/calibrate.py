@@ -0,0 +1,307 @@
+"""
+Калибровка порогов модели на размеченном наборе.
+
+    python -m utils.calibrate run                    # один проход модели + подбор порогов
+    python -m utils.calibrate sweep --objective macro  # повторный подбор по кэшу, без модели
+    python -m utils.calibrate list                   # что лежит в кэше
+
+Модель прогоняется по others/resume_dataset.csv (или другому CSV с
+колонками text и labels) один раз: логиты пишутся в .npy в EVAL_CACHE_DIR,
+ключ — хеш весов модели и набора данных. Прерванный проход продолжается
+с места остановки. Дальше кэш читается через np.load(mmap_mode="r"), и
+перебор порогов — векторные операции над матрицей (сетка, примеры,
+компетенции), поэтому sweep укладывается в доли секунды.
+
+Подбираются общий порог (по micro- или macro-F1) и отдельные пороги для
+компетенций; у компетенций с малым числом примеров остаётся общий порог.
+На отложенной части набора сравниваются THRESHOLD, общий и отдельные
+пороги. Результат — THRESHOLDS_FILE, который приложение читает при старте
+(utils.predictions.current_thresholds).
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+
+from utils.constants import competency_list, THRESHOLD, THRESHOLDS_FILE, MAX_LENGTH, MODEL_VERSION, TEXT_PACKING
+
+logger = logging.getLogger(__name__)
+
+EVAL_CACHE_DIR = os.path.join("models", "eval_cache")
+DATASET_PATH = os.path.join("others", "resume_dataset.csv")
+GRID = np.round(np.arange(0.05, 0.951, 0.01), 2)
+# Меньше положительных примеров — отдельный порог не подбираем
+MIN_SUPPORT = 5
+# Как часто сохранять прогресс первого прохода, батчей
+FLUSH_EVERY = 20
+
+
+# ─── Кэш логитов ──────────────────────────────────────────────────────────────
+def model_hash(model) -> str:
+    """Хеш весов модели: одинаковые веса — один кэш, откуда бы их ни загрузили."""
+    import torch
+
+    h = hashlib.sha256()
+    for name, tensor in sorted(model.state_dict().items()):
+        t = tensor.detach().cpu().contiguous()
+        h.update(f"{name}:{t.dtype}:{tuple(t.shape)}".encode())
+        h.update(t.view(-1).view(torch.uint8).numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def dataset_hash(texts: list[str], labels: np.ndarray) -> str:
+    h = hashlib.sha256(f"{MAX_LENGTH}:{TEXT_PACKING}".encode())
+    for text in texts:
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    h.update(np.ascontiguousarray(labels, dtype=np.float32).tobytes())
+    return h.hexdigest()[:16]
+
+def _read_index(cache_dir: str) -> dict:
+    path = os.path.join(cache_dir, "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_index(cache_dir: str, index: dict):
+    path = os.path.join(cache_dir, "index.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def cached_logits(tokenizer, model, texts: list[str], labels: np.ndarray, dataset: str,
+                  cache_dir: str = EVAL_CACHE_DIR, batch_size: int = 16) -> str:
+    """
+    Логиты модели на наборе в cache_dir/<ключ>.npy (и метки рядом).
+    Если кэш готов — модель не вызывается. Возвращает ключ.
+    """
+    from utils.distill import teacher_logits
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = f"{model_hash(model)}-{dataset_hash(texts, labels)}"
+    path = os.path.join(cache_dir, f"{key}.npy")
+    progress = path + ".progress"
+    index = _read_index(cache_dir)
+    if os.path.exists(path) and not os.path.exists(progress) and key in index:
+        logger.info(f"Логиты из кэша {path}")
+        return key
+
+    n = len(texts)
+    if os.path.exists(path) and os.path.exists(progress):
+        logits = np.lib.format.open_memmap(path, mode="r+")
+        with open(progress) as f:
+            start = int(f.read() or 0)
+        logger.info(f"Продолжаем проход с {start} из {n}")
+    else:
+        logits = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, len(competency_list)))
+        start = 0
+    np.save(os.path.join(cache_dir, f"{key}.labels.npy"), labels.astype(np.int8))
+
+    started = time.perf_counter()
+    for b, i in enumerate(range(start, n, batch_size)):
+        logits[i:i + batch_size] = teacher_logits(tokenizer, model, texts[i:i + batch_size], batch_size)
+        if (b + 1) % FLUSH_EVERY == 0:
+            logits.flush()
+            with open(progress, "w") as f:
+                f.write(str(i + batch_size))
+            logger.info(f"{i + batch_size} из {n}, {(i + batch_size - start) / (time.perf_counter() - started):.1f} текстов/с")
+    logits.flush()
+    del logits
+    if os.path.exists(progress):
+        os.remove(progress)
+
+    index[key] = {"model_version": MODEL_VERSION, "dataset": dataset, "rows": n,
+                  "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+    _write_index(cache_dir, index)
+    return key
+
+def open_cache(key: str | None = None, cache_dir: str = EVAL_CACHE_DIR) -> tuple[str, np.ndarray, np.ndarray]:
+    """(ключ, логиты, метки) через mmap. Без ключа — последний готовый кэш текущей MODEL_VERSION."""
+    index = _read_index(cache_dir)
+    if key is None:
+        candidates = sorted((meta["created"], k) for k, meta in index.items()
+                            if meta["model_version"] == MODEL_VERSION)
+        if not candidates:
+            raise SystemExit(f"Нет кэша логитов для {MODEL_VERSION}: сначала python -m utils.calibrate run")
+        key = candidates[-1][1]
+    elif key not in index:
+        raise SystemExit(f"Ключ {key} не найден в {cache_dir}")
+    logits = np.load(os.path.join(cache_dir, f"{key}.npy"), mmap_mode="r")
+    labels = np.load(os.path.join(cache_dir, f"{key}.labels.npy"), mmap_mode="r")
+    return key, logits, labels
+
+
+# ─── Метрики ──────────────────────────────────────────────────────────────────
+def _logit(p):
+    p = np.asarray(p, dtype=np.float64)
+    return np.log(p) - np.log1p(-p)
+
+def confusion(logits: np.ndarray, labels: np.ndarray, thresholds: np.ndarray, chunk: int = 2048):
+    """
+    tp, fp, fn формы (len(thresholds), n_competencies). thresholds — вероятности
+    формы (g,) (сетка общего порога) или (g, n_competencies).
+    """
+    cut = _logit(thresholds).astype(np.float32)
+    cut = cut[:, None, None] if cut.ndim == 1 else cut[:, None, :]
+    shape = (cut.shape[0], logits.shape[1])
+    tp, fp, fn = (np.zeros(shape, dtype=np.int64) for _ in range(3))
+    for i in range(0, len(logits), chunk):
+        pred = np.asarray(logits[i:i + chunk])[None] > cut
+        y = np.asarray(labels[i:i + chunk], dtype=bool)[None]
+        tp += (pred & y).sum(axis=1)
+        fp += (pred & ~y).sum(axis=1)
+        fn += (~pred & y).sum(axis=1)
+    return tp, fp, fn
+
+def _ratio(a, b):
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape, dtype=np.float64), where=b > 0)
+
+def scores(tp, fp, fn) -> dict:
+    """Precision/recall/F1 по компетенциям и micro/macro по последней оси."""
+    precision, recall = _ratio(tp, tp + fp), _ratio(tp, tp + fn)
+    f1 = _ratio(2 * tp, 2 * tp + fp + fn)
+    stp, sfp, sfn = tp.sum(axis=-1), fp.sum(axis=-1), fn.sum(axis=-1)
+    return {
+        "precision": precision, "recall": recall, "f1": f1,
+        "micro_precision": _ratio(stp, stp + sfp),
+        "micro_recall": _ratio(stp, stp + sfn),
+        "micro_f1": _ratio(2 * stp, 2 * stp + sfp + sfn),
+        "macro_f1": f1.mean(axis=-1),
+    }
+
+def sweep(logits: np.ndarray, labels: np.ndarray, objective: str = "micro",
+          grid: np.ndarray = GRID, min_support: int = MIN_SUPPORT) -> dict:
+    """Лучший общий порог по objective-F1 и лучший порог для каждой компетенции."""
+    s = scores(*confusion(logits, labels, grid))
+    best_global = float(grid[int(np.argmax(s[f"{objective}_f1"]))])
+    # При равенстве F1 берём порог, ближайший к общему
+    f1 = s["f1"] - 1e-9 * np.abs(grid - best_global)[:, None]
+    per = grid[np.argmax(f1, axis=0)].astype(np.float64)
+    support = np.asarray(labels, dtype=bool).sum(axis=0)
+    per[support < min_support] = best_global
+    return {"global": best_global, "per_competency": per, "support": support}
+
+def evaluate(logits: np.ndarray, labels: np.ndarray, thresholds) -> dict:
+    """Метрики при одном наборе порогов (число или вектор по компетенциям)."""
+    th = np.broadcast_to(np.asarray(thresholds, dtype=np.float64), (logits.shape[1],))[None]
+    tp, fp, fn = confusion(logits, labels, th)
+    s = scores(tp[0], fp[0], fn[0])
+    return {
+        "micro_f1": float(s["micro_f1"]), "macro_f1": float(s["macro_f1"]),
+        "micro_precision": float(s["micro_precision"]), "micro_recall": float(s["micro_recall"]),
+        "per_competency": {
+            comp: {"precision": float(p), "recall": float(r), "f1": float(f), "support": int(t + n)}
+            for comp, p, r, f, t, n in zip(competency_list, s["precision"], s["recall"], s["f1"], tp[0], fn[0])
+        },
+    }
+
+
+# ─── Калибровка ───────────────────────────────────────────────────────────────
+def split(n: int, holdout: float, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    order = np.random.default_rng(seed).permutation(n)
+    cut = int(round(n * (1 - holdout)))
+    return np.sort(order[:cut]), np.sort(order[cut:])
+
+def calibrate(key: str, logits: np.ndarray, labels: np.ndarray, objective: str = "micro",
+              mode: str = "per_competency", holdout: float = 0.2, min_support: int = MIN_SUPPORT) -> dict:
+    """Подбирает пороги на обучающей части и сравнивает варианты на отложенной."""
+    fit, test = split(len(logits), holdout) if holdout > 0 else (np.arange(len(logits)),) * 2
+    # Выборка строк — единственная копия данных из mmap
+    fit_logits, fit_labels = np.asarray(logits[fit]), np.asarray(labels[fit])
+    test_logits, test_labels = np.asarray(logits[test]), np.asarray(labels[test])
+
+    started = time.perf_counter()
+    found = sweep(fit_logits, fit_labels, objective, min_support=min_support)
+    elapsed = time.perf_counter() - started
+
+    chosen = found["per_competency"] if mode == "per_competency" else np.full(len(competency_list), found["global"])
+    return {
+        "model_version": MODEL_VERSION,
+        "cache_key": key,
+        "objective": objective,
+        "mode": mode,
+        "global": found["global"],
+        "thresholds": {comp: float(t) for comp, t in zip(competency_list, chosen)},
+        "support": {comp: int(n) for comp, n in zip(competency_list, found["support"])},
+        "sweep_seconds": round(elapsed, 4),
+        "eval": {
+            "rows": int(len(test)),
+            "holdout": holdout,
+            "default": evaluate(test_logits, test_labels, THRESHOLD),
+            "global": evaluate(test_logits, test_labels, found["global"]),
+            "per_competency": evaluate(test_logits, test_labels, found["per_competency"]),
+        },
+    }
+
+def save(result: dict, path: str = THRESHOLDS_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def print_report(result: dict):
+    ev = result["eval"]
+    print(f"Кэш {result['cache_key']}, перебор порогов: {result['sweep_seconds'] * 1000:.1f} мс")
+    print(f"Отложено {ev['rows']} примеров ({ev['holdout']:.0%}); цель — {result['objective']}-F1")
+    print(f"{'пороги':<34} {'micro-F1':>9} {'macro-F1':>9} {'P':>7} {'R':>7}")
+    for name, label in [("default", f"THRESHOLD = {THRESHOLD:.3f}"),
+                        ("global", f"общий = {result['global']:.2f}"),
+                        ("per_competency", "по компетенциям")]:
+        m = ev[name]
+        print(f"{label:<34} {m['micro_f1']:>9.4f} {m['macro_f1']:>9.4f} "
+              f"{m['micro_precision']:>7.3f} {m['micro_recall']:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Калибровка порогов модели компетенций")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "sweep"):
+        p = sub.add_parser(name)
+        p.add_argument("--objective", choices=["micro", "macro"], default="micro")
+        p.add_argument("--mode", choices=["per_competency", "global"], default="per_competency",
+                       help="какие пороги записать в файл")
+        p.add_argument("--holdout", type=float, default=0.2, help="доля набора для проверки")
+        p.add_argument("--min-support", type=int, default=MIN_SUPPORT)
+        p.add_argument("--cache-dir", default=EVAL_CACHE_DIR)
+        p.add_argument("--out", default=THRESHOLDS_FILE)
+        p.add_argument("--json", action="store_true", help="вывести результат целиком в JSON")
+        if name == "run":
+            p.add_argument("--dataset", default=DATASET_PATH)
+            p.add_argument("--batch-size", type=int, default=16)
+        else:
+            p.add_argument("--key", help="ключ кэша (по умолчанию последний для MODEL_VERSION)")
+    p = sub.add_parser("list")
+    p.add_argument("--cache-dir", default=EVAL_CACHE_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+
+    if args.command == "list":
+        for key, meta in sorted(_read_index(args.cache_dir).items(), key=lambda kv: kv[1]["created"]):
+            print(f"{key}  {meta['created']}  {meta['rows']:>6}  {meta['model_version']}  {meta['dataset']}")
+        return
+
+    if args.command == "run":
+        from utils.distill import load_dataset
+        from utils.model import load_configured
+        texts, labels = load_dataset(args.dataset)
+        tokenizer, model = load_configured()
+        key = cached_logits(tokenizer, model, texts, labels, args.dataset, args.cache_dir, args.batch_size)
+    else:
+        key = args.key
+    key, logits, labels = open_cache(key, args.cache_dir)
+
+    result = calibrate(key, logits, labels, args.objective, args.mode, args.holdout, args.min_support)
+    save(result, args.out)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+        print(f"Пороги ({result['mode']}) сохранены в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 
 # Задаем список компетенций (в том же порядке, что использовался при обучении модели)
@@ -236,9 +237,62 @@ recommendations = {
 
 # Порог для бинаризации меток модели
 THRESHOLD = 0.46269254347612143
+# Откалиброванные пороги (utils/calibrate.py); если файла нет — THRESHOLD для всех компетенций
+THRESHOLDS_FILE = os.environ.get("THRESHOLDS_FILE", "models/thresholds.json")
 # Файл учётных данных OAuth
 CREDENTIALS_FILE = "client_secret_2_496304292584-focgmts10r0pc3cplngprpkiqshp5d2j.apps.googleusercontent.com.json"
 # Файл для хранения токена доступа
 TOKEN_FILE = "token.json"
 # Область прав: отправка почты
-SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
\ No newline at end of file
+SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+
+# ─── Модель и сервер инференса ──────────────────────────────────────────────────
+# Репозиторий дообученной модели на Hugging Face
+MODEL_REPO_ID = "KsyLight/resume-ai-competency-model"
+# Какую модель обслуживать: teacher — исходная, student — дистиллированная (utils/distill.py)
+MODEL_VARIANT = os.environ.get("MODEL_VARIANT", "teacher")
+# Что делать с текстом длиннее MAX_LENGTH: truncate — обрезать конец,
+# sections — набрать самые ценные разделы резюме (utils/sections.py)
+TEXT_PACKING = os.environ.get("TEXT_PACKING", "truncate")
+# Версия модели, с которой сохраняются вероятности и эмбеддинги
+# (упаковка текста меняет и то и другое, поэтому входит в версию)
+MODEL_VERSION = os.environ.get(
+    "MODEL_VERSION",
+    (MODEL_REPO_ID if MODEL_VARIANT == "teacher" else f"{MODEL_REPO_ID}:{MODEL_VARIANT}")
+    + ("" if TEXT_PACKING == "truncate" else f"+{TEXT_PACKING}"),
+)
+# Локальный снапшот модели в формате safetensors (если есть — грузим с диска)
+MODEL_LOCAL_DIR = os.environ.get("MODEL_LOCAL_DIR", "models/resume-ai-competency-model")
+# Снапшот дистиллированной модели-ученика
+STUDENT_MODEL_DIR = os.environ.get("STUDENT_MODEL_DIR", "models/resume-ai-competency-student")
+# Отображать веса в память только для чтения (общие страницы для всех воркеров)
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "0") == "1"
+# Максимальная длина входа модели (в токенах)
+MAX_LENGTH = 512
+# Адрес локального сервера инференса (пустая строка — считать в процессе Streamlit)
+INFERENCE_SERVER_URL = os.environ.get("INFERENCE_SERVER_URL", "http://127.0.0.1:8600")
+# Таймаут запроса к серверу инференса, сек
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "10"))
+# Базовый адрес GitHub API (подменяется в нагрузочных тестах)
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+# GitHub при анализе кандидата: inline — ждать README до оценки,
+# async — оценить по резюме и дозагрузить GitHub после отправки (utils/enrichment.py)
+GITHUB_ENRICHMENT = os.environ.get("GITHUB_ENRICHMENT", "async")
+
+
+# ─── Лимиты кэшей (записи, байты, TTL в секундах) ─────────────────────────────
+TEXT_CACHE_LIMITS = dict(max_entries=512, max_bytes=64 * 1024 * 1024, ttl=24 * 3600)
+GITHUB_CACHE_LIMITS = dict(max_entries=256, max_bytes=64 * 1024 * 1024, ttl=6 * 3600)
+INFERENCE_CACHE_LIMITS = dict(max_entries=2048, max_bytes=16 * 1024 * 1024, ttl=24 * 3600)
+# Кэш запросов панели HR по (раздел, фильтры, версия данных)
+HR_QUERY_CACHE_LIMITS = dict(max_entries=256, max_bytes=256 * 1024 * 1024, ttl=3600)
+# statement_timeout запросов панели HR, мс, и число потоков для них (utils/query_runner.py)
+HR_STATEMENT_TIMEOUT_MS = int(os.environ.get("HR_STATEMENT_TIMEOUT_MS", "15000"))
+HR_QUERY_WORKERS = int(os.environ.get("HR_QUERY_WORKERS", "8"))
+# Данные сессий кандидатов (utils/session_store.py): папка, через сколько секунд
+# простоя сбрасывать их на диск и через сколько удалять
+SESSION_DIR = os.environ.get("SESSION_DIR", os.path.join("temp", "sessions"))
+SESSION_SPILL_AFTER = float(os.environ.get("SESSION_SPILL_AFTER", "600"))
+SESSION_DROP_AFTER = float(os.environ.get("SESSION_DROP_AFTER", "7200"))
+# Период опроса ленты изменений resume_records, сек
+CHANGE_FEED_POLL_INTERVAL = float(os.environ.get("CHANGE_FEED_POLL_INTERVAL", "5"))
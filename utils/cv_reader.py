@@ -1,8 +1,9 @@
 import re
 import logging
-from docx import Document
 from pdfminer.high_level import extract_text
 
+from utils.docx_reader import read_docx
+
 logger = logging.getLogger(__name__)
 
 def read_resume_from_file(file_path):
@@ -11,8 +12,8 @@ def read_resume_from_file(file_path):
             with open(file_path, encoding='utf-8') as f:
                 return f.read()
         elif file_path.lower().endswith('.docx'):
-            doc = Document(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
+            # Потоковый разбор: тело, таблицы, надписи и колонтитулы
+            return read_docx(file_path)
         elif file_path.lower().endswith('.pdf'):
             text = extract_text(file_path)
             if not text or not text.strip():
@@ -0,0 +1,7 @@
+import psycopg2
+
+# Параметры подключения к базе заявок
+DB_PARAMS = dict(host="localhost", dbname="resumes", user="appuser", password="duduki")
+
+def get_connection(**overrides):
+    return psycopg2.connect(**{**DB_PARAMS, **overrides})
@@ -0,0 +1,284 @@
+"""
+Поиск почти-дубликатов резюме: MinHash-сигнатуры + LSH-индекс в PostgreSQL.
+
+    python -m utils.dedup migrate      # разово: таблицы сигнатур и LSH
+    python -m utils.dedup backfill     # посчитать сигнатуры для старых заявок
+    python -m utils.dedup clusters     # вывести кластеры дубликатов
+
+Текст режется на словесные шинглы, сигнатура — NUM_PERM минимумов
+универсальных хешей. Сигнатура делится на LSH_BANDS полос, хеш каждой полосы
+хранится в resume_lsh_bands с индексом (band, bucket): кандидаты в дубликаты
+находятся поиском по индексу, а не попарным сравнением всего архива.
+"""
+import sys
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+
+from utils.cv_reader import preprocess_text
+from utils.schema import Schema, connection, run_migrate
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+LSH_BANDS = 16          # 16 полос × 8 строк: порог срабатывания LSH ≈ 0.7
+SHINGLE_SIZE = 5        # слов в шингле
+DUPLICATE_THRESHOLD = 0.8
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+DEDUP_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS resume_minhash (
+    record_id integer PRIMARY KEY,
+    signature bytea NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resume_lsh_bands (
+    band      smallint NOT NULL,
+    bucket    bigint   NOT NULL,
+    record_id integer  NOT NULL,
+    PRIMARY KEY (band, bucket, record_id)
+);
+-- Совпадения, найденные при отправке заявки (повторная подача под другим email и т. п.)
+CREATE TABLE IF NOT EXISTS resume_duplicates (
+    record_id    integer     NOT NULL,
+    duplicate_of integer     NOT NULL,
+    similarity   real        NOT NULL,
+    found_at     timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (record_id, duplicate_of)
+);
+"""
+
+SCHEMA = Schema("utils.dedup", ["resume_minhash", "resume_lsh_bands", "resume_duplicates"], DEDUP_SCHEMA_SQL)
+ensure_schema = SCHEMA.ensure
+migrate = SCHEMA.migrate
+
+
+# ─── MinHash ──────────────────────────────────────────────────────────────────
+def shingles(text: str) -> set[str]:
+    words = preprocess_text(text).split()
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Сигнатура uint32 длины NUM_PERM."""
+    sh = shingles(text)
+    if not sh:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint32)
+    hv = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in sh),
+        dtype=np.uint64, count=len(sh),
+    )
+    # (a·x + b) mod p, переполнение uint64 допустимо — это всё равно хеш
+    with np.errstate(over="ignore"):
+        phv = ((np.outer(hv, _A) + _B) % _MERSENNE) & _MAX_HASH
+    return phv.min(axis=0).astype(np.uint32)
+
+def band_buckets(signature: np.ndarray) -> list[int]:
+    rows = NUM_PERM // LSH_BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(signature[b * rows:(b + 1) * rows].tobytes(), digest_size=8).digest(),
+                       "little", signed=True)
+        for b in range(LSH_BANDS)
+    ]
+
+def jaccard_estimate(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+# ─── Хранение в PostgreSQL ────────────────────────────────────────────────────
+def _unindex(cur, record_id: int):
+    cur.execute("DELETE FROM resume_minhash WHERE record_id = %s", (record_id,))
+    cur.execute("DELETE FROM resume_lsh_bands WHERE record_id = %s", (record_id,))
+
+def index_record(cur, record_id: int, text: str) -> np.ndarray | None:
+    """
+    Сигнатура и LSH-полосы заявки. Заявки без шинглов (скан PDF, пустой
+    текст) не индексируются: их одинаковые пустые сигнатуры попали бы
+    в одни корзины и слиплись в кластер со сходством 1.0.
+    """
+    if not shingles(text):
+        _unindex(cur, record_id)
+        return None
+    sig = minhash_signature(text)
+    cur.execute(
+        "INSERT INTO resume_minhash (record_id, signature) VALUES (%s, %s) "
+        "ON CONFLICT (record_id) DO UPDATE SET signature = EXCLUDED.signature",
+        (record_id, sig.tobytes()),
+    )
+    cur.execute("DELETE FROM resume_lsh_bands WHERE record_id = %s", (record_id,))
+    cur.executemany(
+        "INSERT INTO resume_lsh_bands (band, bucket, record_id) VALUES (%s, %s, %s)",
+        [(band, bucket, record_id) for band, bucket in enumerate(band_buckets(sig))],
+    )
+    return sig
+
+def find_near_duplicates(conn, text: str, threshold: float = DUPLICATE_THRESHOLD,
+                         exclude_id: int | None = None) -> list[tuple[int, float]]:
+    """
+    Заявки, похожие на text: кандидаты из LSH-индекса, затем проверка
+    оценкой Жаккара по сигнатурам. Возвращает [(record_id, сходство)].
+    """
+    if not shingles(text):
+        return []
+    sig = minhash_signature(text)
+    pairs = list(enumerate(band_buckets(sig)))
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT m.record_id, m.signature
+            FROM resume_minhash m
+            WHERE m.record_id IN (
+                SELECT record_id FROM resume_lsh_bands
+                WHERE (band, bucket) IN %s
+            )
+            """,
+            (tuple(pairs),),
+        )
+        found = []
+        for record_id, raw in cur:
+            if record_id == exclude_id:
+                continue
+            sim = jaccard_estimate(sig, np.frombuffer(bytes(raw), dtype=np.uint32))
+            if sim >= threshold:
+                found.append((record_id, sim))
+    return sorted(found, key=lambda x: -x[1])
+
+def record_duplicates(cur, record_id: int, matches: list[tuple[int, float]]):
+    """Сохраняет совпадения заявки для панели HR."""
+    cur.executemany(
+        "INSERT INTO resume_duplicates (record_id, duplicate_of, similarity) VALUES (%s, %s, %s) "
+        "ON CONFLICT (record_id, duplicate_of) DO UPDATE SET similarity = EXCLUDED.similarity",
+        [(record_id, other, sim) for other, sim in matches],
+    )
+
+def recent_duplicates(conn, limit: int = 100) -> list[dict]:
+    """Последние заявки, похожие на уже поданные, с контактами обеих сторон."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT d.record_id, n.surname, n.name, n.sender_email,
+                   d.duplicate_of, o.surname, o.name, o.sender_email,
+                   round(d.similarity::numeric, 3), d.found_at
+            FROM resume_duplicates d
+            LEFT JOIN resume_records n ON n.id = d.record_id
+            LEFT JOIN resume_records o ON o.id = d.duplicate_of
+            ORDER BY d.found_at DESC, d.similarity DESC
+            LIMIT %s
+        """, (limit,))
+        columns = ["id", "surname", "name", "sender_email",
+                   "duplicate_of", "dup_surname", "dup_name", "dup_sender_email", "similarity", "found_at"]
+        rows = [dict(zip(columns, r)) for r in cur]
+    conn.commit()
+    return rows
+
+def duplicate_clusters(conn, threshold: float = DUPLICATE_THRESHOLD) -> list[list[int]]:
+    """
+    Кластеры почти-дубликатов: пары из общих LSH-корзин, проверенные
+    по сигнатурам и объединённые через union-find.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT array_agg(record_id ORDER BY record_id)
+            FROM resume_lsh_bands
+            GROUP BY band, bucket
+            HAVING count(*) > 1
+        """)
+        buckets = [r[0] for r in cur]
+        ids = sorted({i for b in buckets for i in b})
+        if not ids:
+            return []
+        cur.execute("SELECT record_id, signature FROM resume_minhash WHERE record_id = ANY(%s)", (ids,))
+        sigs = {rid: np.frombuffer(bytes(raw), dtype=np.uint32) for rid, raw in cur}
+
+    parent = {i: i for i in ids}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked = set()
+    for bucket in buckets:
+        for i, a in enumerate(bucket):
+            for b in bucket[i + 1:]:
+                if (a, b) in checked or a not in sigs or b not in sigs:
+                    continue
+                checked.add((a, b))
+                if jaccard_estimate(sigs[a], sigs[b]) >= threshold:
+                    parent[find(a)] = find(b)
+
+    clusters = {}
+    for i in ids:
+        clusters.setdefault(find(i), []).append(i)
+    return sorted((c for c in clusters.values() if len(c) > 1), key=len, reverse=True)
+
+
+# ─── Дозаполнение для существующих заявок ─────────────────────────────────────
+def backfill(conn=None, batch: int = 100) -> int:
+    from utils.ingest import extract_text_from_bytes
+
+    done = 0
+    with connection(conn) as conn:
+        ensure_schema(conn)
+        with conn.cursor() as cur:
+            # Пустые сигнатуры, проиндексированные до появления проверки
+            cur.execute("SELECT record_id FROM resume_minhash WHERE signature = %s",
+                        (np.full(NUM_PERM, _MAX_HASH, dtype=np.uint32).tobytes(),))
+            for (record_id,) in cur.fetchall():
+                _unindex(cur, record_id)
+        conn.commit()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT r.id FROM resume_records r
+                LEFT JOIN resume_minhash m ON m.record_id = r.id
+                WHERE m.record_id IS NULL AND r.cv_file IS NOT NULL
+                ORDER BY r.id
+            """)
+            todo = [r[0] for r in cur]
+        for record_id in todo:
+            with conn.cursor() as cur:
+                cur.execute("SELECT original_filename, cv_file FROM resume_records WHERE id = %s", (record_id,))
+                filename, blob = cur.fetchone()
+                text = extract_text_from_bytes(filename or "cv.txt", bytes(blob))
+                if not text or index_record(cur, record_id, text) is None:
+                    continue
+            done += 1
+            if done % batch == 0:
+                conn.commit()
+                logger.info(f"Сигнатуры посчитаны для {done} из {len(todo)} заявок")
+        conn.commit()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск почти-дубликатов резюме")
+    parser.add_argument("command", choices=["migrate", "backfill", "clusters"])
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    if args.command == "migrate":
+        run_migrate(SCHEMA)
+        return
+    if args.command == "backfill":
+        print(f"Проиндексировано заявок: {backfill()}")
+        return
+    with connection() as conn:
+        ensure_schema(conn)
+        clusters = duplicate_clusters(conn, args.threshold)
+    if not clusters:
+        print("Дубликатов не найдено")
+        sys.exit(0)
+    for i, cluster in enumerate(clusters, 1):
+        print(f"Кластер {i}: {cluster}")
+
+
+if __name__ == "__main__":
+    main()
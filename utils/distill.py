@@ -0,0 +1,272 @@
+"""
+Дистилляция модели компетенций в компактного ученика на CPU.
+
+    python -m utils.distill --layers 4 --epochs 3          # ученик из слоёв учителя
+    python -m utils.distill --student-checkpoint cointegrated/rubert-tiny2
+
+Учитель — модель KsyLight/resume-ai-competency-model. Его сигмоидные
+вероятности (смягчённые температурой) — мягкие цели для ученика на текстах
+others/resume_dataset.csv и неразмеченном архиве заявок из resume_records;
+у размеченных текстов к ним подмешиваются истинные метки.
+
+Ученик — либо учитель с оставленными через равные промежутки слоями
+энкодера, либо небольшой многоязычный энкодер с новой головой. На
+отложенных 20 % датасета считается F1 по каждой компетенции относительно
+учителя при THRESHOLD и ускорение. Снапшот сохраняется в STUDENT_MODEL_DIR
+и включается переменной окружения MODEL_VARIANT=student.
+"""
+import os
+import ast
+import csv
+import copy
+import json
+import time
+import random
+import logging
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from utils.constants import competency_list, THRESHOLD, MAX_LENGTH, STUDENT_MODEL_DIR
+from utils.cv_reader import preprocess_text, read_resume_from_file
+
+logger = logging.getLogger(__name__)
+
+DATASET_PATH = os.path.join("others", "resume_dataset.csv")
+
+
+# ─── Данные ───────────────────────────────────────────────────────────────────
+def load_dataset(path: str = DATASET_PATH) -> tuple[list[str], np.ndarray]:
+    csv.field_size_limit(1 << 30)
+    texts, labels = [], []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            texts.append(preprocess_text(row["text"]))
+            labels.append(ast.literal_eval(row["labels"]))
+    return texts, np.asarray(labels, dtype=np.float32)
+
+def archive_texts(limit: int, extra_dir: str | None = None) -> list[str]:
+    """Неразмеченные тексты: сохранённые заявки и, при желании, папка с резюме."""
+    texts = []
+    if limit:
+        from utils.db import get_connection
+        conn = None
+        try:
+            conn = get_connection()
+            with conn.cursor() as cur:
+                cur.execute("SELECT resume_text FROM resume_records WHERE resume_text IS NOT NULL "
+                            "ORDER BY id DESC LIMIT %s", (limit,))
+                texts += [r[0] for r in cur]
+        except Exception:
+            logger.warning("Архив заявок недоступен, обучаемся без него", exc_info=True)
+        finally:
+            if conn is not None:
+                conn.close()
+    if extra_dir:
+        for name in sorted(os.listdir(extra_dir)):
+            raw = read_resume_from_file(os.path.join(extra_dir, name))
+            if raw and raw.strip():
+                texts.append(preprocess_text(raw))
+    return texts
+
+
+# ─── Учитель и ученик ─────────────────────────────────────────────────────────
+def teacher_logits(tokenizer, model, texts: list[str], batch_size: int = 16) -> np.ndarray:
+    from utils.model import predict_batch
+    probs = np.concatenate([
+        predict_batch(tokenizer, model, texts[i:i + batch_size])
+        for i in range(0, len(texts), batch_size)
+    ])
+    probs = np.clip(probs, 1e-6, 1 - 1e-6)
+    return np.log(probs) - np.log1p(-probs)
+
+def shrink_teacher(teacher, num_layers: int):
+    """Копия учителя, в энкодере которой оставлены num_layers слоёв через равные промежутки."""
+    student = copy.deepcopy(teacher)
+    encoder = student.base_model.encoder
+    total = len(encoder.layer)
+    keep = sorted({int(round(i)) for i in np.linspace(0, total - 1, num_layers)})
+    encoder.layer = torch.nn.ModuleList(encoder.layer[i] for i in keep)
+    student.config.num_hidden_layers = len(keep)
+    logger.info(f"Ученик: слои учителя {keep} из {total}")
+    return student
+
+def build_student(teacher_tokenizer, teacher, num_layers: int, checkpoint: str | None):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    if checkpoint:
+        tokenizer = AutoTokenizer.from_pretrained(checkpoint)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            checkpoint, num_labels=len(competency_list), problem_type="multi_label_classification",
+        )
+    else:
+        tokenizer, model = teacher_tokenizer, shrink_teacher(teacher, num_layers)
+    for p in model.parameters():
+        p.requires_grad_(True)
+    return tokenizer, model
+
+
+# ─── Обучение ─────────────────────────────────────────────────────────────────
+def distill(tokenizer, student, texts: list[str], soft_logits: np.ndarray, labels: np.ndarray,
+            has_label: np.ndarray, epochs: int = 3, batch_size: int = 8, lr: float = 5e-5,
+            temperature: float = 2.0, alpha: float = 0.5, max_length: int = MAX_LENGTH):
+    """
+    Лосс: BCE к вероятностям учителя при температуре T (масштаб T²)
+    плюс alpha · BCE к истинным меткам там, где они есть.
+    """
+    from transformers import get_linear_schedule_with_warmup
+
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    soft = torch.tensor(soft_logits, dtype=torch.float32)
+    hard = torch.tensor(labels, dtype=torch.float32)
+    mask = torch.tensor(has_label, dtype=torch.float32)
+
+    steps = epochs * ((len(texts) + batch_size - 1) // batch_size)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr, weight_decay=0.01)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(0.06 * steps), steps)
+    student.train()
+    step = 0
+    started = time.perf_counter()
+    for epoch in range(epochs):
+        order = list(range(len(texts)))
+        random.shuffle(order)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            batch = tokenizer.pad({k: [encodings[k][i] for i in idx] for k in encodings},
+                                  return_tensors="pt")
+            logits = student(**batch).logits
+            targets = torch.sigmoid(soft[idx] / temperature)
+            loss = F.binary_cross_entropy_with_logits(logits / temperature, targets) * temperature ** 2
+            m = mask[idx]
+            if alpha and m.sum() > 0:
+                per_row = F.binary_cross_entropy_with_logits(logits, hard[idx], reduction="none").mean(dim=1)
+                loss = loss + alpha * (per_row * m).sum() / m.sum()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+            step += 1
+            if step % 20 == 0 or step == steps:
+                elapsed = time.perf_counter() - started
+                logger.info(f"эпоха {epoch + 1}/{epochs}, шаг {step}/{steps}, loss {loss.item():.4f}, "
+                            f"{step * batch_size / elapsed:.1f} текстов/с")
+    student.eval()
+    for p in student.parameters():
+        p.requires_grad_(False)
+    return student
+
+
+# ─── Оценка ───────────────────────────────────────────────────────────────────
+def per_competency_f1(reference: np.ndarray, predicted: np.ndarray) -> np.ndarray:
+    from sklearn.metrics import f1_score
+    return f1_score(reference, predicted, average=None, zero_division=1.0)
+
+def time_inference(tokenizer, model, texts: list[str], batch_size: int) -> float:
+    """Секунд на текст при заданном размере батча."""
+    from utils.model import predict_batch
+    predict_batch(tokenizer, model, texts[:1])
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        predict_batch(tokenizer, model, texts[i:i + batch_size])
+    return (time.perf_counter() - started) / len(texts)
+
+def evaluate(teacher_pair, student_pair, texts: list[str], labels: np.ndarray, speed_texts: int = 32) -> dict:
+    from utils.model import predict_batch
+    t_probs = np.concatenate([predict_batch(*teacher_pair, texts[i:i + 16]) for i in range(0, len(texts), 16)])
+    s_probs = np.concatenate([predict_batch(*student_pair, texts[i:i + 16]) for i in range(0, len(texts), 16)])
+    t_pred, s_pred = (t_probs > THRESHOLD).astype(int), (s_probs > THRESHOLD).astype(int)
+
+    f1_vs_teacher = per_competency_f1(t_pred, s_pred)
+    sample = texts[:speed_texts]
+    speed = {}
+    for bs in (1, 16):
+        t = time_inference(*teacher_pair, sample, bs)
+        s = time_inference(*student_pair, sample, bs)
+        speed[f"batch_{bs}"] = {"teacher_ms": round(t * 1000, 1), "student_ms": round(s * 1000, 1),
+                                "speedup": round(t / s, 2)}
+    return {
+        "threshold": THRESHOLD,
+        "eval_texts": len(texts),
+        "f1_vs_teacher": dict(zip(competency_list, np.round(f1_vs_teacher, 3).tolist())),
+        "macro_f1_vs_teacher": round(float(f1_vs_teacher.mean()), 3),
+        "macro_f1_vs_labels": {
+            "teacher": round(float(per_competency_f1(labels.astype(int), t_pred).mean()), 3),
+            "student": round(float(per_competency_f1(labels.astype(int), s_pred).mean()), 3),
+        },
+        "params": {
+            "teacher": sum(p.numel() for p in teacher_pair[1].parameters()),
+            "student": sum(p.numel() for p in student_pair[1].parameters()),
+        },
+        "speed": speed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дистилляция модели компетенций на CPU")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--archive-limit", type=int, default=5000,
+                        help="сколько неразмеченных заявок взять из БД (0 — не брать)")
+    parser.add_argument("--extra-dir", help="папка с дополнительными неразмеченными резюме")
+    parser.add_argument("--layers", type=int, default=4, help="слоёв энкодера у ученика")
+    parser.add_argument("--student-checkpoint", help="готовый небольшой энкодер вместо урезанного учителя")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.5, help="вес истинных меток")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default=STUDENT_MODEL_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    from utils.model import load_pretrained
+
+    torch.set_num_threads(args.threads)
+    random.seed(42)
+    torch.manual_seed(42)
+
+    texts, labels = load_dataset(args.dataset)
+    order = np.random.RandomState(42).permutation(len(texts))
+    n_eval = len(texts) // 5
+    eval_idx, train_idx = order[:n_eval], order[n_eval:]
+    unlabeled = archive_texts(args.archive_limit, args.extra_dir)
+    train_texts = [texts[i] for i in train_idx] + unlabeled
+    train_labels = np.concatenate([labels[train_idx], np.zeros((len(unlabeled), labels.shape[1]), np.float32)])
+    has_label = np.r_[np.ones(len(train_idx)), np.zeros(len(unlabeled))]
+    logger.info(f"Обучение: {len(train_idx)} размеченных + {len(unlabeled)} неразмеченных, проверка: {n_eval}")
+
+    teacher_tokenizer, teacher = load_pretrained()
+    started = time.perf_counter()
+    soft = teacher_logits(teacher_tokenizer, teacher, train_texts)
+    logger.info(f"Ответы учителя посчитаны за {time.perf_counter() - started:.0f} с")
+
+    tokenizer, student = build_student(teacher_tokenizer, teacher, args.layers, args.student_checkpoint)
+    student = distill(tokenizer, student, train_texts, soft, train_labels, has_label,
+                      epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+                      temperature=args.temperature, alpha=args.alpha, max_length=args.max_length)
+
+    os.makedirs(args.out, exist_ok=True)
+    tokenizer.save_pretrained(args.out)
+    student.save_pretrained(args.out, safe_serialization=True, max_shard_size="100GB")
+
+    report = evaluate((teacher_tokenizer, teacher), (tokenizer, student),
+                      [texts[i] for i in eval_idx], labels[eval_idx])
+    with open(os.path.join(args.out, "distill_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{'компетенция':<60} F1 к учителю")
+    for comp, f1 in report["f1_vs_teacher"].items():
+        print(f"{comp[:58]:<60} {f1:.3f}")
+    print(f"\nmacro-F1 к учителю: {report['macro_f1_vs_teacher']}; к разметке: "
+          f"учитель {report['macro_f1_vs_labels']['teacher']}, ученик {report['macro_f1_vs_labels']['student']}")
+    print(f"Параметров: учитель {report['params']['teacher']:,}, ученик {report['params']['student']:,}")
+    for name, s in report["speed"].items():
+        print(f"{name}: учитель {s['teacher_ms']} мс/текст, ученик {s['student_ms']} мс/текст, ×{s['speedup']}")
+    print(f"\nСнапшот ученика: {args.out}. Включить в приложении: MODEL_VARIANT=student")
+
+
+if __name__ == "__main__":
+    main()
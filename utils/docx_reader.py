@@ -0,0 +1,187 @@
+"""
+Потоковое извлечение текста из DOCX без построения объектной модели python-docx.
+
+DOCX — zip-архив; текст лежит в word/document.xml, колонтитулах
+(word/header*.xml, word/footer*.xml) и сносках. Части читаются
+инкрементальным парсером (iterparse) прямо из архива, разобранные абзацы
+сразу освобождаются. В отличие от Document(...).paragraphs учитываются
+таблицы (частое место блока «Навыки»), надписи (text boxes) и колонтитулы.
+
+    python -m utils.docx_reader bench path/to/docx_dir [--repeat 3]
+    python -m utils.docx_reader cat resume.docx
+"""
+import os
+import re
+import sys
+import time
+import zipfile
+import argparse
+import xml.etree.ElementTree as ET
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+_P, _T, _TAB, _BR, _CR = W + "p", W + "t", W + "tab", W + "br", W + "cr"
+_TC, _TR = W + "tc", W + "tr"
+_FALLBACK = MC + "Fallback"
+
+_PART_ORDER = (
+    re.compile(r"word/header\d*\.xml$"),
+    re.compile(r"word/document\.xml$"),
+    re.compile(r"word/footnotes\.xml$"),
+    re.compile(r"word/endnotes\.xml$"),
+    re.compile(r"word/footer\d*\.xml$"),
+)
+
+
+def _text_parts(names: list[str]) -> list[str]:
+    """Части с текстом: колонтитулы сверху, затем тело, сноски и нижние колонтитулы."""
+    parts = []
+    for pattern in _PART_ORDER:
+        parts += sorted(n for n in names if pattern.match(n))
+    return parts
+
+
+def iter_part_lines(stream):
+    """
+    Абзацы одной XML-части в порядке документа. Ячейки строки таблицы
+    склеиваются через « | », вложенные абзацы надписей отдаются отдельно.
+    Ветка mc:Fallback пропускается — это копия той же надписи для старых Word.
+    """
+    paragraphs = []     # стек буферов: надпись — абзац внутри абзаца
+    cells = []          # стек строк таблиц: [[текст ячейки, …], …]
+    skip = 0
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if tag == _FALLBACK:
+            skip += 1 if event == "start" else -1
+            if event == "end":
+                elem.clear()
+            continue
+        if skip:
+            continue
+        if event == "start":
+            if tag == _P:
+                paragraphs.append([])
+            elif tag == _TR:
+                cells.append([])
+            elif tag == _TC and cells:
+                cells[-1].append([])
+            continue
+
+        if tag == _T and paragraphs:
+            paragraphs[-1].append(elem.text or "")
+        elif tag == _TAB and paragraphs:
+            paragraphs[-1].append("\t")
+        elif tag in (_BR, _CR) and paragraphs:
+            paragraphs[-1].append("\n")
+        elif tag == _P and paragraphs:
+            line = "".join(paragraphs.pop()).strip()
+            if line:
+                if cells and cells[-1] and not paragraphs:
+                    cells[-1][-1].append(line)
+                else:
+                    yield line
+            elem.clear()
+        elif tag == _TR and cells:
+            row = " | ".join(" ".join(c) for c in cells.pop() if c)
+            if row:
+                # Вложенная таблица остаётся внутри ячейки внешней
+                if cells and cells[-1]:
+                    cells[-1][-1].append(row)
+                else:
+                    yield row
+            elem.clear()
+
+
+def iter_docx_lines(source):
+    """Абзацы всего документа; source — путь или файловый объект."""
+    with zipfile.ZipFile(source) as zf:
+        for name in _text_parts(zf.namelist()):
+            with zf.open(name) as stream:
+                yield from iter_part_lines(stream)
+
+
+def read_docx(source) -> str:
+    return "\n".join(iter_docx_lines(source))
+
+
+# ─── Сравнение с python-docx ──────────────────────────────────────────────────
+def read_docx_legacy(path: str) -> str:
+    from docx import Document
+    return "\n".join(para.text for para in Document(path).paragraphs)
+
+
+def _words(text: str) -> set[str]:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def benchmark(paths: list[str], repeat: int = 3) -> list[dict]:
+    """
+    Время (лучшее из repeat) и покрытие текста для обоих способов.
+    recall — доля слов python-docx, найденных потоковым парсером,
+    extra_words — слова, которые видит только потоковый парсер.
+    """
+    rows = []
+    for path in paths:
+        timings = {}
+        texts = {}
+        for label, func in (("legacy", read_docx_legacy), ("stream", read_docx)):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                texts[label] = func(path)
+                best = min(best, time.perf_counter() - started)
+            timings[label] = best
+        legacy_words, stream_words = _words(texts["legacy"]), _words(texts["stream"])
+        rows.append({
+            "file": os.path.basename(path),
+            "legacy_ms": round(timings["legacy"] * 1000, 1),
+            "stream_ms": round(timings["stream"] * 1000, 1),
+            "speedup": round(timings["legacy"] / max(timings["stream"], 1e-9), 1),
+            "legacy_chars": len(texts["legacy"]),
+            "stream_chars": len(texts["stream"]),
+            "recall": round(len(legacy_words & stream_words) / len(legacy_words), 3) if legacy_words else 1.0,
+            "extra_words": len(stream_words - legacy_words),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковое извлечение текста из DOCX")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("bench", help="Сравнить с python-docx по скорости и покрытию")
+    p.add_argument("corpus", help="Папка с .docx или отдельный файл")
+    p.add_argument("--repeat", type=int, default=3)
+    p = sub.add_parser("cat", help="Вывести извлечённый текст")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "cat":
+        print(read_docx(args.path))
+        return
+
+    if os.path.isdir(args.corpus):
+        paths = sorted(os.path.join(args.corpus, n) for n in os.listdir(args.corpus)
+                       if n.lower().endswith(".docx"))
+    else:
+        paths = [args.corpus]
+    if not paths:
+        print("Нет .docx файлов")
+        sys.exit(1)
+
+    rows = benchmark(paths, args.repeat)
+    header = list(rows[0])
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join(str(row[h]) for h in header))
+    legacy_total = sum(r["legacy_ms"] for r in rows)
+    stream_total = sum(r["stream_ms"] for r in rows)
+    print(f"\nФайлов: {len(rows)}; python-docx {legacy_total:.0f} мс, поток {stream_total:.0f} мс "
+          f"(×{legacy_total / max(stream_total, 1e-9):.1f}); "
+          f"средний recall {sum(r['recall'] for r in rows) / len(rows):.3f}; "
+          f"доп. слов {sum(r['extra_words'] for r in rows)}")
+
+
+if __name__ == "__main__":
+    main()
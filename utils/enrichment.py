@@ -0,0 +1,266 @@
+"""
+Отложенная дозагрузка GitHub после отправки заявки.
+
+В режиме GITHUB_ENRICHMENT=async кандидат получает оценку только по тексту
+резюме, а найденные ссылки ставятся в очередь github_enrichment_queue
+в той же транзакции, что и заявка. Фоновый воркер (поток в процессе
+Streamlit или отдельный процесс) забирает задания через
+FOR UPDATE SKIP LOCKED, скачивает README, заново считает модель на
+объединённом тексте и обновляет заявку: вероятности, git_available,
+url_github, текст GitHub, грейды и проценты соответствия, эмбеддинг.
+Старые и новые значения пишутся в resume_score_audit.
+
+    python -m utils.enrichment migrate   # разово: очередь и журнал изменений
+    python -m utils.enrichment worker    # отдельный воркер
+    python -m utils.enrichment drain     # обработать очередь и выйти
+    python -m utils.enrichment status    # размер очереди по статусам
+"""
+import time
+import logging
+import argparse
+import threading
+
+import numpy as np
+from psycopg2.extras import Json
+
+from utils.constants import competency_list, MODEL_VERSION
+from utils.cv_reader import preprocess_text
+from utils.db import get_connection
+from utils.github_reader import collect_github_texts
+from utils.predictions import ensure_schema as ensure_predictions_schema, thresholds_vector
+from utils.schema import Schema, connection, run_migrate
+from utils.scoring import grade_lists, profession_scores
+from utils.search import ensure_schema as ensure_search_schema
+from utils.vector_store import ensure_schema as ensure_vector_schema, save_embedding
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 300       # сек между попытками при недоступном GitHub
+IDLE_SLEEP = 2.0        # сек ожидания при пустой очереди
+LEASE = 900             # сек, после которых зависшее задание running забирает другой воркер
+
+ENRICHMENT_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS github_enrichment_queue (
+    record_id   integer PRIMARY KEY,
+    links       text[]      NOT NULL,
+    cv_preds    smallint[]  NOT NULL,
+    status      text        NOT NULL DEFAULT 'pending',  -- pending | running | done | error
+    attempts    smallint    NOT NULL DEFAULT 0,
+    not_before  timestamptz NOT NULL DEFAULT now(),
+    enqueued_at timestamptz NOT NULL DEFAULT now(),
+    finished_at timestamptz,
+    error       text
+);
+CREATE INDEX IF NOT EXISTS ix_enrichment_pending ON github_enrichment_queue (not_before)
+    WHERE status IN ('pending', 'running');
+CREATE TABLE IF NOT EXISTS resume_score_audit (
+    id            serial PRIMARY KEY,
+    record_id     integer     NOT NULL,
+    changed_at    timestamptz NOT NULL DEFAULT now(),
+    source        text        NOT NULL,
+    model_version text,
+    old_values    jsonb       NOT NULL,
+    new_values    jsonb       NOT NULL
+);
+"""
+
+_AUDITED = ["git_available", "url_github", "grade0", "grade1", "grade2", "grade3",
+            "ai_manager_score", "techan_score", "datan_score", "daten_score", "competency_probs", "model_version"]
+
+SCHEMA = Schema("utils.enrichment", ["github_enrichment_queue", "resume_score_audit"], ENRICHMENT_SCHEMA_SQL)
+ensure_schema = SCHEMA.ensure
+migrate = SCHEMA.migrate
+
+def enqueue(cur, record_id: int, links: list[str], cv_preds) -> None:
+    """Ставит заявку в очередь; cv_preds — предсказания по одному резюме, показанные кандидату."""
+    cur.execute(
+        "INSERT INTO github_enrichment_queue (record_id, links, cv_preds) VALUES (%s, %s, %s) "
+        "ON CONFLICT (record_id) DO UPDATE SET links = EXCLUDED.links, cv_preds = EXCLUDED.cv_preds, "
+        "status = 'pending', attempts = 0, not_before = now(), error = NULL",
+        (record_id, list(links), [int(p) for p in cv_preds]),
+    )
+
+
+# ─── Пересчёт одной заявки ────────────────────────────────────────────────────
+def enriched_grades(grades, cv_preds, new_preds) -> list[int]:
+    """
+    Компетенции, которые модель увидела только благодаря GitHub и которые
+    кандидат оставил на 0 по умолчанию, получают грейд 1 — как в форме.
+    Оценки, выставленные кандидатом, не понижаются.
+    """
+    return [1 if g == 0 and not cv and new else int(g)
+            for g, cv, new in zip(grades, cv_preds, new_preds)]
+
+def _grades_from_lists(row: dict) -> list[int]:
+    level = {}
+    for i in range(4):
+        for comp in row[f"grade{i}"] or []:
+            level[comp] = i
+    return [level.get(comp, 0) for comp in competency_list]
+
+def _claim(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE github_enrichment_queue
+            SET status = 'running', attempts = attempts + 1, not_before = now() + make_interval(secs => %s)
+            WHERE record_id = (
+                SELECT record_id FROM github_enrichment_queue
+                WHERE status IN ('pending', 'running') AND not_before <= now()
+                ORDER BY not_before
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING record_id, links, cv_preds, attempts
+        """, (LEASE,))
+        job = cur.fetchone()
+    conn.commit()
+    return job
+
+def _fail(conn, record_id: int, attempts: int, error: str):
+    status = "error" if attempts >= MAX_ATTEMPTS else "pending"
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE github_enrichment_queue SET status = %s, error = %s, "
+            "not_before = now() + make_interval(secs => %s) WHERE record_id = %s",
+            (status, error, RETRY_DELAY * attempts, record_id),
+        )
+    conn.commit()
+
+def process_one(conn, load_model) -> bool:
+    """Обрабатывает одно задание очереди. False — очередь пуста."""
+    from utils.inference_client import analyze_text
+
+    job = _claim(conn)
+    if job is None:
+        return False
+    record_id, links, cv_preds, attempts = job
+    try:
+        github_text, failed = collect_github_texts(links)
+        ok_links = [link for link in links if link not in failed]
+        if not ok_links:
+            raise RuntimeError(f"GitHub недоступен: {', '.join(failed)}")
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT resume_text FROM resume_records WHERE id = %s", (record_id,))
+            resume_text = (cur.fetchone() or [""])[0] or ""
+        conn.commit()
+        # Модель считаем до блокировки строки
+        probs, embedding = analyze_text(preprocess_text(resume_text + " " + github_text), load_model=load_model)
+        new_preds = (probs > thresholds_vector()).astype(int)
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(_AUDITED)} FROM resume_records WHERE id = %s FOR UPDATE",
+                        (record_id,))
+            values = cur.fetchone()
+            if values is None:
+                conn.rollback()
+                return True
+            old = dict(zip(_AUDITED, values))
+            grades = enriched_grades(_grades_from_lists(old), cv_preds, new_preds)
+            lists = grade_lists(grades)
+            new = dict(
+                git_available=True,
+                url_github=ok_links[0],
+                grade0=lists[0], grade1=lists[1], grade2=lists[2], grade3=lists[3],
+                competency_probs=[float(p) for p in probs],
+                model_version=MODEL_VERSION,
+                **profession_scores(grades),
+            )
+            assignments = ", ".join(f"{k} = %({k})s" for k in new)
+            cur.execute(f"UPDATE resume_records SET {assignments}, github_text = %(github_text)s WHERE id = %(id)s",
+                        {**new, "github_text": preprocess_text(github_text) or None, "id": record_id})
+            cur.execute(
+                "INSERT INTO resume_score_audit (record_id, source, model_version, old_values, new_values) "
+                "VALUES (%s, 'github_enrichment', %s, %s, %s)",
+                (record_id, MODEL_VERSION, Json({k: _jsonable(v) for k, v in old.items()}),
+                 Json({k: _jsonable(v) for k, v in new.items()})),
+            )
+            if embedding is not None:
+                save_embedding(cur, record_id, embedding)
+            cur.execute("UPDATE github_enrichment_queue SET status = 'done', finished_at = now(), error = NULL "
+                        "WHERE record_id = %s", (record_id,))
+        conn.commit()
+        logger.info(f"Заявка {record_id} дополнена GitHub: {len(ok_links)} профилей")
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Не удалось дополнить заявку {record_id} данными GitHub", exc_info=True)
+        _fail(conn, record_id, attempts, str(e))
+    return True
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# ─── Воркер ───────────────────────────────────────────────────────────────────
+def run_worker(load_model, stop: threading.Event | None = None, drain: bool = False) -> int:
+    """Обрабатывает очередь, пока не выставлен stop (или до опустения при drain)."""
+    done = 0
+    conn = get_connection()
+    try:
+        # Все схемы — до первой транзакции с блокировкой строки
+        ensure_search_schema(conn)
+        ensure_predictions_schema(conn)
+        ensure_vector_schema(conn)
+        ensure_schema(conn)
+        while stop is None or not stop.is_set():
+            if process_one(conn, load_model):
+                done += 1
+            elif drain:
+                break
+            else:
+                time.sleep(IDLE_SLEEP)
+    finally:
+        conn.close()
+    return done
+
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+def start_background_worker(load_model):
+    """Один фоновый поток на процесс Streamlit; повторные вызовы ничего не делают."""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return
+        _worker_thread = threading.Thread(target=_run_forever, args=(load_model,),
+                                          name="github-enrichment", daemon=True)
+        _worker_thread.start()
+
+def _run_forever(load_model):
+    while True:
+        try:
+            run_worker(load_model)
+        except Exception:
+            logger.error("Воркер дозагрузки GitHub упал, перезапуск", exc_info=True)
+            time.sleep(IDLE_SLEEP * 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дозагрузка GitHub для отправленных заявок")
+    parser.add_argument("command", choices=["migrate", "worker", "drain", "status"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+
+    if args.command == "migrate":
+        run_migrate(SCHEMA)
+        return
+    if args.command == "status":
+        with connection() as conn:
+            ensure_schema(conn)
+            with conn.cursor() as cur:
+                cur.execute("SELECT status, count(*) FROM github_enrichment_queue GROUP BY status ORDER BY status")
+                for status, n in cur.fetchall():
+                    print(f"{status}: {n}")
+        return
+
+    from functools import lru_cache
+    from utils.model import load_configured
+    load_model = lru_cache(maxsize=1)(load_configured)
+    print(f"Обработано заявок: {run_worker(load_model, drain=args.command == 'drain')}")
+
+
+if __name__ == "__main__":
+    main()
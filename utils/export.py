@@ -0,0 +1,335 @@
+"""
+Потоковая выгрузка отфильтрованных кандидатов в CSV / Parquet / XLSX
+и zip-архив с исходными файлами резюме.
+
+Строки читаются именованным (серверным) курсором psycopg2 пачками по
+EXPORT_CHUNK_ROWS и сразу дописываются в файл, поэтому память не зависит
+от размера выборки. Выгрузка идёт в фоновом пуле потоков и не блокирует
+другие сессии HR.
+
+В файлах персональные данные кандидатов, поэтому они лежат вне статики
+Streamlit (temp/exports/<id>/) и отдаются только через st.download_button
+в сессии HR, прошедшей вход. После первого скачивания файл удаляется,
+нескачанные фоновый поток удаляет через EXPORT_TTL (архив резюме —
+через CV_ZIP_TTL).
+"""
+import os
+import re
+import csv
+import time
+import uuid
+import shutil
+import logging
+import zipfile
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.path.join("temp", "exports")
+EXPORT_CHUNK_ROWS = 2000
+# XLSX строится в памяти библиотекой, поэтому только для небольших выборок
+XLSX_MAX_ROWS = 20000
+# Сколько живут нескачанные файлы и как часто их искать, сек
+EXPORT_TTL = 3600
+EXPORT_SWEEP_INTERVAL = 60
+# Архив исходных резюме — самые чувствительные данные, живёт меньше, сек
+CV_ZIP_TTL = int(os.environ.get("CV_ZIP_TTL", 900))
+# Лимит суммарного объёма резюме в одном zip-архиве, байт
+CV_ZIP_MAX_BYTES = int(os.environ.get("CV_ZIP_MAX_BYTES", 500 * 1024 * 1024))
+
+FORMATS = {"CSV": "csv", "Parquet": "parquet", "XLSX": "xlsx"}
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "zip": "application/zip",
+}
+
+# OID типов PostgreSQL → тип колонки Parquet
+_PG_INT = {20, 21, 23}
+_PG_FLOAT = {700, 701}
+_PG_NUMERIC = {1700}
+_PG_DATE = {1082}
+_PG_TIME = {1083}
+_PG_BOOL = {16}
+_PG_TIMESTAMP = {1114, 1184}
+_PG_TEXT_ARRAY = {1009, 1015}
+_PG_FLOAT_ARRAY = {1021, 1022}
+
+
+@dataclass
+class ExportJob:
+    id: str
+    fmt: str
+    filename: str
+    status: str = "running"  # running | done | error
+    rows: int = 0
+    note: str = ""
+    path: str = ""
+    error: str = ""
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def mime(self) -> str:
+        return MIME_TYPES.get(self.fmt, "application/octet-stream")
+
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+_jobs: dict[str, ExportJob] = {}
+_jobs_lock = threading.Lock()
+_sweeper = None
+
+
+# ─── Чтение серверным курсором ────────────────────────────────────────────────
+def iter_chunks(sql: str, params, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Отдаёт (description, rows) пачками. Соединение отдельное и read-only,
+    курсор именованный — Postgres держит результат у себя.
+    """
+    conn = get_connection()
+    try:
+        conn.set_session(readonly=True)
+        with conn.cursor(name=f"export_{uuid.uuid4().hex}") as cur:
+            cur.itersize = chunk_rows
+            cur.execute(sql.strip().rstrip(";"), params)
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield cur.description, rows
+    finally:
+        conn.close()
+
+def _cell(value):
+    if isinstance(value, list):
+        return "; ".join(map(str, value))
+    return value
+
+
+# ─── Писатели форматов ────────────────────────────────────────────────────────
+def write_csv(chunks, path: str) -> int:
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        header_written = False
+        for description, rows in chunks:
+            if not header_written:
+                writer.writerow([d.name for d in description])
+                header_written = True
+            writer.writerows([_cell(v) for v in row] for row in rows)
+            n += len(rows)
+    return n
+
+def arrow_schema(description):
+    import pyarrow as pa
+    fields = []
+    for d in description:
+        if d.type_code in _PG_INT:
+            t = pa.int64()
+        elif d.type_code in _PG_FLOAT or d.type_code in _PG_NUMERIC:
+            t = pa.float64()
+        elif d.type_code in _PG_BOOL:
+            t = pa.bool_()
+        elif d.type_code in _PG_TIMESTAMP:
+            t = pa.timestamp("us", tz="UTC")
+        elif d.type_code in _PG_DATE:
+            t = pa.date32()
+        elif d.type_code in _PG_TIME:
+            t = pa.time64("us")
+        elif d.type_code in _PG_TEXT_ARRAY:
+            t = pa.list_(pa.string())
+        elif d.type_code in _PG_FLOAT_ARRAY:
+            t = pa.list_(pa.float32())
+        else:
+            t = pa.string()
+        fields.append(pa.field(d.name, t))
+    return pa.schema(fields)
+
+def _arrow_value(type_code):
+    """Приведение значения psycopg2 к типу колонки из arrow_schema."""
+    if type_code in _PG_NUMERIC:
+        # numeric приходит как Decimal, а pa.float64() его не принимает
+        return lambda v: None if v is None else float(v)
+    if type_code in (_PG_INT | _PG_FLOAT | _PG_BOOL | _PG_TIMESTAMP | _PG_DATE | _PG_TIME
+                     | _PG_TEXT_ARRAY | _PG_FLOAT_ARRAY):
+        return None
+    # Остальное (uuid, json, interval, timetz …) пишется строкой
+    return lambda v: None if v is None else v if isinstance(v, str) else str(v)
+
+def arrow_batch(description, rows, schema):
+    """RecordBatch из пачки строк курсора по схеме arrow_schema(description)."""
+    import pyarrow as pa
+    arrays = []
+    for d, col, f in zip(description, zip(*rows), schema):
+        convert = _arrow_value(d.type_code)
+        if convert is not None:
+            col = [convert(v) for v in col]
+        arrays.append(pa.array(col, type=f.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def write_parquet(chunks, path: str) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    n = 0
+    writer = None
+    try:
+        for description, rows in chunks:
+            if writer is None:
+                schema = arrow_schema(description)
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            batch = arrow_batch(description, rows, schema)
+            # Каждая пачка — отдельная row group, в памяти только она
+            writer.write_batch(batch)
+            n += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+def write_xlsx(chunks, path: str) -> int:
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Кандидаты")
+    n = 0
+    header_written = False
+    for description, rows in chunks:
+        if not header_written:
+            ws.append([d.name for d in description])
+            header_written = True
+        for row in rows:
+            if n >= XLSX_MAX_ROWS:
+                raise ValueError(f"XLSX поддерживает не более {XLSX_MAX_ROWS} строк, выберите CSV или Parquet")
+            # Excel не хранит часовые пояса
+            ws.append([_cell(v.replace(tzinfo=None) if hasattr(v, "tzinfo") and v.tzinfo else v) for v in row])
+            n += 1
+    wb.save(path)
+    return n
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "xlsx": write_xlsx}
+
+
+# ─── Архив с исходными резюме ─────────────────────────────────────────────────
+def _safe_name(part) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(part or "")).strip("_")
+
+def write_cv_zip(chunks, path: str, max_bytes: int = CV_ZIP_MAX_BYTES, job=None) -> int:
+    """
+    Пишет резюме в zip по одному: surname_name_code_original_filename.
+    В памяти одновременно только один файл; при превышении max_bytes
+    архив обрезается, а в job.note пишется, сколько файлов не вошло.
+    """
+    n = skipped = total = 0
+    used_names = set()
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for _, rows in chunks:
+            for surname, name, code, original_filename, cv_file in rows:
+                data = bytes(cv_file) if cv_file is not None else b""
+                if not data:
+                    continue
+                if total + len(data) > max_bytes:
+                    skipped += 1
+                    continue
+                arcname = "_".join(filter(None, map(_safe_name, (surname, name, code, original_filename))))
+                if arcname in used_names:
+                    arcname = f"{n}_{arcname}"
+                used_names.add(arcname)
+                with zf.open(arcname, "w") as dst:
+                    dst.write(data)
+                total += len(data)
+                n += 1
+    if skipped and job is not None:
+        job.note = (f"Достигнут лимит {max_bytes // (1024 * 1024)} МБ: "
+                    f"не вошло файлов — {skipped}. Сузьте фильтры.")
+    return n
+
+
+# ─── Фоновые задания ──────────────────────────────────────────────────────────
+def _cleanup_old_exports():
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        with _jobs_lock:
+            job = _jobs.get(name)
+        if job is not None and job.status == "running":
+            continue
+        try:
+            ttl = CV_ZIP_TTL if any(f.endswith(".zip") for f in os.listdir(path)) else EXPORT_TTL
+            expired = now - os.path.getmtime(path) > ttl
+        except FileNotFoundError:
+            continue
+        if expired:
+            discard(name)
+
+def _sweep_forever():
+    while True:
+        time.sleep(EXPORT_SWEEP_INTERVAL)
+        try:
+            _cleanup_old_exports()
+        except Exception:
+            logger.error("Не удалось удалить устаревшие выгрузки", exc_info=True)
+
+def _start_sweeper():
+    global _sweeper
+    with _jobs_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name="export-sweeper", daemon=True)
+            _sweeper.start()
+
+def _run(job: ExportJob, sql: str, params):
+    try:
+        if job.fmt == "zip":
+            # Блобы тянем по одной строке за раз
+            job.rows = write_cv_zip(iter_chunks(sql, params, chunk_rows=1), job.path, job=job)
+        else:
+            job.rows = WRITERS[job.fmt](iter_chunks(sql, params), job.path)
+        job.finished = time.perf_counter()
+        job.status = "done"
+    except Exception as e:
+        logger.error("Ошибка выгрузки кандидатов", exc_info=True)
+        shutil.rmtree(os.path.dirname(job.path), ignore_errors=True)
+        job.finished = time.perf_counter()
+        job.status, job.error = "error", str(e)
+
+def start_export(sql: str, params, fmt: str, basename: str) -> ExportJob:
+    """
+    Ставит выгрузку в фоновый пул и сразу возвращает задание.
+    sql/params — тот же запрос, что строит вкладка, fmt — csv|parquet|xlsx|zip
+    (для zip запрос должен вернуть surname, name, code, original_filename, cv_file).
+    """
+    _start_sweeper()
+    _cleanup_old_exports()
+    job_id = uuid.uuid4().hex
+    filename = f"{basename}.{fmt}"
+    job_dir = os.path.join(EXPORT_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    job = ExportJob(id=job_id, fmt=fmt, filename=filename,
+                    path=os.path.join(job_dir, filename), started=time.perf_counter())
+    with _jobs_lock:
+        _jobs[job_id] = job
+    _pool.submit(_run, job, sql, params)
+    return job
+
+def get_job(job_id: str) -> ExportJob | None:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def read_result(job: ExportJob) -> bytes | None:
+    """Готовый файл целиком — для st.download_button; None, если его уже удалили."""
+    try:
+        with open(job.path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def discard(job_id: str):
+    """Удаляет задание и его файл (после скачивания или по EXPORT_TTL)."""
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+    shutil.rmtree(os.path.join(EXPORT_DIR, job_id), ignore_errors=True)
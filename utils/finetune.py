@@ -0,0 +1,314 @@
+"""
+Дообучение модели компетенций на CPU на новых размеченных резюме.
+
+    python -m utils.finetune --dataset others/resume_dataset.csv --epochs 3
+    python -m utils.finetune --resume                   # продолжить с последнего чекпоинта
+
+Датасет (CSV с колонками text и labels, как others/resume_dataset.csv)
+токенизируется один раз: id токенов всех текстов лежат подряд в
+FINETUNE_CACHE_DIR/<ключ>/input_ids.bin (int32, читается через np.memmap),
+рядом offsets.npy и labels.npy. Ключ — хеш файла, токенизатора, MAX_LENGTH
+и TEXT_PACKING, поэтому повторные запуски не токенизируют заново.
+
+Батчи собираются по корзинам длины: примеры перемешиваются, внутри
+«мегабатча» сортируются по длине и режутся на батчи, которые снова
+перемешиваются, — паддинг только до самого длинного в батче. Градиент
+копится --accumulate батчей. Чекпоинт (веса, оптимизатор, планировщик,
+позиция в эпохе, состояние ГСЧ) пишется каждые --checkpoint-every шагов,
+--resume продолжает с того же батча. Лучшая по micro-F1 на отложенных
+20 % эпоха сохраняется в --out как локальный снапшот (model.safetensors),
+который загружает приложение при MODEL_LOCAL_DIR=<out>.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from utils.constants import competency_list, THRESHOLD, MAX_LENGTH, TEXT_PACKING
+
+logger = logging.getLogger(__name__)
+
+DATASET_PATH = os.path.join("others", "resume_dataset.csv")
+FINETUNE_CACHE_DIR = os.path.join("models", "finetune_cache")
+FINETUNED_MODEL_DIR = os.path.join("models", "resume-ai-competency-finetuned")
+# Сколько батчей в «мегабатче», внутри которого сортируем по длине
+BUCKET_FACTOR = 50
+TOKENIZE_CHUNK = 256
+
+
+# ─── Токенизированное хранилище ───────────────────────────────────────────────
+class TokenStore:
+    """Тексты, токенизированные один раз; id токенов читаются из memmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.labels = np.load(os.path.join(path, "labels.npy"), mmap_mode="r")
+        self.ids = np.memmap(os.path.join(path, "input_ids.bin"), dtype=np.int32, mode="r")
+        self.lengths = np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def collate(self, idx: np.ndarray, pad_id: int) -> dict:
+        """Батч с паддингом до самого длинного примера в нём."""
+        width = int(self.lengths[idx].max())
+        input_ids = np.full((len(idx), width), pad_id, dtype=np.int64)
+        mask = np.zeros((len(idx), width), dtype=np.int64)
+        for row, i in enumerate(idx):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            input_ids[row, :end - start] = self.ids[start:end]
+            mask[row, :end - start] = 1
+        return {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(mask),
+            "labels": torch.from_numpy(np.asarray(self.labels[idx], dtype=np.float32)),
+        }
+
+def _store_key(dataset: str, tokenizer, max_length: int) -> str:
+    h = hashlib.sha256(f"{tokenizer.name_or_path}:{len(tokenizer)}:{max_length}:{TEXT_PACKING}".encode())
+    with open(dataset, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def build_store(dataset: str, tokenizer, max_length: int = MAX_LENGTH,
+                cache_dir: str = FINETUNE_CACHE_DIR) -> TokenStore:
+    """Токенизирует датасет в cache_dir/<ключ>/, если его там ещё нет."""
+    from utils.distill import load_dataset
+
+    path = os.path.join(cache_dir, _store_key(dataset, tokenizer, max_length))
+    if os.path.exists(os.path.join(path, "meta.json")):
+        logger.info(f"Токены из кэша {path}")
+        return TokenStore(path)
+
+    texts, labels = load_dataset(dataset)
+    if TEXT_PACKING == "sections":
+        from utils.sections import pack_for_model
+        texts = pack_for_model(texts, tokenizer, max_length)
+    os.makedirs(path, exist_ok=True)
+    started = time.perf_counter()
+    lengths = []
+    with open(os.path.join(path, "input_ids.bin"), "wb") as f:
+        for i in range(0, len(texts), TOKENIZE_CHUNK):
+            encoded = tokenizer(texts[i:i + TOKENIZE_CHUNK], truncation=True, max_length=max_length)
+            for ids in encoded["input_ids"]:
+                f.write(np.asarray(ids, dtype=np.int32).tobytes())
+                lengths.append(len(ids))
+    np.save(os.path.join(path, "offsets.npy"), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+    np.save(os.path.join(path, "labels.npy"), labels.astype(np.float32))
+    # meta.json последним: по нему видно, что хранилище дописано
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"dataset": dataset, "tokenizer": tokenizer.name_or_path, "max_length": max_length,
+                   "text_packing": TEXT_PACKING, "texts": len(texts), "tokens": int(sum(lengths))},
+                  f, ensure_ascii=False, indent=2)
+    logger.info(f"Токенизировано {len(texts)} текстов за {time.perf_counter() - started:.1f} с → {path}")
+    return TokenStore(path)
+
+
+# ─── Батчи ────────────────────────────────────────────────────────────────────
+def bucketed_batches(indices: np.ndarray, lengths: np.ndarray, batch_size: int, seed: int,
+                     bucket_factor: int = BUCKET_FACTOR) -> list[np.ndarray]:
+    """Батчи из примеров близкой длины в случайном, но воспроизводимом по seed порядке."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(indices)
+    mega = batch_size * bucket_factor
+    batches = []
+    for i in range(0, len(order), mega):
+        chunk = order[i:i + mega]
+        chunk = chunk[np.argsort(lengths[chunk], kind="stable")]
+        batches += [chunk[j:j + batch_size] for j in range(0, len(chunk), batch_size)]
+    rng.shuffle(batches)
+    return batches
+
+
+# ─── Чекпоинты ────────────────────────────────────────────────────────────────
+def save_checkpoint(path: str, model, optimizer, scheduler, state: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save({
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "scheduler": scheduler.state_dict(),
+        "torch_rng": torch.get_rng_state(),
+        **state,
+    }, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def load_checkpoint(path: str, model, optimizer, scheduler) -> dict:
+    ckpt = torch.load(path, map_location="cpu", weights_only=False)
+    model.load_state_dict(ckpt.pop("model"))
+    optimizer.load_state_dict(ckpt.pop("optimizer"))
+    scheduler.load_state_dict(ckpt.pop("scheduler"))
+    torch.set_rng_state(ckpt.pop("torch_rng"))
+    return ckpt
+
+
+# ─── Обучение ─────────────────────────────────────────────────────────────────
+def predict_logits(model, store: TokenStore, indices: np.ndarray, pad_id: int, batch_size: int = 32) -> np.ndarray:
+    """Логиты на indices (в их порядке) с теми же корзинами длины, без перемешивания."""
+    order = indices[np.argsort(store.lengths[indices], kind="stable")]
+    out = np.empty((len(indices), len(competency_list)), dtype=np.float32)
+    position = {int(i): k for k, i in enumerate(indices)}
+    model.eval()
+    with torch.no_grad():
+        for j in range(0, len(order), batch_size):
+            idx = order[j:j + batch_size]
+            batch = store.collate(idx, pad_id)
+            batch.pop("labels")
+            logits = model(**batch).logits.numpy()
+            for i, row in zip(idx, logits):
+                out[position[int(i)]] = row
+    model.train()
+    return out
+
+def train(model, store: TokenStore, train_idx: np.ndarray, eval_idx: np.ndarray, pad_id: int, out_dir: str,
+          save_model, epochs: int = 3, batch_size: int = 8, accumulate: int = 4, lr: float = 3e-5,
+          warmup: float = 0.06, checkpoint_every: int = 50, seed: int = 42, resume: bool = False) -> dict:
+    """
+    Обучение с накоплением градиента; save_model(model) вызывается, когда
+    micro-F1 на eval_idx лучше прежнего. Возвращает отчёт.
+    """
+    from transformers import get_linear_schedule_with_warmup
+    from utils.calibrate import evaluate
+
+    micro_batches = (len(train_idx) + batch_size - 1) // batch_size
+    steps = epochs * ((micro_batches + accumulate - 1) // accumulate)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=0.01)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(warmup * steps), steps)
+    ckpt_path = os.path.join(out_dir, "checkpoint", "training_state.pt")
+
+    state = {"epoch": 0, "batch": 0, "step": 0, "samples": 0, "tokens": 0, "padded": 0,
+             "seconds": 0.0, "history": [], "best_micro_f1": -1.0}
+    if resume and os.path.exists(ckpt_path):
+        state.update(load_checkpoint(ckpt_path, model, optimizer, scheduler))
+        logger.info(f"Продолжаем с эпохи {state['epoch'] + 1}, батча {state['batch']}, шага {state['step']}")
+    model.train()
+
+    for epoch in range(state["epoch"], epochs):
+        batches = bucketed_batches(train_idx, store.lengths, batch_size, seed + epoch)
+        started, samples0, tokens0, padded0 = time.perf_counter(), state["samples"], state["tokens"], state["padded"]
+        for b in range(state["batch"], len(batches)):
+            batch = store.collate(batches[b], pad_id)
+            labels = batch.pop("labels")
+            loss = F.binary_cross_entropy_with_logits(model(**batch).logits, labels) / accumulate
+            loss.backward()
+            state["samples"] += len(batches[b])
+            state["tokens"] += int(batch["attention_mask"].sum())
+            state["padded"] += batch["attention_mask"].numel()
+
+            if (b + 1) % accumulate == 0 or b + 1 == len(batches):
+                torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad()
+                state["step"] += 1
+                if state["step"] % 10 == 0:
+                    elapsed = time.perf_counter() - started
+                    logger.info(
+                        f"эпоха {epoch + 1}/{epochs}, шаг {state['step']}/{steps}, loss {loss.item() * accumulate:.4f}, "
+                        f"{(state['samples'] - samples0) / elapsed:.1f} примеров/с, "
+                        f"{(state['tokens'] - tokens0) / elapsed:.0f} токенов/с, "
+                        f"паддинг {1 - (state['tokens'] - tokens0) / max(state['padded'] - padded0, 1):.1%}"
+                    )
+                if state["step"] % checkpoint_every == 0:
+                    state["batch"] = b + 1
+                    state["seconds"] += time.perf_counter() - started
+                    save_checkpoint(ckpt_path, model, optimizer, scheduler, state)
+                    state["seconds"] -= time.perf_counter() - started
+
+        state["seconds"] += time.perf_counter() - started
+        metrics = evaluate(predict_logits(model, store, eval_idx, pad_id), store.labels[eval_idx], THRESHOLD)
+        epoch_report = {
+            "epoch": epoch + 1, "micro_f1": metrics["micro_f1"], "macro_f1": metrics["macro_f1"],
+            "samples_per_second": round((state["samples"] - samples0) / (time.perf_counter() - started), 2),
+        }
+        state["history"].append(epoch_report)
+        logger.info(f"эпоха {epoch + 1}: micro-F1 {metrics['micro_f1']:.4f}, macro-F1 {metrics['macro_f1']:.4f}")
+        if metrics["micro_f1"] > state["best_micro_f1"]:
+            state["best_micro_f1"] = metrics["micro_f1"]
+            save_model(model)
+        state.update(epoch=epoch + 1, batch=0)
+        save_checkpoint(ckpt_path, model, optimizer, scheduler, state)
+
+    return {
+        "epochs": epochs, "steps": state["step"], "batch_size": batch_size, "accumulate": accumulate,
+        "lr": lr, "train_texts": int(len(train_idx)), "eval_texts": int(len(eval_idx)),
+        "samples_per_second": round(state["samples"] / max(state["seconds"], 1e-9), 2),
+        "tokens_per_second": round(state["tokens"] / max(state["seconds"], 1e-9), 1),
+        "padding_share": round(1 - state["tokens"] / max(state["padded"], 1), 4),
+        "best_micro_f1": state["best_micro_f1"],
+        "history": state["history"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дообучение модели компетенций на CPU")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--base", help="чекпоинт или папка модели (по умолчанию — текущая модель приложения)")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--accumulate", type=int, default=4, help="батчей на шаг оптимизатора")
+    parser.add_argument("--lr", type=float, default=3e-5)
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--eval-share", type=float, default=0.2)
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="шагов оптимизатора")
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=FINETUNE_CACHE_DIR)
+    parser.add_argument("--out", default=FINETUNED_MODEL_DIR)
+    parser.add_argument("--resume", action="store_true", help="продолжить с чекпоинта в --out")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    if args.base:
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(args.base)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            args.base, num_labels=len(competency_list), problem_type="multi_label_classification",
+        )
+    else:
+        from utils.model import load_configured
+        tokenizer, model = load_configured()
+    for p in model.parameters():
+        p.requires_grad_(True)
+
+    store = build_store(args.dataset, tokenizer, args.max_length, args.cache_dir)
+    order = np.random.RandomState(args.seed).permutation(len(store))
+    n_eval = int(len(store) * args.eval_share)
+    eval_idx, train_idx = np.sort(order[:n_eval]), order[n_eval:]
+    logger.info(f"Обучение: {len(train_idx)} текстов, проверка: {n_eval}; "
+                f"средняя длина {store.lengths.mean():.0f} токенов")
+
+    def save_model(m):
+        os.makedirs(args.out, exist_ok=True)
+        tokenizer.save_pretrained(args.out)
+        m.save_pretrained(args.out, safe_serialization=True, max_shard_size="100GB")
+
+    report = train(model, store, train_idx, eval_idx, tokenizer.pad_token_id, args.out, save_model,
+                   epochs=args.epochs, batch_size=args.batch_size, accumulate=args.accumulate, lr=args.lr,
+                   checkpoint_every=args.checkpoint_every, seed=args.seed, resume=args.resume)
+    report.update(dataset=args.dataset, store=store.path, max_length=args.max_length, text_packing=TEXT_PACKING)
+    with open(os.path.join(args.out, "training_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for h in report["history"]:
+        print(f"эпоха {h['epoch']}: micro-F1 {h['micro_f1']:.4f}, macro-F1 {h['macro_f1']:.4f}, "
+              f"{h['samples_per_second']} примеров/с")
+    print(f"Всего: {report['samples_per_second']} примеров/с, {report['tokens_per_second']} токенов/с, "
+          f"доля паддинга {report['padding_share']:.1%}")
+    print(f"\nЛучшая модель: {args.out}. Включить в приложении: "
+          f"MODEL_LOCAL_DIR={args.out} MODEL_VERSION=<метка версии>")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import re
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.constants import GITHUB_API_URL
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +16,7 @@ def get_github_username_from_url(url):
     return match.group(1) if match else None
 
 def get_repos(username):
-    url = f"https://api.github.com/users/{username}/repos"
+    url = f"{GITHUB_API_URL}/users/{username}/repos"
     response = requests.get(url)
     if response.status_code == 200:
         return response.json()
@@ -21,7 +24,7 @@ def get_repos(username):
     return []
 
 def get_readme_text(username, repo):
-    url = f"https://api.github.com/repos/{username}/{repo}/readme"
+    url = f"{GITHUB_API_URL}/repos/{username}/{repo}/readme"
     headers = {'Accept': 'application/vnd.github.v3.raw'}
     response = requests.get(url, headers=headers)
     return response.text if response.status_code == 200 else ""
@@ -31,4 +34,21 @@ def collect_github_text(github_url):
     if not username:
         return ""
     repos = get_repos(username)
-    return " ".join(get_readme_text(username, repo['name']) for repo in repos)
\ No newline at end of file
+    return " ".join(get_readme_text(username, repo['name']) for repo in repos)
+
+def collect_github_texts(links, fetch=collect_github_text):
+    """
+    README всех профилей параллельно. Возвращает (общий текст, упавшие ссылки).
+    """
+    texts, failed = [], []
+    if not links:
+        return "", failed
+    with ThreadPoolExecutor(max_workers=min(4, len(links))) as pool:
+        futures = {link: pool.submit(fetch, link) for link in links}
+        for link, fut in futures.items():
+            try:
+                texts.append(fut.result())
+            except Exception:
+                logger.warning(f"Ошибка при загрузке GitHub-текста {link}", exc_info=True)
+                failed.append(link)
+    return " ".join(texts), failed
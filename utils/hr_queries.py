@@ -0,0 +1,126 @@
+import datetime
+
+from utils.predictions import predicted_select
+from utils.scoring import score_columns
+from utils.search import search_condition, search_select
+
+# Колонки таблицы кандидатов на вкладке профессии (без файла резюме)
+CANDIDATE_COLUMNS = [
+    "id",
+    "form_submitted_at",
+    "uploaded_at",
+    "sender_email",
+    "name",
+    "surname",
+    "patronymic",
+    "telegram_handle",
+    "phone",
+    "score",
+    "git_available",
+    "selected_professions",
+    "code",
+    "hr_email",
+    "grade0",
+    "grade1",
+    "grade2",
+    "grade3",
+    "original_filename",
+    "model_version",
+]
+
+# Колонки общей сводки: всё, кроме файлов и текстов резюме
+OVERVIEW_COLUMNS = [
+    "id",
+    "form_submitted_at",
+    "uploaded_at",
+    "sender_email",
+    "name",
+    "surname",
+    "phone",
+    "hr_email",
+    "git_available",
+    "selected_professions",
+    "grade0",
+    "grade1",
+    "grade2",
+    "grade3",
+    "original_filename",
+    *score_columns.values(),
+]
+
+# ─── SQL для вкладок профессий ────────────────────────────────────────────────
+def build_where(prof, date_range, hr_emails, git_choice, req1, req2, req3,
+                sec_prof, min_score, max_score, search: str = "") -> tuple[str, list]:
+    """
+    Собирает WHERE по фильтрам вкладки. Возвращает (условие, параметры).
+    search — полнотекстовый запрос по тексту резюме и GitHub.
+    """
+    score_col = score_columns[prof]
+    conditions = ["%s = ANY(selected_professions)"]
+    params = [prof]
+
+    start_date, end_date = date_range
+    # Полуоткрытый интервал по самой колонке, чтобы отсекались лишние секции
+    conditions.append("uploaded_at >= %s AND uploaded_at < %s")
+    params += [start_date, end_date + datetime.timedelta(days=1)]
+    if hr_emails:
+        conditions.append("hr_email = ANY(%s)")
+        params.append(hr_emails)
+    if git_choice != "Любой":
+        conditions.append("git_available = %s")
+        params.append(git_choice == "Да")
+    for comp in req1:
+        conditions.append("%s = ANY(grade1)")
+        params.append(comp)
+    for comp in req2:
+        conditions.append("%s = ANY(grade2)")
+        params.append(comp)
+    for comp in req3:
+        conditions.append("%s = ANY(grade3)")
+        params.append(comp)
+    if sec_prof != "Не важно":
+        conditions.append("%s = ANY(selected_professions)")
+        params.append(sec_prof)
+    conditions.append(f"{score_col} BETWEEN %s AND %s")
+    params += [min_score, max_score]
+    if search:
+        cond, cond_params = search_condition(search)
+        conditions.append(cond)
+        params += cond_params
+    return " AND ".join(conditions), params
+
+def candidates_sql(prof: str, where_clause: str, params: list, order_by: str = "",
+                   search: str = "", thresholds=None) -> tuple[str, list]:
+    """
+    SELECT для таблицы кандидатов. model_competencies выводится из сохранённых
+    вероятностей при порогах thresholds; при поиске добавляются rank и snippet.
+    Параметры колонок идут перед параметрами WHERE. Возвращает (sql, параметры).
+    """
+    columns = [f"{score_columns[prof]} AS score" if c == "score" else c for c in CANDIDATE_COLUMNS]
+    predicted, select_params = predicted_select(thresholds)
+    columns.append(predicted)
+    if search:
+        extra, extra_params = search_select(search)
+        columns.append(extra)
+        select_params += extra_params
+    select = ",\n                ".join(columns)
+    order = f"\n            ORDER BY {order_by}" if order_by else ""
+    sql = f"""
+            SELECT
+                {select}
+            FROM resume_records
+            WHERE {where_clause}{order};
+        """
+    return sql, select_params + list(params)
+
+def cv_files_sql(where_clause: str, order_by: str = "id") -> str:
+    # Только то, что нужно для имени файла в архиве, и сам файл
+    return f"""
+            SELECT surname, name, code, original_filename, cv_file
+            FROM resume_records
+            WHERE {where_clause}
+            ORDER BY {order_by};
+        """
+
+def overview_sql() -> str:
+    return f"SELECT {', '.join(OVERVIEW_COLUMNS)} FROM resume_records;"
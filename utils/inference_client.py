@@ -0,0 +1,71 @@
+import logging
+
+import numpy as np
+import requests
+
+from utils.cache import CACHES, BoundedCache, content_key
+from utils.constants import INFERENCE_SERVER_URL, INFERENCE_TIMEOUT, INFERENCE_CACHE_LIMITS
+from utils.model import predict_batch
+
+logger = logging.getLogger(__name__)
+
+# Кэш (вероятности, эмбеддинг) по хешу предобработанного текста
+inference_cache = CACHES.setdefault("inference", BoundedCache("inference", **INFERENCE_CACHE_LIMITS))
+
+# ─── Тонкий клиент сервера инференса ──────────────────────────────────────────
+def predict_remote(text: str, timeout: float = INFERENCE_TIMEOUT) -> tuple[np.ndarray, np.ndarray | None]:
+    resp = requests.post(f"{INFERENCE_SERVER_URL}/predict", json={"text": text}, timeout=timeout)
+    resp.raise_for_status()
+    payload = resp.json()
+    embedding = payload.get("embedding")
+    return (np.asarray(payload["probs"], dtype=np.float32),
+            np.asarray(embedding, dtype=np.float16) if embedding is not None else None)
+
+def server_available(timeout: float = 0.5) -> bool:
+    if not INFERENCE_SERVER_URL:
+        return False
+    try:
+        return requests.get(f"{INFERENCE_SERVER_URL}/health", timeout=timeout).ok
+    except requests.RequestException:
+        return False
+
+def warm_up(load_model) -> str:
+    """
+    Готовит инференс заранее: если сервер жив — ничего не грузим,
+    иначе загружаем модель в процесс (st.cache_resource запомнит её).
+    """
+    if server_available():
+        return "server"
+    load_model()
+    return "local"
+
+def analyze_text(text: str, load_model=None) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Вероятности компетенций и эмбеддинг (float16) для одного текста.
+    Сначала смотрим кэш, затем идём в локальный сервер инференса; при таймауте,
+    отказе (503 — очередь заполнена) или недоступности считаем в процессе.
+    load_model — функция, возвращающая (tokenizer, model) для фолбэка.
+    """
+    key = content_key(text)
+    result, found = inference_cache.get(key)
+    if found:
+        return result
+
+    result = None
+    if INFERENCE_SERVER_URL:
+        try:
+            result = predict_remote(text)
+        except requests.RequestException as e:
+            logger.warning(f"Сервер инференса недоступен, считаем локально: {e}")
+    if result is None:
+        if load_model is None:
+            from utils.cached_app_utils import load_model_safe as load_model
+        tokenizer, model = load_model()
+        probs, embeddings = predict_batch(tokenizer, model, [text], return_embeddings=True)
+        result = (probs[0], embeddings[0].astype(np.float16))
+
+    inference_cache.put(key, result)
+    return result
+
+def predict_probs(text: str, load_model=None) -> np.ndarray:
+    return analyze_text(text, load_model)[0]
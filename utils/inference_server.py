@@ -0,0 +1,194 @@
+"""
+Локальный сервер инференса с динамическим микробатчингом.
+
+Запуск:
+    python -m utils.inference_server --port 8600 --threads 4
+
+Все сессии Streamlit отправляют тексты сюда; сервер копит запросы
+несколько миллисекунд, собирает их в батч с паддингом и прогоняет через
+одну модель с фиксированным числом потоков torch.
+
+    POST /predict  {"text": "..."}  → {"probs": [...], "embedding": [...]}
+    GET  /metrics                   → очередь, батчи, задержки, отказы
+    GET  /health                    → {"status": "ok"}
+"""
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+
+from utils.model import get_warm_model, predict_batch, warm_up_model
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Очередь инференса переполнена — клиенту нужно отступить."""
+
+
+# ─── Микробатчер ─────────────────────────────────────────────────────────────
+class MicroBatcher:
+    def __init__(self, tokenizer, model, max_batch_size=16, max_wait_ms=5.0, max_queue=256):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "rejected": 0,
+            "batches": 0,
+            "batched_items": 0,
+            "max_batch_seen": 0,
+            "inference_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+        }
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        fut = Future()
+        try:
+            self._queue.put_nowait((text, fut, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError
+        with self._lock:
+            self._stats["requests"] += 1
+        return fut
+
+    def _collect(self):
+        # Ждём первый запрос без ограничения, остальные — не дольше max_wait
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [item[0] for item in batch]
+            started = time.perf_counter()
+            try:
+                probs, embeddings = predict_batch(self.tokenizer, self.model, texts, return_embeddings=True)
+            except Exception as e:
+                logger.error("Ошибка инференса в батче", exc_info=True)
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+            for (_, fut, _), row, emb in zip(batch, probs, embeddings):
+                fut.set_result((row.tolist(), emb.astype("float16").tolist()))
+            with self._lock:
+                s = self._stats
+                s["batches"] += 1
+                s["batched_items"] += len(batch)
+                s["max_batch_seen"] = max(s["max_batch_seen"], len(batch))
+                s["inference_seconds"] += elapsed
+                s["queue_wait_seconds"] += sum(started - t for _, _, t in batch)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize()
+        s["queue_capacity"] = self._queue.maxsize
+        s["avg_batch_size"] = s["batched_items"] / s["batches"] if s["batches"] else 0.0
+        s["avg_queue_wait_ms"] = (s["queue_wait_seconds"] / s["batched_items"] * 1000
+                                  if s["batched_items"] else 0.0)
+        s["torch_threads"] = torch.get_num_threads()
+        return s
+
+
+# ─── HTTP-обёртка ────────────────────────────────────────────────────────────
+def make_handler(batcher: MicroBatcher, request_timeout: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send_json(200, batcher.metrics())
+            elif self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                text = json.loads(self.rfile.read(length))["text"]
+            except Exception:
+                self._send_json(400, {"error": "ожидается JSON вида {\"text\": ...}"})
+                return
+            try:
+                fut = batcher.submit(text)
+            except QueueFullError:
+                # Backpressure: клиент уйдёт в локальный фолбэк или повторит позже
+                self._send_json(503, {"error": "queue full"}, {"Retry-After": "1"})
+                return
+            try:
+                probs, embedding = fut.result(timeout=request_timeout)
+            except Exception:
+                self._send_json(500, {"error": "inference failed"})
+                return
+            self._send_json(200, {"probs": probs, "embedding": embedding})
+
+        def log_message(self, fmt, *args):
+            logger.debug(fmt, *args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный сервер инференса CV-Analyzer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--threads", type=int, default=4, help="Потоки torch (intra-op)")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    # Фиксированный бюджет потоков: один пул на весь процесс
+    torch.set_num_threads(args.threads)
+    torch.set_num_interop_threads(1)
+
+    # Загружаем и прогреваем модель до того, как сервер начнёт принимать запросы
+    timings = warm_up_model()
+    logger.info(f"Модель прогрета: {timings}")
+    tokenizer, model = get_warm_model()
+    batcher = MicroBatcher(tokenizer, model, args.max_batch_size, args.max_wait_ms, args.max_queue)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, args.request_timeout))
+    logger.info(f"Сервер инференса слушает {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
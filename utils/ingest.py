@@ -0,0 +1,262 @@
+"""
+Массовая загрузка архивных резюме в resume_records через COPY.
+
+    python -m utils.ingest path/to/dir_or_archive.zip [--batch-size 16] [--copy-rows 500] [--copy-mb 64]
+
+Файлы (PDF, DOCX, TXT) читаются потоком из каталога или zip-архива,
+прогоняются через модель батчами, грейды и проценты соответствия считаются
+по той же матрице, что и в приложении. Строки копятся в буфере и заливаются
+COPY во временную таблицу, откуда переносятся в resume_records с
+ON CONFLICT DO NOTHING. Вместе с заявкой сохраняются текст резюме (для
+полнотекстового поиска), MinHash-сигнатура и эмбеддинг из того же прогона
+модели — отдельные backfill для загруженного архива не нужны. Ключ идемпотентности — sha256 файла (file_hash),
+каждая пачка коммитится отдельно, поэтому после падения достаточно
+перезапустить команду: уже загруженные файлы будут пропущены.
+"""
+import io
+import os
+import csv
+import sys
+import time
+import uuid
+import zipfile
+import hashlib
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils.constants import MODEL_VERSION
+from utils.cv_reader import read_resume_from_file, preprocess_text
+from utils.db import get_connection
+from utils.dedup import ensure_schema as ensure_dedup_schema, index_record
+from utils.github_reader import extract_github_links_from_text
+from utils.partitioning import ensure_partitions
+from utils.predictions import ensure_schema as ensure_predictions_schema, thresholds_vector
+from utils.scoring import grade_lists, profession_scores
+from utils.search import ensure_schema as ensure_search_schema
+from utils.vector_store import ensure_schema as ensure_vector_schema, save_embedding
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+INGEST_SCHEMA_SQL = """
+ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS file_hash text;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_resume_file_hash ON resume_records (file_hash);
+"""
+
+COPY_COLUMNS = [
+    "file_hash", "original_filename", "cv_file",
+    "grade0", "grade1", "grade2", "grade3", "code",
+    "ai_manager_score", "techan_score", "datan_score", "daten_score",
+    "git_available", "url_github", "consent", "selected_professions",
+    "competency_probs", "model_version", "resume_text",
+]
+
+
+# ─── Источники файлов ─────────────────────────────────────────────────────────
+def iter_source(path: str):
+    """Отдаёт (имя, байты) по одному файлу — целиком в память ничего не грузится."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    yield os.path.basename(info.filename), zf.read(info)
+    else:
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    with open(os.path.join(root, name), "rb") as f:
+                        yield name, f.read()
+
+def extract_text_from_bytes(filename: str, data: bytes) -> str | None:
+    # read_resume_from_file работает с путём — кладём байты во временный файл
+    suffix = os.path.splitext(filename)[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    try:
+        return read_resume_from_file(tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# ─── COPY ─────────────────────────────────────────────────────────────────────
+def _pg_array(items) -> str:
+    escaped = ('"' + str(x).replace("\\", "\\\\").replace('"', '\\"') + '"' for x in items)
+    return "{" + ",".join(escaped) + "}"
+
+def _csv_value(value):
+    if value is None:
+        return ""  # NULL в формате CSV
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()
+    if isinstance(value, (list, tuple)):
+        return _pg_array(value)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return value
+
+def copy_rows(conn, rows: list[dict]) -> int:
+    """
+    Заливает пачку строк одной командой COPY и переносит их в resume_records,
+    в той же транзакции индексирует вставленные строки для поиска дубликатов
+    и сохраняет их эмбеддинги. Возвращает число реально вставленных строк
+    (дубликаты отбрасываются).
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([_csv_value(row[c]) for c in COPY_COLUMNS])
+    buf.seek(0)
+
+    cols = ", ".join(COPY_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS ingest_staging "
+            "(LIKE resume_records INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cur.copy_expert(f"COPY ingest_staging ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(f"""
+            INSERT INTO resume_records ({cols})
+            SELECT {cols} FROM ingest_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM resume_records r WHERE r.file_hash = s.file_hash)
+            ON CONFLICT DO NOTHING
+            RETURNING id, file_hash
+        """)
+        inserted = cur.fetchall()
+        by_hash = {row["file_hash"]: row for row in rows}
+        for record_id, h in inserted:
+            row = by_hash[h]
+            index_record(cur, record_id, row["resume_text"])
+            if row.get("embedding") is not None:
+                save_embedding(cur, record_id, row["embedding"])
+    conn.commit()
+    return len(inserted)
+
+def known_hashes(conn) -> set[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT file_hash FROM resume_records WHERE file_hash IS NOT NULL")
+        hashes = {r[0] for r in cur}
+        # Архивированные заявки тоже не загружаем повторно
+        cur.execute("SELECT to_regclass('resume_records_archive')")
+        if cur.fetchone()[0]:
+            cur.execute("SELECT file_hash FROM resume_records_archive WHERE file_hash IS NOT NULL")
+            hashes.update(r[0] for r in cur)
+        return hashes
+
+
+# ─── Основной цикл ────────────────────────────────────────────────────────────
+def build_row(h: str, filename: str, data: bytes, raw: str, probs: np.ndarray,
+              embedding: np.ndarray | None = None) -> dict:
+    # Грейды для архивных резюме — предсказания модели, как значения по умолчанию в форме
+    grades = (probs > thresholds_vector()).astype(int)
+    lists = grade_lists(grades)
+    links = extract_github_links_from_text(raw)
+    return dict(
+        file_hash=h,
+        original_filename=filename,
+        cv_file=data,
+        grade0=lists[0], grade1=lists[1], grade2=lists[2], grade3=lists[3],
+        code=uuid.uuid4().int & 0x7FFFFFFF,
+        git_available=bool(links),
+        url_github=links[0] if links else None,
+        consent=False,
+        selected_professions=[],
+        competency_probs=[float(p) for p in probs],
+        model_version=MODEL_VERSION,
+        resume_text=preprocess_text(raw),
+        # Не колонка COPY: пишется в resume_embeddings после вставки
+        embedding=embedding,
+        **profession_scores(grades),
+    )
+
+def ingest(path: str, batch_size: int = 16, copy_rows_limit: int = 500,
+           copy_bytes_limit: int = 64 * 1024 * 1024, conn=None) -> dict:
+    from utils.model import load_configured, predict_batch
+
+    own_conn = conn is None
+    conn = conn or get_connection()
+    with conn.cursor() as cur:
+        cur.execute(INGEST_SCHEMA_SQL)
+    conn.commit()
+    ensure_predictions_schema(conn)
+    ensure_search_schema(conn)
+    ensure_dedup_schema(conn)
+    ensure_vector_schema(conn)
+    ensure_partitions(conn)
+
+    seen = known_hashes(conn)
+    tokenizer, model = load_configured()
+    stats = {"files": 0, "skipped_known": 0, "failed_extract": 0, "inserted": 0}
+    pending, rows = [], []
+    started = time.perf_counter()
+
+    def flush_inference():
+        if not pending:
+            return
+        probs, embeddings = predict_batch(tokenizer, model, [preprocess_text(p[3]) for p in pending],
+                                          return_embeddings=True)
+        rows.extend(build_row(*p, pr, emb) for p, pr, emb in zip(pending, probs, embeddings))
+        pending.clear()
+
+    def flush_copy():
+        if rows:
+            stats["inserted"] += copy_rows(conn, rows)
+            rows.clear()
+            elapsed = time.perf_counter() - started
+            logger.info(f"{stats['inserted']} строк, {stats['inserted'] / elapsed:.1f} строк/с")
+
+    try:
+        for filename, data in iter_source(path):
+            stats["files"] += 1
+            h = file_hash(data)
+            if h in seen:
+                stats["skipped_known"] += 1
+                continue
+            seen.add(h)
+            raw = extract_text_from_bytes(filename, data)
+            if not raw or not raw.strip():
+                stats["failed_extract"] += 1
+                continue
+            pending.append((h, filename, data, raw))
+            if len(pending) >= batch_size:
+                flush_inference()
+            # Пачка COPY ограничена и по строкам, и по объёму файлов
+            if len(rows) >= copy_rows_limit or sum(len(r["cv_file"]) for r in rows) >= copy_bytes_limit:
+                flush_copy()
+        flush_inference()
+        flush_copy()
+    finally:
+        if own_conn:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_second"] = round(stats["inserted"] / elapsed, 2) if elapsed else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка резюме в resume_records")
+    parser.add_argument("path", help="каталог или zip-архив с резюме")
+    parser.add_argument("--batch-size", type=int, default=16, help="размер батча инференса")
+    parser.add_argument("--copy-rows", type=int, default=500, help="строк на одну команду COPY")
+    parser.add_argument("--copy-mb", type=int, default=64, help="максимум МБ файлов на одну команду COPY")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    if not os.path.exists(args.path):
+        sys.exit(f"Путь не найден: {args.path}")
+    stats = ingest(args.path, args.batch_size, args.copy_rows, args.copy_mb * 1024 * 1024)
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+"""
+Нагрузочный стенд: одновременные кандидаты и HR на настоящем app.py.
+
+    python -m utils.loadtest --levels 1,4,8 --duration 60 --hr-share 0.2
+
+Сессии гоняются через streamlit.testing AppTest в одном процессе (общие
+st.cache_resource, кэши и пул потоков — как у одного инстанса Streamlit).
+Внешние зависимости заменены локальными:
+  • модель — крошечный BERT со случайными весами (снапшот safetensors в tmp);
+  • GitHub API — локальный HTTP-сервер с репозиториями и README;
+  • Gmail — приёмник, который только считает письма;
+  • PostgreSQL — одноразовый кластер initdb/pg_ctl во временной папке
+    (или уже запущенный сервер через --pg-port).
+
+Для каждого уровня параллелизма печатаются пропускная способность,
+перцентили задержек по операциям и насыщение ресурсов (CPU, RSS, потоки,
+соединения с БД).
+"""
+import io
+import os
+import json
+import glob
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+HR_PASSWORD = "duduki"
+
+# Схема resume_records в объёме, который использует приложение
+LOADTEST_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS resume_records (
+    id                   serial PRIMARY KEY,
+    original_filename    text,
+    cv_file              bytea,
+    grade0               text[],
+    grade1               text[],
+    grade2               text[],
+    grade3               text[],
+    sender_email         text,
+    code                 integer,
+    ai_manager_score     real,
+    techan_score         real,
+    datan_score          real,
+    daten_score          real,
+    git_available        boolean,
+    name                 text,
+    surname              text,
+    patronymic           text,
+    url_github           text,
+    telegram_handle      text,
+    phone                text,
+    consent              boolean,
+    selected_professions text[],
+    form_submitted_at    timestamptz,
+    uploaded_at          timestamptz NOT NULL DEFAULT now(),
+    hr_email             text,
+    CONSTRAINT uq_resume_phone UNIQUE (phone),
+    CONSTRAINT uq_resume_sender_email UNIQUE (sender_email),
+    CONSTRAINT uq_resume_telegram_handle UNIQUE (telegram_handle)
+);
+"""
+
+_RESUME_WORDS = (
+    "python sql pandas numpy airflow kafka spark docker kubernetes git linux "
+    "машинное обучение анализ данных статистика визуализация дашборды bi "
+    "tableau power excel etl dwh витрины требования тестирование бизнес "
+    "процессы управление проектами agile scrum jira confluence команда "
+    "нейронные сети nlp cv pytorch tensorflow a/b тесты метрики продукт"
+).split()
+
+
+# ─── Заглушки внешних сервисов ────────────────────────────────────────────────
+def build_tiny_model(model_dir: str) -> str:
+    """Крошечный BERT со случайными весами в формате локального снапшота."""
+    import torch
+    from transformers import BertConfig, BertTokenizer, BertForSequenceClassification
+    from utils.constants import competency_list, MAX_LENGTH
+
+    os.makedirs(model_dir, exist_ok=True)
+    chars = "abcdefghijklmnopqrstuvwxyzабвгдеёжзийклмнопрстуфхцчшщъыьэюя0123456789.,:;/-+@#()"
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(chars) + [f"##{c}" for c in chars]
+    vocab_file = os.path.join(model_dir, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizer(vocab_file, do_lower_case=True).save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=MAX_LENGTH,
+        num_labels=len(competency_list), problem_type="multi_label_classification",
+    )
+    BertForSequenceClassification(config).save_pretrained(model_dir, safe_serialization=True)
+    return model_dir
+
+
+class FakeGitHub:
+    """Локальный GitHub API: /users/<u>/repos и /repos/<u>/<r>/readme."""
+
+    def __init__(self, repos: int = 3, latency_ms: float = 0.0):
+        self.repos = repos
+        self.latency = latency_ms / 1000
+        self.hits = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.hits += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                parts = self.path.strip("/").split("/")
+                if parts[0] == "users" and parts[-1] == "repos":
+                    body = json.dumps([{"name": f"repo{i}"} for i in range(fake.repos)]).encode()
+                elif parts[0] == "repos" and parts[-1] == "readme":
+                    body = " ".join(random.choices(_RESUME_WORDS, k=200)).encode()
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class FakeGmail:
+    """Подменяет Gmail API: письма не уходят, только считаются."""
+
+    def __init__(self):
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        return self
+
+    def execute(self):
+        with self._lock:
+            self.sent += 1
+        return {"id": str(self.sent)}
+
+
+class ThrowawayPostgres:
+    """Одноразовый кластер PostgreSQL во временной папке (нужны initdb и pg_ctl)."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.dir = tempfile.mkdtemp(prefix="cv_loadtest_pg_")
+        self.bin = self._find_bin()
+
+    @staticmethod
+    def _find_bin() -> str:
+        initdb = shutil.which("initdb")
+        if initdb:
+            return os.path.dirname(initdb)
+        found = sorted(glob.glob("/usr/lib/postgresql/*/bin/initdb"))
+        if not found:
+            raise SystemExit("Не найден initdb: установите PostgreSQL или укажите --pg-port запущенного сервера")
+        return os.path.dirname(found[-1])
+
+    def start(self):
+        data = os.path.join(self.dir, "data")
+        subprocess.run([os.path.join(self.bin, "initdb"), "-D", data, "-U", "appuser",
+                        "--auth=trust", "-E", "UTF8"], check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([os.path.join(self.bin, "pg_ctl"), "-D", data, "-w", "-l",
+                        os.path.join(self.dir, "pg.log"), "-o",
+                        f"-p {self.port} -k {self.dir} -c listen_addresses=localhost -c max_connections=200",
+                        "start"], check=True, stdout=subprocess.DEVNULL)
+        import psycopg2
+        conn = psycopg2.connect(host="localhost", port=self.port, dbname="postgres", user="appuser")
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("CREATE DATABASE resumes")
+        conn.close()
+
+    def stop(self):
+        subprocess.run([os.path.join(self.bin, "pg_ctl"), "-D", os.path.join(self.dir, "data"),
+                        "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def prepare_database():
+    """Базовая схема и все разовые миграции, которые приложение только проверяет."""
+    from utils import query_cache
+    from utils.db import get_connection
+    from utils.schema import migrate_all
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(LOADTEST_SCHEMA_SQL)
+        conn.commit()
+        migrate_all(conn)
+        query_cache.install(conn)
+    finally:
+        conn.close()
+
+
+class _FakeUpload(io.BytesIO):
+    """То, что st.file_uploader отдаёт приложению."""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def _fake_file_uploader(label, *args, **kwargs):
+    # AppTest не умеет загружать файлы: сессия кладёт резюме в session_state заранее
+    import streamlit as st
+    upload = st.session_state.get("_loadtest_upload")
+    return _FakeUpload(*upload) if upload else None
+
+
+def install_stand_ins(gmail: FakeGmail):
+    import streamlit
+    import utils.email
+    streamlit.file_uploader = _fake_file_uploader
+    utils.email.get_gmail_service = lambda: gmail
+
+
+# ─── Сценарии ─────────────────────────────────────────────────────────────────
+@dataclass
+class Sample:
+    op: str
+    seconds: float
+    ok: bool
+
+
+def _by_label(elements, label):
+    for e in elements:
+        if e.label == label:
+            return e
+    raise LookupError(f"нет элемента «{label}»")
+
+
+def _check(at, op: str):
+    if at.exception:
+        raise RuntimeError(f"{op}: {at.exception[0].value}")
+    if at.error:
+        raise RuntimeError(f"{op}: {at.error[0].value}")
+
+
+def _timed(samples: list, op: str, func):
+    started = time.perf_counter()
+    try:
+        func()
+        samples.append(Sample(op, time.perf_counter() - started, True))
+    except Exception as e:
+        samples.append(Sample(op, time.perf_counter() - started, False))
+        logger.warning(f"{op}: {e}")
+        raise
+
+
+def _resume(n: int) -> bytes:
+    words = random.choices(_RESUME_WORDS, k=random.randint(150, 600))
+    return (f"Кандидат {n}\nhttps://github.com/loaduser{n}\n" + " ".join(words)).encode("utf-8")
+
+
+def candidate_session(n: int, timeout: float, samples: list):
+    from streamlit.testing.v1 import AppTest
+    from utils.constants import profession_names
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state["_loadtest_upload"] = (f"cv_{n}.txt", _resume(n))
+
+    def start():
+        at.run()
+        at.radio[0].set_value("Кандидат")
+        _by_label(at.button, "Продолжить").click().run()
+        _check(at, "candidate.start")
+        # После выбора роли приложение перезапускается (st.rerun) и сразу рисует анкету
+        _by_label(at.text_input, "Фамилия")
+
+    def analyze():
+        for label, value in (("Фамилия", f"Нагрузкин{n}"), ("Имя", "Тест"), ("Отчество", ""),
+                             ("Email", f"load{n}@example.com"),
+                             ("Telegram-ник (например, @username)", f"@load{n}"),
+                             ("Телефон в формате +7XXXXXXXXXX", f"+7{n:010d}")):
+            _by_label(at.text_input, label).input(value)
+        at.multiselect[0].set_value(random.sample(profession_names, 2))
+        at.checkbox[0].check()
+        _by_label(at.button, "Продолжить к загрузке резюме").click().run()
+        _check(at, "candidate.analyze")
+
+    def submit():
+        _by_label(at.button, "Отправить заявку").click().run()
+        _check(at, "candidate.submit")
+        if not any("принята" in s.value for s in at.success):
+            raise RuntimeError("candidate.submit: нет подтверждения заявки")
+
+    _timed(samples, "candidate.start", start)
+    _timed(samples, "candidate.analyze", analyze)
+    _timed(samples, "candidate.submit", submit)
+
+
+def hr_session(n: int, timeout: float, samples: list, filter_changes: int = 3):
+    from streamlit.testing.v1 import AppTest
+    from utils.constants import profession_names
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def login():
+        at.run()
+        at.radio[0].set_value("HR-специалист")
+        _by_label(at.button, "Продолжить").click().run()
+        _by_label(at.text_input, "Пароль").input(HR_PASSWORD)
+        _by_label(at.button, "Войти").click().run()
+        _check(at, "hr.login")
+        at.radio(key="hr_view")  # KeyError, если панель не отрисовалась
+
+    _timed(samples, "hr.login", login)
+    for _ in range(filter_changes):
+        idx = random.randrange(4)
+
+        def change_filter():
+            # Рисуются только виджеты выбранного раздела — сначала переключаемся на него
+            at.radio(key="hr_view").set_value(profession_names[idx]).run()
+            choice = random.choice(("git", "search", "score"))
+            if choice == "git":
+                at.selectbox(key=f"filter_git_{idx}").set_value(random.choice(["Любой", "Да", "Нет"]))
+            elif choice == "search":
+                at.text_input(key=f"filter_search_{idx}").input(" ".join(random.sample(_RESUME_WORDS, 2)))
+            else:
+                at.number_input(key=f"min_score_{idx}").set_value(float(random.choice([0, 25, 50])))
+            at.run()
+            _check(at, "hr.filter")
+
+        _timed(samples, "hr.filter", change_filter)
+
+
+# ─── Замер ресурсов ───────────────────────────────────────────────────────────
+@dataclass
+class Saturation:
+    cpu_pct: list = field(default_factory=list)
+    rss_mb: list = field(default_factory=list)
+    threads: list = field(default_factory=list)
+    pg_conns: list = field(default_factory=list)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _sample_resources(stop: threading.Event, sat: Saturation, interval: float = 0.5):
+    from utils.db import get_connection
+    conn = get_connection()
+    conn.autocommit = True
+    ncpu = os.cpu_count() or 1
+    last_cpu, last_wall = sum(os.times()[:2]), time.monotonic()
+    while not stop.wait(interval):
+        cpu, wall = sum(os.times()[:2]), time.monotonic()
+        sat.cpu_pct.append((cpu - last_cpu) / (wall - last_wall) / ncpu * 100)
+        last_cpu, last_wall = cpu, wall
+        sat.rss_mb.append(_rss_mb())
+        sat.threads.append(threading.active_count())
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()")
+            sat.pg_conns.append(cur.fetchone()[0] - 1)
+    conn.close()
+
+
+def run_level(concurrency: int, duration: float, hr_share: float, timeout: float,
+              counter) -> dict:
+    samples: list[Sample] = []
+    sessions = {"candidate": 0, "hr": 0, "failed": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < deadline:
+            is_hr = random.random() < hr_share
+            local: list[Sample] = []
+            try:
+                if is_hr:
+                    hr_session(next(counter), timeout, local)
+                else:
+                    candidate_session(next(counter), timeout, local)
+                failed = False
+            except Exception:
+                failed = True
+            with lock:
+                samples.extend(local)
+                sessions["failed" if failed else ("hr" if is_hr else "candidate")] += 1
+
+    sat = Saturation()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_resources, args=(stop, sat), daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f"loadtest-{i}") for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    ops = {}
+    for op in sorted({s.op for s in samples}):
+        lat = np.array([s.seconds for s in samples if s.op == op and s.ok]) * 1000
+        errors = sum(1 for s in samples if s.op == op and not s.ok)
+        ops[op] = {
+            "count": int(lat.size),
+            "errors": errors,
+            "per_s": round(lat.size / elapsed, 2),
+            **({f"p{q}_ms": round(float(np.percentile(lat, q)), 1) for q in (50, 90, 99)} if lat.size else {}),
+            "max_ms": round(float(lat.max()), 1) if lat.size else None,
+        }
+
+    def _peak(values):
+        return round(max(values), 1) if values else None
+
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 1),
+        "sessions": sessions,
+        "sessions_per_s": round((sessions["candidate"] + sessions["hr"]) / elapsed, 2),
+        "ops": ops,
+        "saturation": {
+            "cpu_pct_mean": round(float(np.mean(sat.cpu_pct)), 1) if sat.cpu_pct else None,
+            "cpu_pct_max": _peak(sat.cpu_pct),
+            "rss_mb_max": _peak(sat.rss_mb),
+            "threads_max": _peak(sat.threads),
+            "pg_conns_max": _peak(sat.pg_conns),
+        },
+    }
+
+
+def print_report(level: dict):
+    sat = level["saturation"]
+    s = level["sessions"]
+    print(f"\n=== Параллелизм {level['concurrency']}: {level['elapsed_s']} с, "
+          f"сессий {s['candidate']} канд. + {s['hr']} HR (ошибок {s['failed']}), "
+          f"{level['sessions_per_s']} сессий/с")
+    print(f"{'операция':<20} {'n':>5} {'ош.':>4} {'оп/с':>7} {'p50,мс':>9} {'p90,мс':>9} {'p99,мс':>9} {'max,мс':>9}")
+    for op, r in level["ops"].items():
+        print(f"{op:<20} {r['count']:>5} {r['errors']:>4} {r['per_s']:>7} "
+              f"{r.get('p50_ms', '-'):>9} {r.get('p90_ms', '-'):>9} {r.get('p99_ms', '-'):>9} "
+              f"{r['max_ms'] if r['max_ms'] is not None else '-':>9}")
+    print(f"CPU {sat['cpu_pct_mean']}% (пик {sat['cpu_pct_max']}%), RSS до {sat['rss_mb_max']} МБ, "
+          f"потоков до {sat['threads_max']}, соединений с БД до {sat['pg_conns_max']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный стенд CV-Analyzer")
+    parser.add_argument("--levels", default="1,2,4,8", help="уровни параллелизма через запятую")
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд на уровень")
+    parser.add_argument("--hr-share", type=float, default=0.2, help="доля HR-сессий")
+    parser.add_argument("--timeout", type=float, default=120.0, help="таймаут одного прогона скрипта")
+    parser.add_argument("--github-latency-ms", type=float, default=50.0)
+    parser.add_argument("--pg-port", type=int, default=None,
+                        help="порт уже запущенного PostgreSQL (иначе — одноразовый кластер)")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s — %(levelname)s — %(message)s")
+    os.chdir(APP_DIR)
+    work_dir = tempfile.mkdtemp(prefix="cv_loadtest_")
+    github = FakeGitHub(latency_ms=args.github_latency_ms)
+    pg = None
+    if args.pg_port is None:
+        import socket
+        with socket.socket() as s:
+            s.bind(("localhost", 0))
+            port = s.getsockname()[1]
+        pg = ThrowawayPostgres(port)
+        pg.start()
+    else:
+        port = args.pg_port
+
+    # До импорта utils.constants: все адреса и модель — локальные
+    os.environ.update({
+        "PGPORT": str(port),
+        "MODEL_LOCAL_DIR": os.path.join(work_dir, "tiny-model"),
+        "MODEL_MMAP": "0",
+        "INFERENCE_SERVER_URL": "",
+        "GITHUB_API_URL": github.url,
+        "HF_HUB_OFFLINE": "1",
+    })
+    try:
+        build_tiny_model(os.environ["MODEL_LOCAL_DIR"])
+        prepare_database()
+
+        gmail = FakeGmail()
+        install_stand_ins(gmail)
+        counter = iter(range(random.randint(0, 10 ** 6) * 1000, 10 ** 10))
+        results = []
+        for level in (int(x) for x in args.levels.split(",")):
+            result = run_level(level, args.duration, args.hr_share, args.timeout, counter)
+            results.append(result)
+            print_report(result)
+        print(f"\nПисем в заглушку Gmail: {gmail.sent}, запросов к заглушке GitHub: {github.hits}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+    finally:
+        github.close()
+        if pg is not None:
+            pg.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
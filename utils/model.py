@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import struct
+import logging
+from contextlib import contextmanager
+
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+
+from utils.constants import (
+    MODEL_REPO_ID,
+    MODEL_LOCAL_DIR,
+    MODEL_MMAP,
+    MODEL_VARIANT,
+    STUDENT_MODEL_DIR,
+    MAX_LENGTH,
+    TEXT_PACKING,
+)
+
+logger = logging.getLogger(__name__)
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+# ─── Загрузка модели без привязки к Streamlit ─────────────────────────────────
+def get_hf_token():
+    """
+    Токен Hugging Face: сначала переменная окружения, затем secrets.toml.
+    """
+    token = os.environ.get("HUGGINGFACE_TOKEN")
+    if token:
+        return token
+    try:
+        import streamlit as st
+        return st.secrets["HUGGINGFACE_TOKEN"]
+    except Exception:
+        return None
+
+def has_local_snapshot(model_dir: str = MODEL_LOCAL_DIR) -> bool:
+    return os.path.isfile(os.path.join(model_dir, "model.safetensors"))
+
+def export_local_snapshot(model_dir: str = MODEL_LOCAL_DIR, repo_id: str = MODEL_REPO_ID,
+                          token: str | None = None) -> str:
+    """
+    Скачивает модель с хаба и сохраняет её в model_dir одним файлом safetensors.
+    """
+    if token is None:
+        token = get_hf_token()
+    tokenizer = AutoTokenizer.from_pretrained(repo_id, token=token)
+    model = AutoModelForSequenceClassification.from_pretrained(repo_id, token=token)
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer.save_pretrained(model_dir)
+    model.save_pretrained(model_dir, safe_serialization=True, max_shard_size="100GB")
+    return model_dir
+
+def mmap_safetensors(path: str) -> dict:
+    """
+    Отображает файл safetensors в память (MAP_PRIVATE) и возвращает state_dict,
+    тензоры которого — представления над этими страницами, без копирования.
+    Все процессы, открывшие тот же файл, делят физическую память через page cache.
+    """
+    with open(path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+    nbytes = os.path.getsize(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=nbytes)
+    flat = torch.empty(0, dtype=torch.uint8).set_(storage)
+    base = 8 + header_len
+
+    state_dict = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = meta["data_offsets"]
+        dtype = _SAFETENSORS_DTYPES[meta["dtype"]]
+        chunk = flat[base + start: base + end]
+        state_dict[name] = chunk.view(dtype).reshape(meta["shape"])
+    return state_dict
+
+@contextmanager
+def empty_parameters():
+    """
+    Параметры создаются на meta: без выделения памяти и случайной инициализации
+    (как accelerate.init_empty_weights(include_buffers=False)). Буферы —
+    position_ids и т.п., которых может не быть в файле, — создаются как обычно.
+    """
+    register = torch.nn.Module.register_parameter
+
+    def register_on_meta(module, name, param):
+        register(module, name, param)
+        if param is not None:
+            module._parameters[name] = torch.nn.Parameter(
+                module._parameters[name].to("meta"), requires_grad=param.requires_grad)
+
+    torch.nn.Module.register_parameter = register_on_meta
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register
+
+def load_mmap(model_dir: str = MODEL_LOCAL_DIR):
+    """
+    Модель, чьи веса живут в отображённом файле, а не в куче процесса.
+    Скелет строится с параметрами на meta, поэтому при старте нет ни второй
+    копии весов в куче, ни времени на их случайную инициализацию.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+    config = AutoConfig.from_pretrained(model_dir, local_files_only=True)
+    with empty_parameters():
+        model = AutoModelForSequenceClassification.from_config(config)
+    state_dict = mmap_safetensors(os.path.join(model_dir, "model.safetensors"))
+    # assign=True подменяет параметры тензорами из mmap вместо копирования в них
+    _, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    # Связанные веса в файле хранятся один раз — привязываем их к загруженным
+    model.tie_weights()
+    # Всё, что осталось на meta, в файле отсутствует: такой моделью считать нельзя
+    missing = [name for name, p in model.named_parameters() if p.is_meta]
+    missing += [name for name, b in model.named_buffers() if b.is_meta]
+    if missing:
+        raise RuntimeError(f"mmap-загрузка {model_dir}: в model.safetensors нет весов {missing}")
+    if unexpected:
+        logger.warning(f"mmap-загрузка: unexpected={unexpected}")
+    model.eval()
+    for p in model.parameters():
+        p.requires_grad_(False)
+    return tokenizer, model
+
+def load_pretrained(repo_id: str = MODEL_REPO_ID, token: str | None = None):
+    """
+    Загружает токенизатор и модель в режиме eval.
+    Если есть локальный снапшот — берём его (при MODEL_MMAP — через mmap),
+    иначе скачиваем с хаба.
+    Используется и приложением, и отдельным сервером инференса.
+    """
+    if has_local_snapshot():
+        if MODEL_MMAP:
+            return load_mmap(MODEL_LOCAL_DIR)
+        repo_id, token = MODEL_LOCAL_DIR, None
+    elif token is None:
+        token = get_hf_token()
+    tokenizer = AutoTokenizer.from_pretrained(repo_id, token=token)
+    model = AutoModelForSequenceClassification.from_pretrained(repo_id, token=token)
+    model.eval()
+    return tokenizer, model
+
+def load_student(model_dir: str = STUDENT_MODEL_DIR):
+    """
+    Дистиллированная модель-ученик из utils/distill.py (всегда локальная).
+    """
+    if not has_local_snapshot(model_dir):
+        raise FileNotFoundError(f"Нет снапшота модели-ученика в {model_dir}: запустите python -m utils.distill")
+    if MODEL_MMAP:
+        return load_mmap(model_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir, local_files_only=True)
+    model.eval()
+    return tokenizer, model
+
+def load_configured():
+    """Модель, выбранная MODEL_VARIANT: исходная (teacher) или ученик (student)."""
+    if MODEL_VARIANT == "student":
+        return load_student()
+    return load_pretrained()
+
+# ─── Прогрев при старте процесса ──────────────────────────────────────────────
+WARMUP_TEXT = "python sql docker машинное обучение анализ данных " * 64
+
+# Модель, загруженная и прогретая до старта сервера (см. utils/warmup.py)
+_warm_model = None
+
+def get_warm_model():
+    return _warm_model
+
+def warm_up_model() -> dict:
+    """
+    Загружает модель и делает один холостой прогон полной длины, чтобы
+    первый кандидат не платил за аллокации и ленивую инициализацию torch.
+    """
+    global _warm_model
+    started = time.perf_counter()
+    tokenizer, model = load_configured()
+    loaded = time.perf_counter()
+    predict_batch(tokenizer, model, [WARMUP_TEXT])
+    warmed = time.perf_counter()
+    _warm_model = (tokenizer, model)
+    return {"load_s": round(loaded - started, 3), "first_forward_s": round(warmed - loaded, 3)}
+
+# ─── Инференс ────────────────────────────────────────────────────────────────
+def predict_batch(tokenizer, model, texts: list[str], return_embeddings: bool = False,
+                  max_length: int = MAX_LENGTH, packing: str = TEXT_PACKING):
+    """
+    Возвращает матрицу вероятностей (len(texts), n_competencies).
+    Тексты паддятся до самого длинного в батче, а не до max_length.
+    packing="sections" — длинные тексты сначала упаковываются по разделам
+    (utils/sections.py), "truncate" — просто обрезаются.
+    С return_embeddings=True дополнительно отдаёт усреднённые по маске
+    скрытые состояния последнего слоя (len(texts), hidden_size).
+    """
+    if packing == "sections":
+        from utils.sections import pack_for_model
+        texts = pack_for_model(texts, tokenizer, max_length)
+    inputs = tokenizer(texts, return_tensors="pt", padding=True,
+                       truncation=True, max_length=max_length)
+    with torch.no_grad():
+        out = model(**inputs, output_hidden_states=return_embeddings)
+    probs = torch.sigmoid(out.logits).cpu().numpy()
+    if not return_embeddings:
+        return probs
+    mask = inputs["attention_mask"].unsqueeze(-1).to(out.hidden_states[-1].dtype)
+    pooled = (out.hidden_states[-1] * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return probs, pooled.cpu().numpy()
@@ -0,0 +1,148 @@
+"""
+Многопроцессный запуск Streamlit с общей (mmap) копией весов модели.
+
+    # 1. Один раз сохранить модель локально в safetensors
+    python -m utils.multiworker export
+
+    # 2. Поднять N воркеров на портах 8501..8501+N-1 (за балансировщиком)
+    python -m utils.multiworker launch --workers 4 --base-port 8501
+
+    # 3. Замерить RSS/PSS на воркер и время до первого инференса
+    python -m utils.multiworker measure --workers 4 [--no-mmap]
+
+Каждый воркер — обычный `streamlit run app.py` с MODEL_MMAP=1: веса
+отображаются из models/…/model.safetensors только для чтения, поэтому
+физические страницы одни на всю машину, а PSS воркера падает примерно в N раз.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+
+from utils.constants import MODEL_LOCAL_DIR
+
+
+def _worker_env(use_mmap: bool = True) -> dict:
+    env = dict(os.environ)
+    env["MODEL_MMAP"] = "1" if use_mmap else "0"
+    env["MODEL_LOCAL_DIR"] = MODEL_LOCAL_DIR
+    # Воркеров несколько — каждому свой небольшой пул потоков torch
+    env.setdefault("OMP_NUM_THREADS", "2")
+    return env
+
+
+def _memory_mb() -> dict:
+    """Rss/Pss/Shared из /proc/self/smaps_rollup (Linux), в МБ."""
+    out = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+                    out[key.lower() + "_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+
+# ─── Команды ─────────────────────────────────────────────────────────────────
+def cmd_export(args):
+    from utils.model import export_local_snapshot
+    path = export_local_snapshot(args.model_dir)
+    print(f"Снапшот модели сохранён в {path}")
+
+
+def cmd_launch(args):
+    procs = []
+    for i in range(args.workers):
+        port = args.base_port + i
+        cmd = [sys.executable, "-m", "streamlit", "run", "app.py",
+               "--server.port", str(port), "--server.headless", "true"]
+        procs.append(subprocess.Popen(cmd, env=_worker_env(not args.no_mmap)))
+        print(f"воркер {i}: http://127.0.0.1:{port}")
+
+    def _stop(*_):
+        for p in procs:
+            p.terminate()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    for p in procs:
+        p.wait()
+
+
+def cmd_probe(args):
+    # Запускается в дочернем процессе командой measure
+    started = time.perf_counter()
+    from utils.model import load_configured, predict_batch
+    tokenizer, model = load_configured()
+    loaded = time.perf_counter()
+    predict_batch(tokenizer, model, ["python sql docker машинное обучение"])
+    first = time.perf_counter()
+    report = {
+        "pid": os.getpid(),
+        "load_s": round(loaded - started, 3),
+        "time_to_first_inference_s": round(first - started, 3),
+    }
+    print("READY", flush=True)
+    # Держим процесс живым, пока родитель не снимет память со всех воркеров
+    sys.stdin.readline()
+    report.update(_memory_mb())
+    print(json.dumps(report), flush=True)
+
+
+def cmd_measure(args):
+    env = _worker_env(not args.no_mmap)
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "utils.multiworker", "_probe"],
+                         env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        if p.stdout.readline().strip() != "READY":
+            raise SystemExit("воркер завершился до инференса")
+    reports = []
+    for p in procs:
+        out, _ = p.communicate("\n")
+        reports.append(json.loads(out.strip().splitlines()[-1]))
+
+    mode = "mmap" if not args.no_mmap else "обычная загрузка"
+    print(f"Режим: {mode}, воркеров: {args.workers}")
+    print(f"{'pid':>8} {'load,s':>8} {'TTFI,s':>8} {'RSS,MB':>9} {'PSS,MB':>9} {'shared,MB':>10}")
+    for r in reports:
+        print(f"{r['pid']:>8} {r['load_s']:>8} {r['time_to_first_inference_s']:>8} "
+              f"{r.get('rss_mb', '-'):>9} {r.get('pss_mb', '-'):>9} {r.get('shared_clean_mb', '-'):>10}")
+    total_pss = sum(r.get("pss_mb", 0) for r in reports)
+    print(f"Суммарный PSS (реальная память на все воркеры): {total_pss:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Многопроцессный запуск CV-Analyzer")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="сохранить модель локально в safetensors")
+    p.add_argument("--model-dir", default=MODEL_LOCAL_DIR)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("launch", help="запустить N воркеров Streamlit")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--base-port", type=int, default=8501)
+    p.add_argument("--no-mmap", action="store_true")
+    p.set_defaults(func=cmd_launch)
+
+    p = sub.add_parser("measure", help="замерить RSS/PSS и время до первого инференса")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--no-mmap", action="store_true")
+    p.set_defaults(func=cmd_measure)
+
+    p = sub.add_parser("_probe")
+    p.set_defaults(func=cmd_probe)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
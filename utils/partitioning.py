@@ -0,0 +1,388 @@
+"""
+Помесячное секционирование resume_records по uploaded_at и архивирование
+старых заявок.
+
+    python -m utils.partitioning migrate [--drop-legacy]   # разовый перевод таблицы
+    python -m utils.partitioning maintain                  # создать секции на месяцы вперёд
+    python -m utils.partitioning retain --months 24        # архивировать старые секции
+    python -m utils.partitioning list
+
+После миграции resume_records — секционированная таблица (RANGE по
+uploaded_at, секция resume_records_YYYY_MM на месяц плюс DEFAULT), и фильтр
+HR по датам читает только секции своего периода. Глобальная уникальность
+телефона, email, Telegram и хеша файла держится в resume_identity, которую
+триггеры синхронизируют с INSERT, UPDATE и DELETE; ограничения там названы
+так же (uq_resume_phone, …), поэтому обработка UniqueViolation в приложении
+не меняется. При архивировании секции её идентичности удаляются: через срок
+хранения кандидат может подать заявку снова.
+
+    python -m utils.partitioning identity   # обновить триггеры и выровнять resume_identity
+
+Архивирование секции: CV-файлы пишутся в zip (archive/resume_records_YYYY_MM.zip),
+секция отсоединяется, её строки без файлов и текстов переносятся в
+resume_records_archive, связанные эмбеддинги и сигнатуры удаляются.
+Представление resume_summary объединяет действующие и архивные заявки.
+"""
+import os
+import re
+import uuid
+import logging
+import argparse
+import datetime
+import zipfile
+
+from utils.db import get_connection
+from utils.predictions import PREDICTIONS_SCHEMA_SQL, ensure_schema as ensure_predictions_schema
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.environ.get("RESUME_ARCHIVE_DIR", "archive")
+# Сколько месяцев вперёд держать готовые секции
+MONTHS_AHEAD = 3
+# Срок хранения заявок с файлами, месяцев
+RETENTION_MONTHS = int(os.environ.get("RESUME_RETENTION_MONTHS", "24"))
+
+_PARTITION_RE = re.compile(r"^resume_records_(\d{4})_(\d{2})$")
+
+# Колонки, которые остаются доступными после архивирования
+SUMMARY_COLUMNS = [
+    "id", "uploaded_at", "form_submitted_at", "sender_email", "name", "surname", "patronymic",
+    "telegram_handle", "phone", "hr_email", "code", "git_available", "url_github",
+    "selected_professions", "grade0", "grade1", "grade2", "grade3",
+    "ai_manager_score", "techan_score", "datan_score", "daten_score", "original_filename", "file_hash",
+    "competency_probs", "model_version",
+]
+
+# Таблицы, ссылающиеся на resume_records.id (внешние ключи на секционированную
+# таблицу по одному id невозможны, чистим их сами)
+DEPENDENT_TABLES = ["resume_embeddings", "resume_minhash", "resume_lsh_bands", "resume_duplicates",
+                    "github_enrichment_queue"]
+
+IDENTITY_SQL = """
+CREATE TABLE IF NOT EXISTS resume_identity (
+    id              integer PRIMARY KEY,
+    phone           text,
+    sender_email    text,
+    telegram_handle text,
+    file_hash       text,
+    CONSTRAINT uq_resume_phone UNIQUE (phone),
+    CONSTRAINT uq_resume_sender_email UNIQUE (sender_email),
+    CONSTRAINT uq_resume_telegram_handle UNIQUE (telegram_handle),
+    CONSTRAINT uq_resume_file_hash UNIQUE (file_hash)
+);
+-- Перенос строки между секциями (смена uploaded_at) — это DELETE + INSERT:
+-- вставка обновляет запись по id, а удаление проверяет, что строки больше нет
+CREATE OR REPLACE FUNCTION resume_identity_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM resume_identity i WHERE i.id = OLD.id
+            AND NOT EXISTS (SELECT 1 FROM resume_records r WHERE r.id = OLD.id);
+        RETURN OLD;
+    END IF;
+    INSERT INTO resume_identity (id, phone, sender_email, telegram_handle, file_hash)
+    VALUES (NEW.id, NEW.phone, NEW.sender_email, NEW.telegram_handle, NEW.file_hash)
+    ON CONFLICT (id) DO UPDATE SET phone = EXCLUDED.phone, sender_email = EXCLUDED.sender_email,
+        telegram_handle = EXCLUDED.telegram_handle, file_hash = EXCLUDED.file_hash;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS trg_resume_identity ON resume_records;
+CREATE TRIGGER trg_resume_identity BEFORE INSERT ON resume_records
+    FOR EACH ROW EXECUTE FUNCTION resume_identity_sync();
+DROP TRIGGER IF EXISTS trg_resume_identity_update ON resume_records;
+CREATE TRIGGER trg_resume_identity_update
+    AFTER UPDATE OF phone, sender_email, telegram_handle, file_hash ON resume_records
+    FOR EACH ROW EXECUTE FUNCTION resume_identity_sync();
+DROP TRIGGER IF EXISTS trg_resume_identity_delete ON resume_records;
+CREATE TRIGGER trg_resume_identity_delete AFTER DELETE ON resume_records
+    FOR EACH ROW EXECUTE FUNCTION resume_identity_sync();
+DROP FUNCTION IF EXISTS resume_identity_insert();
+"""
+
+# Выравнивание после правок в обход триггеров или до их появления
+IDENTITY_RESYNC_SQL = """
+DELETE FROM resume_identity i WHERE NOT EXISTS (SELECT 1 FROM resume_records r WHERE r.id = i.id);
+UPDATE resume_identity i
+SET phone = r.phone, sender_email = r.sender_email, telegram_handle = r.telegram_handle, file_hash = r.file_hash
+FROM resume_records r
+WHERE r.id = i.id AND (i.phone, i.sender_email, i.telegram_handle, i.file_hash)
+    IS DISTINCT FROM (r.phone, r.sender_email, r.telegram_handle, r.file_hash);
+"""
+
+_partitions_ready_for = None
+
+
+# ─── Секции ───────────────────────────────────────────────────────────────────
+def _month_start(d: datetime.date) -> datetime.date:
+    return d.replace(day=1)
+
+def _add_months(d: datetime.date, n: int) -> datetime.date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return datetime.date(y, m + 1, 1)
+
+def partition_name(month: datetime.date) -> str:
+    return f"resume_records_{month:%Y_%m}"
+
+def is_partitioned(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('resume_records')")
+        row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+def list_partitions(conn) -> list[tuple[str, datetime.date | None]]:
+    """[(имя секции, первый день месяца или None для DEFAULT)] по возрастанию."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'resume_records'::regclass
+        """)
+        names = [r[0] for r in cur]
+    parts = []
+    for name in names:
+        m = _PARTITION_RE.match(name)
+        parts.append((name, datetime.date(int(m[1]), int(m[2]), 1) if m else None))
+    return sorted(parts, key=lambda p: p[1] or datetime.date.max)
+
+def create_partition(cur, month: datetime.date):
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF resume_records "
+        f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{_add_months(month, 1)} 00:00:00+00')"
+    )
+
+def ensure_partitions(conn, ahead: int = MONTHS_AHEAD):
+    """
+    Секции на текущий месяц и ahead месяцев вперёд. Новые строки не должны
+    попадать в DEFAULT: иначе секцию на их месяц уже не создать.
+    Ничего не делает, если таблица не секционирована; раз в месяц на процесс.
+    Вызывается из maintain (по расписанию) и ingest, но не на пути отправки
+    заявки: CREATE TABLE … PARTITION OF блокирует resume_records.
+    """
+    global _partitions_ready_for
+    this_month = _month_start(datetime.date.today())
+    if _partitions_ready_for == this_month:
+        return
+    if is_partitioned(conn):
+        with conn.cursor() as cur:
+            for i in range(ahead + 1):
+                create_partition(cur, _add_months(this_month, i))
+    conn.commit()
+    _partitions_ready_for = this_month
+
+
+# ─── Миграция ─────────────────────────────────────────────────────────────────
+def _archive_schema_sql() -> str:
+    cols = ", ".join(SUMMARY_COLUMNS)
+    return f"""
+    CREATE TABLE IF NOT EXISTS resume_records_archive AS
+        SELECT {cols}, NULL::text AS archive_file, NULL::text AS archive_member
+        FROM resume_records WITH NO DATA;
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_resume_archive_id ON resume_records_archive (id);
+    CREATE OR REPLACE VIEW resume_summary AS
+        SELECT {cols}, false AS archived FROM resume_records
+        UNION ALL
+        SELECT {cols}, true AS archived FROM resume_records_archive;
+    """
+
+def migrate(conn, drop_legacy: bool = False) -> int:
+    """
+    Переводит resume_records в секционированную таблицу в одной транзакции.
+    Старая таблица остаётся как resume_records_legacy (если не drop_legacy).
+    Возвращает число перенесённых строк.
+    """
+    from utils.query_cache import CHANGE_FEED_SQL
+    from utils.search import SEARCH_SCHEMA_SQL
+
+    if is_partitioned(conn):
+        raise SystemExit("resume_records уже секционирована")
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE resume_records IN ACCESS EXCLUSIVE MODE")
+        cur.execute("ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS file_hash text")
+        cur.execute(PREDICTIONS_SCHEMA_SQL)
+        cur.execute("UPDATE resume_records SET uploaded_at = coalesce(form_submitted_at, now()) "
+                    "WHERE uploaded_at IS NULL")
+
+        # Внешние ключи зависимых таблиц смотрят на старую таблицу
+        cur.execute("SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                    "WHERE confrelid = 'resume_records'::regclass AND contype = 'f'")
+        for table, name in cur.fetchall():
+            cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+        cur.execute("ALTER TABLE resume_records RENAME TO resume_records_legacy")
+        # Имена ограничений и индексов освобождаем для новой схемы
+        cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = 'resume_records_legacy'::regclass "
+                    "AND contype IN ('p', 'u', 'x')")
+        for (name,) in cur.fetchall():
+            cur.execute(f'ALTER TABLE resume_records_legacy RENAME CONSTRAINT "{name}" TO "{name}_legacy"')
+        cur.execute("""
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'resume_records_legacy'::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        """)
+        for (name,) in cur.fetchall():
+            cur.execute(f'ALTER INDEX "{name}" RENAME TO "{name}_legacy"')
+
+        cur.execute("""
+            CREATE TABLE resume_records (
+                LIKE resume_records_legacy INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY
+            ) PARTITION BY RANGE (uploaded_at)
+        """)
+        cur.execute("ALTER TABLE resume_records ALTER COLUMN uploaded_at SET NOT NULL")
+        cur.execute("ALTER TABLE resume_records ADD CONSTRAINT resume_records_pkey PRIMARY KEY (id, uploaded_at)")
+        cur.execute("CREATE INDEX ix_resume_file_hash ON resume_records (file_hash)")
+
+        # Последовательность id переходит к новой таблице (для serial)
+        cur.execute("SELECT pg_get_serial_sequence('resume_records_legacy', 'id'), "
+                    "(SELECT attidentity FROM pg_attribute "
+                    " WHERE attrelid = 'resume_records_legacy'::regclass AND attname = 'id')")
+        seq, identity = cur.fetchone()
+        if seq and not identity:
+            cur.execute(f"ALTER SEQUENCE {seq} OWNED BY resume_records.id")
+
+        cur.execute("SELECT min(uploaded_at)::date FROM resume_records_legacy")
+        first = cur.fetchone()[0] or datetime.date.today()
+        month, last = _month_start(first), _add_months(_month_start(datetime.date.today()), MONTHS_AHEAD)
+        while month <= last:
+            create_partition(cur, month)
+            month = _add_months(month, 1)
+        cur.execute("CREATE TABLE resume_records_default PARTITION OF resume_records DEFAULT")
+
+        cur.execute(IDENTITY_SQL)
+        cur.execute("""
+            SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) FROM pg_attribute
+            WHERE attrelid = 'resume_records_legacy'::regclass AND attnum > 0
+              AND NOT attisdropped AND attgenerated = ''
+        """)
+        cols = cur.fetchone()[0]
+        cur.execute(f"INSERT INTO resume_records ({cols}) SELECT {cols} FROM resume_records_legacy")
+        moved = cur.rowcount
+        cur.execute("SELECT count(*) FROM resume_records_legacy")
+        if cur.fetchone()[0] != moved:
+            raise RuntimeError("число строк после переноса не совпадает")
+        if identity:
+            cur.execute("SELECT setval(pg_get_serial_sequence('resume_records', 'id'), "
+                        "(SELECT coalesce(max(id), 1) FROM resume_records))")
+
+        cur.execute(SEARCH_SCHEMA_SQL)
+        cur.execute(CHANGE_FEED_SQL)
+        cur.execute(_archive_schema_sql())
+        if drop_legacy:
+            cur.execute("DROP TABLE resume_records_legacy")
+    conn.commit()
+    return moved
+
+
+# ─── Архивирование ────────────────────────────────────────────────────────────
+def _member_name(record_id: int, filename) -> str:
+    return f"{record_id}_" + re.sub(r'[\\/:*?"<>|\s]+', "_", str(filename or "cv")).strip("_")
+
+def archive_partition(conn, name: str, archive_dir: str = ARCHIVE_DIR) -> int:
+    """
+    Файлы секции → zip, затем в одной транзакции: DETACH, перенос строк
+    без файлов в resume_records_archive, чистка зависимых таблиц, DROP.
+    Если что-то упало до коммита, секция остаётся на месте.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.zip")
+    ids, members = [], []
+    with zipfile.ZipFile(path + ".tmp", "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        with conn.cursor(name=f"archive_{uuid.uuid4().hex}") as cur:
+            cur.itersize = 50
+            cur.execute(f"SELECT id, original_filename, cv_file FROM {name} WHERE cv_file IS NOT NULL")
+            for record_id, filename, blob in cur:
+                member = _member_name(record_id, filename)
+                zf.writestr(member, bytes(blob))
+                ids.append(record_id)
+                members.append(member)
+    conn.commit()
+    os.replace(path + ".tmp", path)
+
+    cols = ", ".join(SUMMARY_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE resume_records DETACH PARTITION {name}")
+        cur.execute(f"INSERT INTO resume_records_archive ({cols}, archive_file) "
+                    f"SELECT {cols}, %s FROM {name}", (path,))
+        rows = cur.rowcount
+        cur.execute("""
+            UPDATE resume_records_archive a SET archive_member = m.member
+            FROM unnest(%s::int[], %s::text[]) AS m(id, member) WHERE a.id = m.id
+        """, (ids, members))
+        for table in DEPENDENT_TABLES:
+            cur.execute("SELECT to_regclass(%s)", (table,))
+            if cur.fetchone()[0]:
+                cur.execute(f"DELETE FROM {table} WHERE record_id IN (SELECT id FROM {name})")
+        # DROP TABLE не вызывает триггеры удаления
+        cur.execute(f"DELETE FROM resume_identity WHERE id IN (SELECT id FROM {name})")
+        cur.execute(f"DROP TABLE {name}")
+    conn.commit()
+    logger.info(f"{name}: в архиве {rows} заявок, файлов {len(ids)} → {path}")
+    return rows
+
+def sync_identity(conn) -> None:
+    """Переустанавливает триггеры resume_identity и выравнивает её с resume_records."""
+    if not is_partitioned(conn):
+        raise SystemExit("resume_records не секционирована: сначала python -m utils.partitioning migrate")
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE resume_records IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(IDENTITY_SQL)
+        cur.execute(IDENTITY_RESYNC_SQL)
+    conn.commit()
+
+def retain(conn, months: int = RETENTION_MONTHS, archive_dir: str = ARCHIVE_DIR,
+           dry_run: bool = False) -> list[str]:
+    """Архивирует секции, целиком старше months месяцев."""
+    if not is_partitioned(conn):
+        raise SystemExit("resume_records не секционирована: сначала python -m utils.partitioning migrate")
+    ensure_partitions(conn)
+    ensure_predictions_schema(conn)
+    with conn.cursor() as cur:
+        cur.execute(_archive_schema_sql())
+    conn.commit()
+    cutoff = _add_months(_month_start(datetime.date.today()), -months)
+    old = [name for name, month in list_partitions(conn) if month is not None and _add_months(month, 1) <= cutoff]
+    if not dry_run:
+        for name in old:
+            archive_partition(conn, name, archive_dir)
+    return old
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Секционирование и архивирование resume_records")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("migrate", help="перевести resume_records на помесячные секции")
+    p.add_argument("--drop-legacy", action="store_true", help="удалить старую таблицу после переноса")
+    sub.add_parser("maintain", help="создать секции на месяцы вперёд")
+    p = sub.add_parser("retain", help="архивировать старые секции")
+    p.add_argument("--months", type=int, default=RETENTION_MONTHS)
+    p.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    p.add_argument("--dry-run", action="store_true")
+    sub.add_parser("list", help="секции и число строк")
+    sub.add_parser("identity", help="обновить триггеры resume_identity и выровнять её с заявками")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    conn = get_connection()
+    try:
+        if args.command == "migrate":
+            print(f"Перенесено строк: {migrate(conn, args.drop_legacy)}")
+        elif args.command == "identity":
+            sync_identity(conn)
+            print("resume_identity выровнена с resume_records")
+        elif args.command == "maintain":
+            ensure_partitions(conn)
+            print("Секции созданы")
+        elif args.command == "retain":
+            names = retain(conn, args.months, args.archive_dir, args.dry_run)
+            verb = "Будут архивированы" if args.dry_run else "Архивированы"
+            print(f"{verb}: {', '.join(names) if names else 'нет секций старше срока'}")
+        else:
+            with conn.cursor() as cur:
+                for name, _ in list_partitions(conn):
+                    cur.execute(f"SELECT count(*), pg_size_pretty(pg_total_relation_size('{name}')) FROM {name}")
+                    rows, size = cur.fetchone()
+                    print(f"{name:<32} {rows:>8} строк {size:>10}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# ─── Маленький DAG стадий с параллельным выполнением ──────────────────────────
+@dataclass
+class Stage:
+    name: str
+    func: callable           # func(**results_of_deps) -> result
+    deps: tuple = ()
+    label: str = ""          # подпись для UI
+
+
+@dataclass
+class StageState:
+    status: str = "pending"  # pending | running | done | error | skipped
+    started: float = 0.0
+    elapsed: float = 0.0
+    result: object = None
+    error: BaseException | None = None
+
+
+@dataclass
+class PipelineResult:
+    states: dict = field(default_factory=dict)
+    total_seconds: float = 0.0
+
+    def __getitem__(self, name):
+        return self.states[name].result
+
+    def failed(self):
+        return {n: s.error for n, s in self.states.items() if s.status == "error"}
+
+
+def _streamlit_initializer():
+    """
+    Прокидывает контекст текущей сессии Streamlit в потоки пула,
+    чтобы st.cache_resource и т.п. работали внутри стадий.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
+
+def run_dag(stages: list[Stage], on_update=None, max_workers: int = 4) -> PipelineResult:
+    """
+    Запускает стадию, как только готовы все её зависимости.
+    on_update(name, state) вызывается в вызывающем потоке (безопасно для st.*).
+    Если стадия упала, зависящие от неё стадии помечаются как skipped.
+    """
+    result = PipelineResult(states={s.name: StageState() for s in stages})
+    states = result.states
+    notify = on_update or (lambda name, state: None)
+    started_all = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=_streamlit_initializer()) as pool:
+        running = {}
+
+        def _submit_ready():
+            for s in stages:
+                st_ = states[s.name]
+                if st_.status != "pending":
+                    continue
+                dep_states = [states[d].status for d in s.deps]
+                if any(d in ("error", "skipped") for d in dep_states):
+                    st_.status = "skipped"
+                    notify(s.name, st_)
+                elif all(d == "done" for d in dep_states):
+                    kwargs = {d: states[d].result for d in s.deps}
+                    st_.status = "running"
+                    st_.started = time.perf_counter()
+                    running[pool.submit(s.func, **kwargs)] = s.name
+                    notify(s.name, st_)
+
+        _submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                st_ = states[name]
+                st_.elapsed = time.perf_counter() - st_.started
+                try:
+                    st_.result = fut.result()
+                    st_.status = "done"
+                except Exception as e:
+                    st_.error = e
+                    st_.status = "error"
+                    logger.error(f"Стадия {name} завершилась ошибкой", exc_info=e)
+                notify(name, st_)
+            _submit_ready()
+        # Всё, что осталось pending, недостижимо (цикл или упавшие зависимости)
+        for name, st_ in states.items():
+            if st_.status == "pending":
+                st_.status = "skipped"
+                notify(name, st_)
+
+    result.total_seconds = time.perf_counter() - started_all
+    return result
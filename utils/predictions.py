@@ -0,0 +1,218 @@
+"""
+Сохранённые вероятности модели и предсказания по порогам.
+
+При отправке заявки в resume_records пишутся вероятности по всем
+компетенциям (competency_probs real[], в порядке competency_list) и версия
+модели (model_version). Предсказания при другом THRESHOLD или при
+отдельных порогах для компетенций получаются из этих данных без повторного
+разбора резюме и инференса: векторно в numpy или прямо в SQL для панели HR.
+
+    python -m utils.predictions migrate                  # разово: колонки в resume_records
+    python -m utils.predictions backfill                 # вероятности для старых заявок
+    python -m utils.predictions compare --threshold 0.5  # что изменится при новом пороге
+"""
+import os
+import json
+import uuid
+import logging
+import argparse
+from functools import lru_cache
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from utils.constants import competency_list, THRESHOLD, THRESHOLDS_FILE, MODEL_VERSION
+from utils.cv_reader import preprocess_text
+from utils.schema import Schema, connection, run_migrate
+
+logger = logging.getLogger(__name__)
+
+PREDICTIONS_SCHEMA_SQL = """
+ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS competency_probs real[];
+ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS model_version text;
+"""
+
+SCHEMA = Schema("utils.predictions", ["resume_records.competency_probs", "resume_records.model_version"],
+                PREDICTIONS_SCHEMA_SQL)
+ensure_schema = SCHEMA.ensure
+migrate = SCHEMA.migrate
+
+
+# ─── Пороги ───────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=1)
+def current_thresholds(path: str = THRESHOLDS_FILE) -> tuple[float, ...]:
+    """
+    Пороги приложения: из файла калибровки (utils/calibrate.py), если он
+    посчитан для текущей MODEL_VERSION, иначе THRESHOLD для всех компетенций.
+    """
+    default = (THRESHOLD,) * len(competency_list)
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("model_version") != MODEL_VERSION:
+            logger.warning(f"{path} откалиброван для {data.get('model_version')}, "
+                           f"а работает {MODEL_VERSION}: используем THRESHOLD")
+            return default
+        return tuple(float(data["thresholds"].get(c, THRESHOLD)) for c in competency_list)
+    except (OSError, ValueError, KeyError, AttributeError):
+        logger.error(f"Не удалось прочитать пороги из {path}", exc_info=True)
+        return default
+
+def thresholds_vector(thresholds=None) -> np.ndarray:
+    """
+    Порог для каждой компетенции. thresholds — число, вектор длины
+    len(competency_list) или {компетенция: порог} поверх THRESHOLD;
+    None — текущие пороги приложения.
+    """
+    if thresholds is None:
+        thresholds = current_thresholds()
+    if isinstance(thresholds, dict):
+        unknown = set(thresholds) - set(competency_list)
+        if unknown:
+            raise ValueError(f"Неизвестные компетенции: {', '.join(sorted(unknown))}")
+        return np.array([thresholds.get(c, THRESHOLD) for c in competency_list], dtype=np.float32)
+    vec = np.broadcast_to(np.asarray(thresholds, dtype=np.float32), (len(competency_list),))
+    return vec.copy()
+
+def derive(probs: np.ndarray, thresholds=None) -> np.ndarray:
+    """Матрица предсказаний 0/1 (n, n_competencies) из матрицы вероятностей."""
+    return (probs > thresholds_vector(thresholds)).astype(np.int8)
+
+def predicted_select(thresholds=None, alias: str = "model_competencies") -> tuple[str, list]:
+    """Колонка со списком компетенций, которые модель видит при заданных порогах."""
+    sql = (f"ARRAY(SELECT t.c FROM unnest(competency_probs, %s::real[], %s::text[]) AS t(p, th, c) "
+           f"WHERE t.p > t.th) AS {alias}")
+    return sql, [thresholds_vector(thresholds).tolist(), list(competency_list)]
+
+
+# ─── Чтение из БД ─────────────────────────────────────────────────────────────
+def load_probs(conn, where: str = "TRUE", params=None, chunk: int = 5000):
+    """
+    (ids, probs float32 (n, n_competencies), model_versions) по заявкам с
+    сохранёнными вероятностями. Строки читаются серверным курсором порциями.
+    """
+    ids, versions, blocks = [], [], []
+    with conn.cursor(name=f"probs_{uuid.uuid4().hex}") as cur:
+        cur.itersize = chunk
+        cur.execute(f"SELECT id, model_version, competency_probs FROM resume_records "
+                    f"WHERE competency_probs IS NOT NULL AND ({where}) ORDER BY id", params)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            ids.extend(r[0] for r in rows)
+            versions.extend(r[1] for r in rows)
+            blocks.append(np.array([r[2] for r in rows], dtype=np.float32))
+    conn.commit()
+    probs = np.concatenate(blocks) if blocks else np.empty((0, len(competency_list)), dtype=np.float32)
+    return np.array(ids, dtype=np.int64), probs, versions
+
+def compare(probs: np.ndarray, new_thresholds, old_thresholds=None) -> dict:
+    """
+    Сколько предсказаний появится и пропадёт по каждой компетенции при смене
+    порогов (old_thresholds=None — текущие пороги приложения).
+    """
+    old, new = derive(probs, old_thresholds), derive(probs, new_thresholds)
+    gained, lost = ((new > old).sum(axis=0), (new < old).sum(axis=0))
+    return {
+        "records": int(len(probs)),
+        "records_changed": int((old != new).any(axis=1).sum()),
+        "per_competency": {
+            comp: {"old": int(o), "new": int(n), "gained": int(g), "lost": int(l)}
+            for comp, o, n, g, l in zip(competency_list, old.sum(axis=0), new.sum(axis=0), gained, lost)
+        },
+    }
+
+
+# ─── Дозаполнение ─────────────────────────────────────────────────────────────
+def backfill(conn=None, batch_size: int = 16) -> int:
+    """
+    Вероятности и версия модели для заявок без них или посчитанных другой
+    версией модели (как backfill эмбеддингов в utils.vector_store).
+    """
+    from utils.ingest import extract_text_from_bytes
+    from utils.model import load_configured, predict_batch
+    from utils.search import ensure_schema as ensure_search_schema
+
+    done = 0
+    with connection(conn) as conn:
+        ensure_search_schema(conn)
+        ensure_schema(conn)
+        tokenizer, model = load_configured()
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM resume_records "
+                        "WHERE competency_probs IS NULL OR model_version IS DISTINCT FROM %s ORDER BY id",
+                        (MODEL_VERSION,))
+            todo = [r[0] for r in cur]
+        conn.commit()
+        for start in range(0, len(todo), batch_size):
+            ids, texts = [], []
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, resume_text, github_text, original_filename, cv_file "
+                            "FROM resume_records WHERE id = ANY(%s)", (todo[start:start + batch_size],))
+                for record_id, resume_text, github_text, filename, blob in cur.fetchall():
+                    if not resume_text and blob is not None:
+                        resume_text = extract_text_from_bytes(filename or "cv.txt", bytes(blob))
+                    text = preprocess_text(" ".join(t for t in (resume_text, github_text) if t))
+                    if text:
+                        ids.append(record_id)
+                        texts.append(text)
+            if ids:
+                probs = predict_batch(tokenizer, model, texts)
+                with conn.cursor() as cur:
+                    execute_values(cur, """
+                        UPDATE resume_records r
+                        SET competency_probs = v.probs::real[], model_version = v.model_version
+                        FROM (VALUES %s) AS v(id, probs, model_version) WHERE r.id = v.id
+                    """, [(i, [float(p) for p in row], MODEL_VERSION) for i, row in zip(ids, probs)])
+                conn.commit()
+            done += len(ids)
+            logger.info(f"Вероятности сохранены для {done} из {len(todo)} заявок")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сохранённые вероятности модели")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="добавить колонки вероятностей в resume_records (разово)")
+    p = sub.add_parser("backfill", help="посчитать вероятности для заявок без них или другой версии модели")
+    p.add_argument("--batch-size", type=int, default=16)
+    p = sub.add_parser("compare", help="сравнить предсказания при текущих и новых порогах")
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("--threshold", type=float, help="общий порог")
+    group.add_argument("--thresholds-file", help="JSON {компетенция: порог}")
+    p.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+
+    if args.command == "migrate":
+        run_migrate(SCHEMA)
+        return
+    if args.command == "backfill":
+        print(f"Обработано заявок: {backfill(batch_size=args.batch_size)}")
+        return
+
+    if args.thresholds_file:
+        with open(args.thresholds_file, encoding="utf-8") as f:
+            new = json.load(f)
+        # Файл калибровки или просто {компетенция: порог}
+        new = new.get("thresholds", new)
+    else:
+        new = args.threshold
+    with connection() as conn:
+        ensure_schema(conn)
+        _, probs, _ = load_probs(conn)
+    report = compare(probs, new)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"Заявок: {report['records']}, изменятся предсказания у {report['records_changed']}")
+    for comp, r in report["per_competency"].items():
+        if r["gained"] or r["lost"]:
+            print(f"  {comp:<60} {r['old']:>6} → {r['new']:<6} (+{r['gained']} / -{r['lost']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Кэш запросов панели HR с инвалидацией по ленте изменений resume_records.
+
+Триггер на уровне оператора шлёт pg_notify('resume_records_changed') после
+INSERT/UPDATE/DELETE/TRUNCATE; фоновый поток держит одно соединение с
+LISTEN и увеличивает номер версии данных. Триггер ставится один раз
+миграцией (DROP/CREATE TRIGGER блокирует вставки):
+
+    python -m utils.query_cache install
+
+Если триггера нет или LISTEN недоступен (обрыв соединения), поток переходит
+на опрос счётчиков pg_stat_user_tables и периодически пытается вернуться к LISTEN.
+
+Результат запроса кэшируется по (раздел, sql, параметры, версия данных):
+после изменения таблицы старые записи просто перестают совпадать и
+вытесняются LRU, повторный просмотр без изменений не ходит в БД.
+"""
+import time
+import select
+import logging
+import argparse
+import threading
+
+from utils.cache import CACHES, BoundedCache, content_key
+from utils.constants import HR_QUERY_CACHE_LIMITS, CHANGE_FEED_POLL_INTERVAL
+from utils.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "resume_records_changed"
+# Через сколько секунд опроса снова пробовать LISTEN
+RELISTEN_INTERVAL = 60
+
+CHANGE_FEED_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_resume_records_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS trg_resume_records_changed ON resume_records;
+CREATE TRIGGER trg_resume_records_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON resume_records
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_resume_records_changed();
+"""
+
+# У секционированной таблицы счётчики ведутся по секциям
+POLL_SQL = """
+SELECT sum(n_tup_ins), sum(n_tup_upd), sum(n_tup_del)
+FROM pg_stat_user_tables
+WHERE relname = 'resume_records' OR relname ~ '^resume_records_([0-9]{4}_[0-9]{2}|default)$'
+"""
+
+TRIGGER_EXISTS_SQL = """
+SELECT 1 FROM pg_trigger
+WHERE tgrelid = to_regclass('resume_records') AND tgname = 'trg_resume_records_changed'
+"""
+
+query_cache = CACHES.setdefault("hr_queries", BoundedCache("hr_queries", **HR_QUERY_CACHE_LIMITS))
+
+
+class ChangeFeed:
+    """Номер версии данных resume_records, который растёт при каждом изменении."""
+
+    def __init__(self, poll_interval: float = CHANGE_FEED_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.mode = "starting"   # listen | polling
+        self.last_change = time.time()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+
+    def _bump(self):
+        with self._lock:
+            self.version += 1
+            self.last_change = time.time()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.warning("LISTEN/NOTIFY недоступен, переходим на опрос", exc_info=True)
+            # Пока LISTEN не работает, изменения могли пройти мимо
+            self._bump()
+            self._poll(RELISTEN_INTERVAL)
+
+    def _listen(self):
+        conn = get_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(TRIGGER_EXISTS_SQL)
+                if cur.fetchone() is None:
+                    raise RuntimeError("нет триггера trg_resume_records_changed: "
+                                       "выполните python -m utils.query_cache install")
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            self.mode = "listen"
+            while True:
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    self._bump()
+        finally:
+            conn.close()
+
+    def _poll(self, duration: float):
+        self.mode = "polling"
+        deadline = time.monotonic() + duration
+        last = None
+        while time.monotonic() < deadline:
+            try:
+                conn = get_connection()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(POLL_SQL)
+                        counters = cur.fetchone()
+                finally:
+                    conn.close()
+                if last is not None and counters != last:
+                    self._bump()
+                last = counters
+            except Exception:
+                logger.warning("Опрос изменений resume_records не удался", exc_info=True)
+            time.sleep(self.poll_interval)
+
+
+feed = ChangeFeed()
+
+
+def cached_read_sql(view: str, sql: str, params=None, prepare=None, session: str = "-", on_wait=None,
+                    **read_sql_kwargs):
+    """
+    pd.read_sql через кэш. view — раздел панели HR, prepare(conn) — подготовка
+    схемы перед запросом при промахе. При промахе запрос идёт через
+    utils.query_runner: session — метка сессии HR, on_wait — см. run_query.
+    Возвращаемый DataFrame общий для всех сессий: изменять его на месте нельзя.
+    """
+    from utils.query_runner import run_query, stats as query_stats
+
+    feed.start()
+    key = content_key(view, sql, repr(params), feed.version)
+    df, found = query_cache.get(key)
+    if found:
+        query_stats.record(session, view, "cache", 0.0)
+        return df
+    df = run_query(session, view, sql, params, prepare=prepare, on_wait=on_wait, **read_sql_kwargs)
+    query_cache.put(key, df)
+    return df
+
+
+def install(conn):
+    """Функция и триггер ленты изменений; разово, вместе с миграциями."""
+    with conn.cursor() as cur:
+        cur.execute(CHANGE_FEED_SQL)
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Лента изменений resume_records для кэша панели HR")
+    parser.add_argument("command", choices=["install"])
+    parser.parse_args()
+    conn = get_connection()
+    try:
+        install(conn)
+    finally:
+        conn.close()
+    print("Триггер trg_resume_records_changed установлен")
+
+
+if __name__ == "__main__":
+    main()
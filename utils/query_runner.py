@@ -0,0 +1,193 @@
+"""
+Отменяемые запросы панели HR с ограничением по времени.
+
+Любое изменение фильтра перезапускает скрипт Streamlit, но уже начатый
+pd.read_sql без отмены дорабатывал бы в PostgreSQL до конца, и частая
+смена фильтров копила бы тяжёлые параллельные запросы. Поэтому запрос
+выполняется в пуле потоков на отдельном соединении:
+
+- application_name "cv-analyzer-hr:<сессия>:<раздел>" — запрос виден в
+  pg_stat_activity с привязкой к сессии HR;
+- statement_timeout = HR_STATEMENT_TIMEOUT_MS — тяжёлый фильтр не держит
+  бэкенд дольше лимита;
+- новый запрос той же сессии и раздела отменяет прежний (connection.cancel());
+- пока запрос идёт, поток скрипта раз в WAIT_TICK секунд вызывает on_wait.
+  В приложении это обновление st.empty(): на нём Streamlit прерывает
+  устаревший прогон, и запрос отменяется в finally.
+
+Итог каждого запроса (ok / cancelled / timeout / error / cache и время)
+пишется в статистику по разделам для страницы администратора.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from utils.constants import HR_STATEMENT_TIMEOUT_MS, HR_QUERY_WORKERS
+from utils.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+APPLICATION_NAME = "cv-analyzer-hr"
+# Как часто поток скрипта проверяет, не пора ли прерваться, сек
+WAIT_TICK = 0.25
+# SQLSTATE query_canceled: и pg_cancel_backend/cancel(), и statement_timeout
+QUERY_CANCELED = "57014"
+
+
+class QueryCancelled(Exception):
+    """Запрос отменён: та же сессия запустила более новый запрос раздела."""
+
+
+class QueryTimeout(Exception):
+    """Запрос прерван по statement_timeout."""
+
+
+class _Query:
+    """Запрос в работе; cancel() безопасно вызывать из любого потока."""
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.cancelled = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn) -> bool:
+        with self._lock:
+            self._conn = conn
+            return not self.cancelled
+
+    def detach(self):
+        with self._lock:
+            self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except Exception:
+                    logger.debug(f"Не удалось отменить {self.tag}", exc_info=True)
+
+
+class QueryStats:
+    """Счётчики запросов панели HR по разделам."""
+
+    OUTCOMES = ("ok", "cache", "cancelled", "timeout", "error")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._last = {}
+
+    def record(self, session: str, view: str, outcome: str, ms: float):
+        with self._lock:
+            s = self._views.setdefault(view, {**dict.fromkeys(self.OUTCOMES, 0), "total_ms": 0.0, "max_ms": 0.0})
+            s[outcome] += 1
+            if outcome == "ok":
+                s["total_ms"] += ms
+                s["max_ms"] = max(s["max_ms"], ms)
+            self._last[(session, view)] = {"status": outcome, "ms": round(ms, 1), "at": time.time()}
+
+    def last(self, session: str, view: str) -> dict | None:
+        with self._lock:
+            return self._last.get((session, view))
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"view": view, **{k: s[k] for k in self.OUTCOMES},
+                 "avg_ms": round(s["total_ms"] / s["ok"], 1) if s["ok"] else 0.0,
+                 "max_ms": round(s["max_ms"], 1)}
+                for view, s in self._views.items()
+            ]
+
+
+stats = QueryStats()
+_executor = ThreadPoolExecutor(max_workers=HR_QUERY_WORKERS, thread_name_prefix="hr-query")
+_inflight: dict[tuple[str, str], _Query] = {}
+_inflight_lock = threading.Lock()
+
+
+def _is_query_canceled(exc: BaseException) -> bool:
+    # pandas заворачивает ошибку драйвера в свой DatabaseError (raise … from exc)
+    while exc is not None:
+        if getattr(exc, "pgcode", None) == QUERY_CANCELED:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+def _execute(query: _Query, sql: str, params, prepare, timeout_ms: int, read_sql_kwargs: dict):
+    import pandas as pd
+
+    conn = get_connection(application_name=query.tag[:63], options=f"-c statement_timeout={int(timeout_ms)}")
+    try:
+        if not query.attach(conn):
+            raise QueryCancelled(query.tag)
+        if prepare is not None:
+            prepare(conn)
+        return pd.read_sql(sql, conn, params=params, **read_sql_kwargs)
+    finally:
+        query.detach()
+        conn.close()
+
+def run_query(session: str, view: str, sql: str, params=None, prepare=None,
+              timeout_ms: int = HR_STATEMENT_TIMEOUT_MS, on_wait=None, **read_sql_kwargs):
+    """
+    pd.read_sql с отменой и statement_timeout. on_wait(секунды) вызывается,
+    пока запрос выполняется; исключение из него (в том числе остановка прогона
+    Streamlit) отменяет запрос в БД. Бросает QueryCancelled и QueryTimeout.
+    """
+    key = (session, view)
+    query = _Query(f"{APPLICATION_NAME}:{session}:{view}")
+    with _inflight_lock:
+        previous = _inflight.get(key)
+        _inflight[key] = query
+    if previous is not None:
+        previous.cancel()
+
+    started = time.perf_counter()
+    future = _executor.submit(_execute, query, sql, params, prepare, timeout_ms, read_sql_kwargs)
+    outcome = "error"
+    try:
+        while True:
+            try:
+                df = future.result(timeout=WAIT_TICK)
+            except FuturesTimeout:
+                if on_wait is not None:
+                    on_wait(time.perf_counter() - started)
+                continue
+            except QueryCancelled:
+                outcome = "cancelled"
+                raise
+            except Exception as exc:
+                if not _is_query_canceled(exc):
+                    raise
+                if query.cancelled:
+                    outcome = "cancelled"
+                    raise QueryCancelled(query.tag) from exc
+                outcome = "timeout"
+                raise QueryTimeout(f"{query.tag}: дольше {timeout_ms} мс") from exc
+            outcome = "ok"
+            return df
+    finally:
+        if not future.done():
+            # Прогон скрипта прерван — результат больше никому не нужен
+            query.cancel()
+            outcome = "cancelled"
+        with _inflight_lock:
+            if _inflight.get(key) is query:
+                del _inflight[key]
+        ms = (time.perf_counter() - started) * 1000
+        stats.record(session, view, outcome, ms)
+        if outcome != "ok":
+            logger.info(f"{query.tag}: {outcome} через {ms:.0f} мс")
+
+def cancel_session(session: str) -> int:
+    """Отменяет все запросы сессии в этом процессе; возвращает их число."""
+    with _inflight_lock:
+        queries = [q for (s, _), q in _inflight.items() if s == session]
+    for q in queries:
+        q.cancel()
+    return len(queries)
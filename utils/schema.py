@@ -0,0 +1,120 @@
+"""
+Схемы модулей поверх resume_records: DDL только в разовой миграции,
+на пути запроса — дешёвая проверка по pg_catalog.
+
+ALTER TABLE берёт ACCESS EXCLUSIVE даже при ADD COLUMN IF NOT EXISTS и
+встаёт в очередь за долгими запросами HR, а за ним — все остальные
+запросы к таблице. Поэтому отправка заявки и панель HR только проверяют,
+что нужные таблицы и колонки есть (один раз на процесс), а создаёт их
+команда migrate:
+
+    python -m utils.schema migrate        # все модули по порядку
+    python -m utils.search migrate        # или один модуль
+"""
+import logging
+import argparse
+import importlib
+import threading
+from contextlib import contextmanager
+
+from utils.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Порядок миграций: колонки resume_records раньше зависящих от них таблиц
+MODULES = ["utils.search", "utils.predictions", "utils.enrichment", "utils.dedup", "utils.vector_store"]
+
+
+class Schema:
+    """
+    requires — таблицы и колонки, без которых модуль не работает:
+    "table" или "table.column". ddl — SQL миграции или функция migrate(conn)
+    для миграций, которым нужен autocommit (CREATE INDEX CONCURRENTLY).
+    """
+
+    def __init__(self, module: str, requires: list[str], ddl):
+        self.module = module
+        self.requires = requires
+        self.ddl = ddl
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def missing(self, conn) -> list[str]:
+        found = []
+        with conn.cursor() as cur:
+            for item in self.requires:
+                table, _, column = item.partition(".")
+                if column:
+                    cur.execute("SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(%s) "
+                                "AND attname = %s AND NOT attisdropped", (table, column))
+                else:
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+                row = cur.fetchone()
+                if not row or not row[0]:
+                    found.append(item)
+        conn.commit()
+        return found
+
+    def ensure(self, conn):
+        """Проверка на пути запроса; сама схему не меняет."""
+        if self._ready:
+            return
+        missing = self.missing(conn)
+        if missing:
+            raise RuntimeError(f"В БД нет {', '.join(missing)}: выполните python -m {self.module} migrate")
+        self._ready = True
+
+    def migrate(self, conn):
+        with self._lock:
+            if callable(self.ddl):
+                self.ddl(conn)
+            else:
+                with conn.cursor() as cur:
+                    cur.execute(self.ddl)
+                conn.commit()
+            self._ready = True
+        logger.info(f"Схема {self.module} готова")
+
+
+@contextmanager
+def connection(conn=None):
+    """Переданное соединение или новое, которое закрывается на выходе."""
+    if conn is not None:
+        yield conn
+        return
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def run_migrate(schema: Schema):
+    """Команда migrate в CLI модуля."""
+    with connection() as conn:
+        schema.migrate(conn)
+    print(f"Схема {schema.module} готова")
+
+
+def migrate_all(conn):
+    for name in MODULES:
+        importlib.import_module(name).SCHEMA.migrate(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схем модулей")
+    parser.add_argument("command", choices=["migrate", "check"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    with connection() as conn:
+        if args.command == "migrate":
+            migrate_all(conn)
+            print("Схемы всех модулей готовы")
+            return
+        for name in MODULES:
+            missing = importlib.import_module(name).SCHEMA.missing(conn)
+            print(f"{name}: {'нет ' + ', '.join(missing) if missing else 'ok'}")
+
+
+if __name__ == "__main__":
+    main()
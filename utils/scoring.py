@@ -0,0 +1,33 @@
+import numpy as np
+
+from utils.constants import competency_list, profession_matrix, profession_names
+
+# Колонка resume_records с процентом соответствия для каждой профессии
+score_columns = {
+    "Аналитик данных":           "datan_score",
+    "Менеджер в ИИ":             "ai_manager_score",
+    "Технический аналитик в ИИ": "techan_score",
+    "Инженер данных":            "daten_score",
+}
+
+# ─── Расчёт по матрице компетенций ────────────────────────────────────────────
+def grade_lists(grades) -> dict[int, list[str]]:
+    """Раскладывает вектор грейдов 0…3 в списки компетенций grade0…grade3."""
+    lists = {i: [] for i in range(4)}
+    for comp, g in zip(competency_list, grades):
+        lists[int(g)].append(comp)
+    return lists
+
+def profession_scores(grades) -> dict[str, float]:
+    """
+    Процент соответствия по каждой профессии: доля требуемых компетенций,
+    по которым грейд кандидата не ниже требуемого. Ключи — колонки score_*.
+    """
+    user_vector = np.asarray(grades)
+    scores = {}
+    for i, prof in enumerate(profession_names):
+        req = profession_matrix[:, i]
+        tot = np.count_nonzero(req)
+        match = np.count_nonzero((user_vector >= req) & (req > 0))
+        scores[score_columns[prof]] = match / tot * 100 if tot else 0.0
+    return scores
@@ -0,0 +1,145 @@
+"""
+Полнотекстовый поиск по тексту резюме и GitHub для HR.
+
+Нормализованный текст сохраняется в resume_records при отправке заявки,
+tsvector строится генерируемой колонкой сразу по русской и английской
+конфигурациям и индексируется GIN. Запрос HR разбирается
+websearch_to_tsquery ("airflow kafka", "spark -hadoop", "\"data vault\"").
+
+    python -m utils.search migrate    # разово: колонки и GIN-индекс (CONCURRENTLY)
+    python -m utils.search backfill   # текст и tsvector для старых заявок
+
+Генерируемая колонка STORED переписывает всю таблицу под ACCESS EXCLUSIVE,
+поэтому схема создаётся только командой migrate вне часов пик; приложение
+лишь проверяет, что колонка есть.
+"""
+import re
+import logging
+import argparse
+
+from utils.cv_reader import preprocess_text
+from utils.schema import Schema, connection, run_migrate
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS_SQL = """
+ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS resume_text text;
+ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS github_text text;
+ALTER TABLE resume_records ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(resume_text, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(resume_text, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(github_text, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(github_text, '')), 'B')
+    ) STORED;
+"""
+SEARCH_INDEX = "ix_resume_search_tsv"
+# Для миграций, которые и так держат таблицу заблокированной (utils.partitioning)
+SEARCH_SCHEMA_SQL = SEARCH_COLUMNS_SQL + \
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON resume_records USING GIN (search_tsv);\n"
+
+# Запрос сразу в двух конфигурациях: русская морфология и английские термины
+TSQUERY_SQL = "(websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s))"
+HEADLINE_OPTIONS = "StartSel=**, StopSel=**, MaxFragments=2, MaxWords=18, MinWords=6, FragmentDelimiter=\" … \""
+
+
+def _migrate(conn):
+    """
+    Колонки текста и tsvector, затем GIN-индекс без блокировки записи.
+    У секционированной таблицы индекс строится CONCURRENTLY по каждой секции
+    и подключается к индексу родителя (ON ONLY). Если построение прервалось,
+    невалидный индекс удаляется и строится заново при повторном запуске.
+    """
+    from utils.partitioning import is_partitioned, list_partitions
+
+    with conn.cursor() as cur:
+        cur.execute(SEARCH_COLUMNS_SQL)
+    conn.commit()
+    partitioned = is_partitioned(conn)
+    targets = [(f"{name}_search_tsv_idx", name) for name, _ in list_partitions(conn)] if partitioned \
+        else [(SEARCH_INDEX, "resume_records")]
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            if partitioned:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON ONLY resume_records USING GIN (search_tsv)")
+            for index, table in targets:
+                cur.execute("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (index,))
+                row = cur.fetchone()
+                if row and row[0]:
+                    cur.execute(f"DROP INDEX CONCURRENTLY {index}")
+                logger.info(f"GIN-индекс {index} на {table}")
+                cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} USING GIN (search_tsv)")
+                if partitioned:
+                    cur.execute(f"ALTER INDEX {SEARCH_INDEX} ATTACH PARTITION {index}")
+    finally:
+        conn.autocommit = False
+
+
+SCHEMA = Schema("utils.search",
+                ["resume_records.resume_text", "resume_records.github_text", "resume_records.search_tsv"], _migrate)
+ensure_schema = SCHEMA.ensure
+migrate = SCHEMA.migrate
+
+
+# ─── Фрагменты SQL для вкладок HR ─────────────────────────────────────────────
+def search_condition(query: str) -> tuple[str, list]:
+    return f"search_tsv @@ {TSQUERY_SQL}", [query, query]
+
+def search_select(query: str) -> tuple[str, list]:
+    """Колонки rank и snippet (с выделением совпадений **…**)."""
+    sql = (f"ts_rank_cd(search_tsv, {TSQUERY_SQL}) AS rank, "
+           f"ts_headline('russian', coalesce(resume_text, ''), {TSQUERY_SQL}, %s) AS snippet")
+    return sql, [query, query, query, query, HEADLINE_OPTIONS]
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|<>~$:])")
+
+def escape_markdown(text) -> str:
+    """Текст кандидата для st.markdown: без ссылок, картинок и разметки."""
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", re.sub(r"\s+", " ", str(text or "")))
+
+def snippet_markdown(snippet) -> str:
+    """Фрагмент ts_headline для st.markdown: экранируется всё, кроме выделения **…**."""
+    return "**".join(escape_markdown(part) for part in str(snippet or "").split("**"))
+
+
+# ─── Дозаполнение ─────────────────────────────────────────────────────────────
+def backfill(conn=None, batch: int = 100) -> int:
+    from utils.ingest import extract_text_from_bytes
+
+    done = 0
+    with connection(conn) as conn:
+        ensure_schema(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM resume_records WHERE resume_text IS NULL AND cv_file IS NOT NULL ORDER BY id")
+            todo = [r[0] for r in cur]
+        for record_id in todo:
+            with conn.cursor() as cur:
+                cur.execute("SELECT original_filename, cv_file FROM resume_records WHERE id = %s", (record_id,))
+                filename, blob = cur.fetchone()
+                text = extract_text_from_bytes(filename or "cv.txt", bytes(blob))
+                if not text:
+                    continue
+                cur.execute("UPDATE resume_records SET resume_text = %s WHERE id = %s",
+                            (preprocess_text(text), record_id))
+            done += 1
+            if done % batch == 0:
+                conn.commit()
+                logger.info(f"Текст сохранён для {done} из {len(todo)} заявок")
+        conn.commit()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Полнотекстовый поиск по резюме")
+    parser.add_argument("command", choices=["migrate", "backfill"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    if args.command == "migrate":
+        run_migrate(SCHEMA)
+        return
+    print(f"Обработано заявок: {backfill()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Упаковка текста резюме в бюджет токенов модели по разделам.
+
+Модель видит только первые MAX_LENGTH токенов, а резюме обычно начинается с
+личных данных, зарплаты, адреса и графика работы — навыки и опыт при
+обрезке с конца теряются. Здесь текст режется на разделы по заголовкам
+(словарь на русском и английском, строки-заголовки, маркеры списков),
+разделы бьются на фрагменты, каждый фрагмент получает оценку: вес типа
+раздела плюс плотность терминов компетенций. В бюджет жадно набираются
+самые ценные фрагменты и склеиваются в исходном порядке. Текст, который
+и так помещается, не меняется.
+
+Работает и по сырому тексту с переносами строк, и по уже нормализованному
+preprocess_text (одна строка в нижнем регистре) — заголовки тогда ищутся
+внутри строки.
+
+    python -m utils.sections show resume.pdf             # какие фрагменты попадут в модель
+    python -m utils.sections bench --budgets 512 256     # точность обрезки и упаковки
+"""
+import re
+import time
+import logging
+import argparse
+from dataclasses import dataclass
+
+from utils.constants import MAX_LENGTH
+
+logger = logging.getLogger(__name__)
+
+# Заголовки разделов → тип раздела
+SECTION_HEADINGS = {
+    "personal": [
+        "личная информация", "личные данные", "контактная информация", "контакты", "контакт",
+        "желаемая должность и зарплата", "желаемая должность", "гражданство", "занятость",
+        "график работы", "желательное время в пути до работы",
+        "personal information", "personal details", "contact information", "contacts",
+    ],
+    "skills": [
+        "ключевые навыки", "профессиональные навыки", "технические навыки", "навыки",
+        "стек технологий", "технологический стек", "инструменты",
+        "key skills", "technical skills", "hard skills", "skills", "tech stack",
+    ],
+    "experience": [
+        "опыт работы", "профессиональный опыт", "места работы", "трудовая деятельность",
+        "work experience", "professional experience", "employment history", "experience",
+    ],
+    "projects": ["pet-проекты", "проекты", "портфолио", "projects", "portfolio"],
+    "about": [
+        "обо мне", "о себе", "дополнительная информация", "достижения",
+        "about me", "summary", "achievements",
+    ],
+    "education": [
+        "повышение квалификации, курсы", "повышение квалификации", "образование", "курсы",
+        "сертификаты", "тесты, экзамены", "education", "courses", "certificates", "certifications",
+    ],
+    "languages": ["знание языков", "иностранные языки", "languages"],
+}
+
+# Вес типа раздела; intro — текст до первого заголовка
+SECTION_PRIORS = {
+    "skills": 3.0, "projects": 2.5, "experience": 2.0, "about": 1.5,
+    "education": 1.0, "intro": 0.5, "languages": 0.2, "personal": 0.0,
+}
+
+# Основы терминов, по которым модель определяет компетенции (совпадение по началу слова)
+RELEVANCE_TERMS = [
+    "python", "sql", "pandas", "numpy", "scipy", "sklearn", "scikit", "pytorch", "torch", "tensorflow",
+    "keras", "catboost", "xgboost", "lightgbm", "transformers", "bert", "gpt", "llm", "nlp", "rag",
+    "langchain", "opencv", "yolo", "ml", "mlops", "dl", "machine learning", "deep learning",
+    "data science", "data engineer", "data analy", "analytics", "statistic", "regression",
+    "classification", "clustering", "forecast", "a/b", "ab-тест", "hypothes", "spark", "hadoop",
+    "hive", "airflow", "kafka", "etl", "elt", "dwh", "dbt", "clickhouse", "postgres", "mysql",
+    "oracle", "mongodb", "redis", "greenplum", "vertica", "superset", "tableau", "power bi",
+    "looker", "metabase", "excel", "docker", "kubernetes", "k8s", "git", "linux", "bash", "ci/cd",
+    "fastapi", "flask", "django", "api", "aws", "gcp", "azure", "yandex cloud", "jira",
+    "confluence", "agile", "scrum", "kanban", "product", "roadmap", "stakeholder",
+    "машинн", "нейросет", "нейронн", "глубок", "компьютерн зрени", "обработк естествен", "модел",
+    "алгоритм", "статистик", "регресс", "классификац", "кластериз", "прогноз", "гипотез", "метрик",
+    "анализ данных", "аналитик", "визуализ", "дашборд", "отчёт", "отчет", "хранилищ", "витрин",
+    "баз данных", "пайплайн", "конвейер", "разработ", "внедр", "автоматизац", "оптимизац",
+    "исследован", "эксперимент", "управлени", "продукт", "проект", "команд", "требовани",
+    "архитектур", "онтолог", "граф знаний", "инженер данных", "данных", "данные",
+]
+
+# Фрагменты не длиннее стольких слов: длинный раздел опыта попадает в бюджет частями
+CHUNK_WORDS = 60
+
+_HEADING_RE = re.compile(
+    r"(?<![\w-])(" + "|".join(sorted((re.escape(h) for hs in SECTION_HEADINGS.values() for h in hs),
+                                    key=len, reverse=True)) + r")(?![\w-])\s*:?",
+    re.IGNORECASE,
+)
+_HEADING_TYPE = {h: kind for kind, hs in SECTION_HEADINGS.items() for h in hs}
+_TERM_RE = re.compile(r"(?<![\w])(" + "|".join(re.escape(t) for t in sorted(RELEVANCE_TERMS, key=len, reverse=True)) + ")",
+                      re.IGNORECASE)
+# Границы единиц внутри раздела: пункты списков, концы предложений, переносы строк
+_UNIT_SPLIT_RE = re.compile(r"\s*[•●▪◦·]\s*|\n+\s*(?:[-–—*]|\d+[.)])?\s*|(?<=[.;!?])\s+")
+_WORD_RE = re.compile(r"\S+")
+
+
+@dataclass
+class Chunk:
+    kind: str
+    text: str
+    position: int
+    score: float = 0.0
+    tokens: int = 0
+
+
+# ─── Разбиение ────────────────────────────────────────────────────────────────
+def _is_heading_line(line: str) -> bool:
+    words = line.split()
+    return 0 < len(words) <= 5 and (line.rstrip().endswith(":") or bool(_HEADING_RE.fullmatch(line.strip())))
+
+def split_sections(text: str) -> list[tuple[str, str]]:
+    """[(тип раздела, текст раздела вместе с заголовком)] в исходном порядке."""
+    if "\n" in text:
+        # Сырой текст: заголовок — короткая отдельная строка
+        sections, kind, lines = [], "intro", []
+        for line in text.splitlines():
+            if _is_heading_line(line):
+                if lines:
+                    sections.append((kind, "\n".join(lines)))
+                m = _HEADING_RE.search(line)
+                kind = _HEADING_TYPE.get(m.group(1).lower(), "about") if m else "about"
+                lines = [line.strip()]
+            elif line.strip():
+                lines.append(line)
+        if lines:
+            sections.append((kind, "\n".join(lines)))
+        return sections
+
+    # Нормализованный текст в одну строку: заголовки ищем внутри
+    sections, kind, start = [], "intro", 0
+    for m in _HEADING_RE.finditer(text):
+        if text[start:m.start()].strip():
+            sections.append((kind, text[start:m.start()].strip()))
+        kind, start = _HEADING_TYPE[m.group(1).lower()], m.start()
+    if text[start:].strip():
+        sections.append((kind, text[start:].strip()))
+    return sections
+
+def _units(body: str, chunk_words: int):
+    """Пункты и предложения; слишком длинные (нормализованный текст без точек) — окнами слов."""
+    for unit in _UNIT_SPLIT_RE.split(body):
+        words = unit.split()
+        for i in range(0, len(words), chunk_words):
+            yield " ".join(words[i:i + chunk_words])
+
+def chunk_sections(sections: list[tuple[str, str]], chunk_words: int = CHUNK_WORDS) -> list[Chunk]:
+    """Режет разделы на фрагменты по пунктам и предложениям, не длиннее chunk_words слов."""
+    chunks = []
+    for kind, body in sections:
+        current, count = [], 0
+        for unit in _units(body, chunk_words):
+            n = len(unit.split())
+            if current and count + n > chunk_words:
+                chunks.append(Chunk(kind, " ".join(current), len(chunks)))
+                current, count = [], 0
+            current.append(unit)
+            count += n
+        if current:
+            chunks.append(Chunk(kind, " ".join(current), len(chunks)))
+    return chunks
+
+def relevance(text: str) -> float:
+    """Плотность терминов компетенций: совпадений на 10 слов."""
+    words = len(text.split())
+    return 10.0 * len(_TERM_RE.findall(text)) / words if words else 0.0
+
+def score_chunks(chunks: list[Chunk]) -> list[Chunk]:
+    for c in chunks:
+        c.score = SECTION_PRIORS.get(c.kind, 1.0) + relevance(c.text)
+    return chunks
+
+
+# ─── Упаковка ─────────────────────────────────────────────────────────────────
+def estimate_tokens(texts: list[str]) -> list[int]:
+    """Оценка без токенизатора: WordPiece дробит русские слова примерно на 1,6 части."""
+    return [int(len(t.split()) * 1.6) + 1 for t in texts]
+
+def tokenizer_counter(tokenizer):
+    def count(texts: list[str]) -> list[int]:
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+def _truncate_words(text: str, tokens: int, max_tokens: int) -> str:
+    words = _WORD_RE.findall(text)
+    keep = max(1, int(len(words) * max_tokens / max(tokens, 1)))
+    return " ".join(words[:keep])
+
+def pack(text: str, budget: int, count_tokens=estimate_tokens) -> str:
+    """
+    Самые ценные фрагменты text, уместившиеся в budget токенов, в исходном
+    порядке. count_tokens(list[str]) -> list[int] — счётчик токенов модели.
+    """
+    if not text or count_tokens([text])[0] <= budget:
+        return text
+    chunks = score_chunks(chunk_sections(split_sections(text)))
+    for c, n in zip(chunks, count_tokens([c.text for c in chunks])):
+        c.tokens = n
+
+    picked, left = [], budget
+    # Жадно по оценке, при равенстве — что раньше в тексте
+    for c in sorted(chunks, key=lambda c: (-c.score, c.position)):
+        if left <= 0:
+            break
+        if c.tokens <= left:
+            picked.append(c)
+            left -= c.tokens
+        elif c.score > SECTION_PRIORS["personal"] and left >= 16:
+            # Не влезающий фрагмент берём началом, остаток бюджета не пропадает
+            picked.append(Chunk(c.kind, _truncate_words(c.text, c.tokens, left), c.position, c.score))
+            left = 0
+    return " ".join(c.text for c in sorted(picked, key=lambda c: c.position))
+
+def pack_for_model(texts: list[str], tokenizer, max_length: int = MAX_LENGTH) -> list[str]:
+    """Упаковка батча в бюджет модели за вычетом служебных токенов."""
+    budget = max_length - tokenizer.num_special_tokens_to_add()
+    count = tokenizer_counter(tokenizer)
+    return [pack(t, budget, count) for t in texts]
+
+
+# ─── Бенчмарк ─────────────────────────────────────────────────────────────────
+def benchmark(budgets: list[int], limit: int | None = None, batch_size: int = 16) -> list[dict]:
+    """
+    F1 против разметки others/resume_dataset.csv при обрезке и при упаковке
+    с одинаковым бюджетом токенов; пороги — текущие пороги приложения.
+    """
+    import numpy as np
+    from utils.calibrate import evaluate
+    from utils.distill import load_dataset
+    from utils.model import load_configured, predict_batch
+    from utils.predictions import thresholds_vector
+
+    texts, labels = load_dataset()
+    if limit:
+        texts, labels = texts[:limit], labels[:limit]
+    tokenizer, model = load_configured()
+    th = thresholds_vector()
+    count = tokenizer_counter(tokenizer)
+    over = sum(n > MAX_LENGTH - 2 for n in count(texts))
+    logger.info(f"{len(texts)} резюме, длиннее {MAX_LENGTH} токенов: {over}")
+
+    results = []
+    for budget in budgets:
+        for mode in ("truncate", "sections"):
+            started = time.perf_counter()
+            if mode == "sections":
+                inputs = [pack(t, budget - tokenizer.num_special_tokens_to_add(), count) for t in texts]
+            else:
+                inputs = texts
+            pack_ms = (time.perf_counter() - started) * 1000 / len(texts)
+            started = time.perf_counter()
+            probs = np.concatenate([
+                predict_batch(tokenizer, model, inputs[i:i + batch_size], max_length=budget, packing="truncate")
+                for i in range(0, len(inputs), batch_size)
+            ])
+            infer_ms = (time.perf_counter() - started) * 1000 / len(texts)
+            logits = np.log(np.clip(probs, 1e-6, 1 - 1e-6)) - np.log1p(-np.clip(probs, 1e-6, 1 - 1e-6))
+            m = evaluate(logits, labels, th)
+            results.append({"budget": budget, "mode": mode, "micro_f1": m["micro_f1"], "macro_f1": m["macro_f1"],
+                            "micro_recall": m["micro_recall"], "pack_ms": pack_ms, "infer_ms": infer_ms})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Упаковка резюме в бюджет токенов по разделам")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("show", help="показать разделы, оценки и упакованный текст")
+    p.add_argument("path")
+    p.add_argument("--budget", type=int, default=MAX_LENGTH - 2)
+    p = sub.add_parser("bench", help="F1 при обрезке и при упаковке на размеченном наборе")
+    p.add_argument("--budgets", type=int, nargs="+", default=[MAX_LENGTH, 256])
+    p.add_argument("--limit", type=int, help="взять первые N резюме")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+
+    if args.command == "show":
+        from utils.cv_reader import read_resume_from_file
+        text = read_resume_from_file(args.path) or ""
+        for c in score_chunks(chunk_sections(split_sections(text))):
+            print(f"[{c.kind:<10} {c.score:5.2f}] {c.text[:100]}")
+        print("\n──── В модель ────\n" + pack(text, args.budget))
+        return
+
+    print(f"{'бюджет':>6} {'режим':<9} {'micro-F1':>9} {'macro-F1':>9} {'recall':>7} {'упаковка, мс':>13} {'инференс, мс':>13}")
+    for r in benchmark(args.budgets, args.limit):
+        print(f"{r['budget']:>6} {r['mode']:<9} {r['micro_f1']:>9.4f} {r['macro_f1']:>9.4f} "
+              f"{r['micro_recall']:>7.3f} {r['pack_ms']:>13.2f} {r['infer_ms']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
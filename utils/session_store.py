@@ -0,0 +1,241 @@
+"""
+Компактное состояние сессий кандидатов.
+
+В st.session_state кандидата остаются только ссылки: id сессии, хеш
+содержимого загруженного файла и предсказания int8. Сам файл один раз
+пишется в хранилище по хешу (SESSION_DIR/blobs/<sha256><расширение>) —
+с этого пути его читает конвейер анализа и при отправке заявки
+save_application_to_db. Тексты резюме и GitHub, вероятности и эмбеддинг
+(float16) лежат в SessionStore процесса.
+
+Фоновый поток раз в минуту сбрасывает на диск (pickle) данные сессий, не
+активных SESSION_SPILL_AFTER секунд, и удаляет сессии, не активные
+SESSION_DROP_AFTER секунд, вместе с их файлами, на которые больше никто
+не ссылается. Вернувшийся кандидат прозрачно поднимает данные с диска.
+"""
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from utils.cache import approx_size
+from utils.constants import SESSION_DIR, SESSION_SPILL_AFTER, SESSION_DROP_AFTER
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.path.join(SESSION_DIR, "blobs")
+SPILL_DIR = os.path.join(SESSION_DIR, "spill")
+REAP_INTERVAL = 60
+
+
+# ─── Файлы резюме по хешу содержимого ─────────────────────────────────────────
+def put_blob(data: bytes, filename: str) -> str:
+    """Сохраняет файл (если его ещё нет) и возвращает handle: <sha256><расширение>."""
+    handle = hashlib.sha256(data).hexdigest() + os.path.splitext(filename)[1].lower()
+    path = blob_path(handle)
+    if not os.path.exists(path):
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    else:
+        os.utime(path)
+    return handle
+
+def blob_path(handle: str) -> str:
+    return os.path.join(BLOB_DIR, handle)
+
+def read_blob(handle: str) -> bytes:
+    with open(blob_path(handle), "rb") as f:
+        return f.read()
+
+
+# ─── Данные сессий ────────────────────────────────────────────────────────────
+def compact(value):
+    """float-массивы хранятся в float16, кроме вероятностей (см. put)."""
+    if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+        return value.astype(np.float16)
+    return value
+
+
+class SessionStore:
+    """
+    Данные сессий кандидатов процесса: в памяти, сброшенные на диск или
+    удалённые по простою.
+    """
+
+    def __init__(self, spill_after: float = SESSION_SPILL_AFTER, drop_after: float = SESSION_DROP_AFTER):
+        self.spill_after = spill_after
+        self.drop_after = drop_after
+        self._entries = {}  # sid -> {"data": dict | None, "blob": str, "last": float}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.spilled = self.restored = self.dropped = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-reaper", daemon=True)
+                self._thread.start()
+
+    def put(self, sid: str, blob: str, **data):
+        """
+        Заменяет данные сессии. Вероятности не сжимаются: они сохраняются
+        в заявке, и по ним потом заново считаются предсказания у порогов.
+        """
+        self.start()
+        data = {k: v if k == "probs" else compact(v) for k, v in data.items()}
+        with self._lock:
+            old = self._entries.get(sid)
+            self._entries[sid] = {"data": data, "blob": blob, "last": time.time()}
+        if old is not None and old["data"] is None:
+            self._remove_spill(sid)
+        if old is not None and old["blob"] != blob:
+            self._release_blob(old["blob"])
+
+    def get(self, sid: str) -> dict | None:
+        """Данные сессии (с подъёмом с диска) или None, если сессия удалена."""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            entry["last"] = time.time()
+            if entry["data"] is not None:
+                return entry["data"]
+        try:
+            with open(self._spill_path(sid), "rb") as f:
+                data = pickle.load(f)
+        except OSError:
+            logger.warning(f"Нет сброшенных данных сессии {sid}", exc_info=True)
+            return None
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry["data"] is None:
+                entry["data"] = data
+                self.restored += 1
+        self._remove_spill(sid)
+        return entry["data"]
+
+    def blob(self, sid: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(sid)
+            return entry["blob"] if entry else None
+
+    def discard(self, sid: str):
+        """Сессия больше не нужна (заявка отправлена)."""
+        with self._lock:
+            entry = self._entries.pop(sid, None)
+        if entry is not None:
+            self._remove_spill(sid)
+            self._release_blob(entry["blob"])
+
+    # ── Сброс и удаление по простою ──
+    def reap(self, now: float | None = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            to_drop = [sid for sid, e in self._entries.items() if now - e["last"] > self.drop_after]
+            to_spill = [(sid, e["data"]) for sid, e in self._entries.items()
+                        if e["data"] is not None and now - e["last"] > self.spill_after and sid not in to_drop]
+        for sid in to_drop:
+            self.discard(sid)
+            self.dropped += 1
+        spilled = 0
+        for sid, data in to_spill:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            path = self._spill_path(sid)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+            with self._lock:
+                entry = self._entries.get(sid)
+                # За время записи сессия могла ожить или получить новые данные
+                if entry is not None and entry["data"] is data and now - entry["last"] > self.spill_after:
+                    entry["data"] = None
+                    spilled += 1
+                    continue
+            self._remove_spill(sid)
+        self.spilled += spilled
+        return {"spilled": spilled, "dropped": len(to_drop), "blobs_removed": self._sweep_blobs(now)}
+
+    def _sweep_blobs(self, now: float) -> int:
+        # Файлы без сессии (загружены после отправки заявки или при сбое процесса)
+        if not os.path.isdir(BLOB_DIR):
+            return 0
+        with self._lock:
+            live = {e["blob"] for e in self._entries.values()}
+        removed = 0
+        for name in os.listdir(BLOB_DIR):
+            path = os.path.join(BLOB_DIR, name)
+            try:
+                if name not in live and now - os.path.getmtime(path) > self.drop_after:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _run(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            try:
+                result = self.reap()
+                if any(result.values()):
+                    logger.info(f"Сессии кандидатов: сброшено на диск {result['spilled']}, "
+                                f"удалено {result['dropped']}, файлов резюме удалено {result['blobs_removed']}")
+            except Exception:
+                logger.error("Не удалось обработать простаивающие сессии", exc_info=True)
+
+    def _spill_path(self, sid: str) -> str:
+        return os.path.join(SPILL_DIR, f"{sid}.pkl")
+
+    def _remove_spill(self, sid: str):
+        try:
+            os.remove(self._spill_path(sid))
+        except FileNotFoundError:
+            pass
+
+    def _release_blob(self, handle: str):
+        with self._lock:
+            if any(e["blob"] == handle for e in self._entries.values()):
+                return
+        try:
+            os.remove(blob_path(handle))
+        except FileNotFoundError:
+            pass
+
+    # ── Отчёт для администратора ──
+    def report(self) -> list[dict]:
+        """Память по каждой сессии: данные в процессе, на диске и файл резюме."""
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+        rows = []
+        for sid, e in entries:
+            data = e["data"]
+            spill = self._spill_path(sid)
+            blob = blob_path(e["blob"])
+            rows.append({
+                "session": sid[:8],
+                "state": "memory" if data is not None else "disk",
+                "idle_s": round(now - e["last"]),
+                "memory_bytes": sum(approx_size(v) for v in data.values()) if data is not None else 0,
+                "spill_bytes": os.path.getsize(spill) if data is None and os.path.exists(spill) else 0,
+                "blob_bytes": os.path.getsize(blob) if os.path.exists(blob) else 0,
+            })
+        return sorted(rows, key=lambda r: r["memory_bytes"], reverse=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_memory = sum(e["data"] is not None for e in self._entries.values())
+            return {"sessions": len(self._entries), "in_memory": in_memory,
+                    "on_disk": len(self._entries) - in_memory, "spilled": self.spilled,
+                    "restored": self.restored, "dropped": self.dropped}
+
+
+candidate_sessions = SessionStore()
@@ -0,0 +1,231 @@
+"""
+Хранилище эмбеддингов резюме и поиск похожих кандидатов.
+
+Эмбеддинг — усреднённое скрытое состояние последнего слоя модели,
+считается в том же прогоне, что и вероятности компетенций. В БД хранится
+L2-нормированный вектор, квантованный в int8 со своим масштабом на вектор
+(max|v| → 127): у 768-мерного вектора компоненты порядка 0.04, и общий
+множитель 127 оставлял бы на них 3 бита точности.
+Поиск — точный top-k скалярным произведением в NumPy; при большом архиве
+и установленном hnswlib строится HNSW-индекс.
+
+    python -m utils.vector_store migrate    # разово: таблица resume_embeddings
+    python -m utils.vector_store backfill   # эмбеддинги для старых заявок (и без scale)
+"""
+import time
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from utils.constants import MODEL_VERSION
+from utils.schema import Schema, connection, run_migrate
+
+logger = logging.getLogger(__name__)
+
+# С какого размера архива строить HNSW (если установлен hnswlib)
+HNSW_MIN_SIZE = 50_000
+
+# version растёт при каждой записи строки (и при обновлении эмбеддинга
+# дозагрузкой GitHub) — по нему индекс в памяти понимает, что пора перечитать
+VECTOR_SCHEMA_SQL = """
+CREATE SEQUENCE IF NOT EXISTS resume_embeddings_version_seq;
+CREATE TABLE IF NOT EXISTS resume_embeddings (
+    record_id     integer PRIMARY KEY,
+    model_version text    NOT NULL,
+    embedding     bytea   NOT NULL,
+    scale         real,
+    version       bigint  DEFAULT nextval('resume_embeddings_version_seq')
+);
+"""
+
+# Для таблиц, созданных до появления version: без перезаписи строк
+VECTOR_VERSION_SQL = """
+ALTER TABLE resume_embeddings ADD COLUMN IF NOT EXISTS version bigint;
+ALTER TABLE resume_embeddings ALTER COLUMN version SET DEFAULT nextval('resume_embeddings_version_seq');
+"""
+# scale IS NULL — строка в старом формате с общим множителем 1/127
+VECTOR_SCALE_SQL = """
+ALTER TABLE resume_embeddings ADD COLUMN IF NOT EXISTS scale real;
+"""
+LEGACY_SCALE = 1.0 / 127.0
+
+SCHEMA = Schema("utils.vector_store", ["resume_embeddings.version", "resume_embeddings.scale"],
+                VECTOR_SCHEMA_SQL + VECTOR_VERSION_SQL + VECTOR_SCALE_SQL)
+ensure_schema = SCHEMA.ensure
+migrate = SCHEMA.migrate
+
+
+# ─── Квантование ──────────────────────────────────────────────────────────────
+def normalize(v: np.ndarray) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.maximum(norm, 1e-12)
+
+def quantize(v: np.ndarray) -> tuple[bytes, float]:
+    """Нормированный вектор → (int8, scale): наибольшая по модулю компонента → ±127."""
+    v = normalize(v)
+    scale = max(float(np.abs(v).max()), 1e-12) / 127.0
+    return np.clip(np.round(v / scale), -127, 127).astype(np.int8).tobytes(), scale
+
+def dequantize(raw: bytes, scale: float | None) -> np.ndarray:
+    return np.frombuffer(raw, dtype=np.int8).astype(np.float32) * (LEGACY_SCALE if scale is None else scale)
+
+
+# ─── Запись ───────────────────────────────────────────────────────────────────
+def save_embedding(cur, record_id: int, embedding: np.ndarray, model_version: str = MODEL_VERSION):
+    raw, scale = quantize(embedding)
+    cur.execute(
+        "INSERT INTO resume_embeddings (record_id, model_version, embedding, scale) VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT (record_id) DO UPDATE SET model_version = EXCLUDED.model_version, "
+        "embedding = EXCLUDED.embedding, scale = EXCLUDED.scale, "
+        "version = nextval('resume_embeddings_version_seq')",
+        (record_id, model_version, raw, scale),
+    )
+
+
+# ─── Индекс в памяти процесса ─────────────────────────────────────────────────
+class VectorIndex:
+    """
+    Матрица int8 всех эмбеддингов одной версии модели и масштабы строк
+    (сходство = (matrix @ q) * scales). Перечитывается из БД,
+    только если изменились число строк или сумма их version (она растёт и при
+    перезаписи эмбеддинга существующей заявки).
+    """
+
+    def __init__(self, model_version: str = MODEL_VERSION):
+        self.model_version = model_version
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, 0), dtype=np.int8)
+        self.scales = np.empty(0, dtype=np.float32)
+        self._version = None
+        self._hnsw = None
+        self._lock = threading.Lock()
+
+    def refresh(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT count(*), coalesce(sum(version), 0) FROM resume_embeddings WHERE model_version = %s",
+                (self.model_version,),
+            )
+            version = cur.fetchone()
+            if version == self._version:
+                return
+            cur.execute(
+                "SELECT record_id, embedding, scale FROM resume_embeddings WHERE model_version = %s ORDER BY record_id",
+                (self.model_version,),
+            )
+            rows = cur.fetchall()
+        with self._lock:
+            self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+            self.matrix = (np.stack([np.frombuffer(bytes(r[1]), dtype=np.int8) for r in rows])
+                           if rows else np.empty((0, 0), dtype=np.int8))
+            self.scales = np.array([LEGACY_SCALE if r[2] is None else r[2] for r in rows], dtype=np.float32)
+            self._hnsw = self._build_hnsw()
+            self._version = version
+
+    def _build_hnsw(self):
+        if len(self.ids) < HNSW_MIN_SIZE:
+            return None
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+        started = time.perf_counter()
+        index = hnswlib.Index(space="ip", dim=self.matrix.shape[1])
+        index.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+        index.add_items(self.matrix.astype(np.float32) * self.scales[:, None], np.arange(len(self.ids)))
+        index.set_ef(64)
+        logger.info(f"HNSW-индекс на {len(self.ids)} векторов за {time.perf_counter() - started:.1f} с")
+        return index
+
+    def search(self, query: np.ndarray, k: int = 10, exclude_id: int | None = None) -> list[tuple[int, float]]:
+        """Возвращает [(record_id, косинусное сходство)] по убыванию."""
+        with self._lock:
+            if not len(self.ids):
+                return []
+            q = normalize(query)
+            extra = 1 if exclude_id is not None else 0
+            k_eff = min(k + extra, len(self.ids))
+            if self._hnsw is not None:
+                labels, dists = self._hnsw.knn_query(q.reshape(1, -1), k=k_eff)
+                pos, scores = labels[0], 1.0 - dists[0]
+            else:
+                # int8 · float32 одним матричным умножением по всему архиву
+                scores_all = (self.matrix @ q) * self.scales
+                pos = np.argpartition(-scores_all, k_eff - 1)[:k_eff]
+                pos = pos[np.argsort(-scores_all[pos])]
+                scores = scores_all[pos]
+            found = [(int(self.ids[p]), float(s)) for p, s in zip(pos, scores)
+                     if int(self.ids[p]) != exclude_id]
+        return found[:k]
+
+    def vector_of(self, record_id: int) -> np.ndarray | None:
+        with self._lock:
+            hit = np.flatnonzero(self.ids == record_id)
+            if not len(hit):
+                return None
+            return self.matrix[hit[0]].astype(np.float32) * self.scales[hit[0]]
+
+
+_index = VectorIndex()
+
+def get_index(conn) -> VectorIndex:
+    ensure_schema(conn)
+    _index.refresh(conn)
+    return _index
+
+
+# ─── Дозаполнение ─────────────────────────────────────────────────────────────
+def backfill(conn=None, batch_size: int = 16) -> int:
+    from utils.ingest import extract_text_from_bytes
+    from utils.cv_reader import preprocess_text
+    from utils.model import load_configured, predict_batch
+
+    done = 0
+    with connection(conn) as conn:
+        ensure_schema(conn)
+        tokenizer, model = load_configured()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT r.id FROM resume_records r
+                LEFT JOIN resume_embeddings e ON e.record_id = r.id AND e.model_version = %s
+                WHERE (e.record_id IS NULL OR e.scale IS NULL) AND r.cv_file IS NOT NULL
+                ORDER BY r.id
+            """, (MODEL_VERSION,))
+            todo = [r[0] for r in cur]
+        for start in range(0, len(todo), batch_size):
+            ids, texts = [], []
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, original_filename, cv_file FROM resume_records WHERE id = ANY(%s)",
+                            (todo[start:start + batch_size],))
+                for record_id, filename, blob in cur.fetchall():
+                    text = extract_text_from_bytes(filename or "cv.txt", bytes(blob))
+                    if text:
+                        ids.append(record_id)
+                        texts.append(preprocess_text(text))
+                if texts:
+                    _, embeddings = predict_batch(tokenizer, model, texts, return_embeddings=True)
+                    for record_id, emb in zip(ids, embeddings):
+                        save_embedding(cur, record_id, emb)
+            conn.commit()
+            done += len(ids)
+            logger.info(f"Эмбеддинги посчитаны для {done} из {len(todo)} заявок")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Эмбеддинги резюме")
+    parser.add_argument("command", choices=["migrate", "backfill"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    if args.command == "migrate":
+        run_migrate(SCHEMA)
+        return
+    print(f"Посчитано эмбеддингов: {backfill(batch_size=args.batch_size)}")
+
+
+if __name__ == "__main__":
+    main()
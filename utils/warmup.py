@@ -0,0 +1,76 @@
+"""
+Холодный старт: прогрев модели до того, как Streamlit начнёт принимать запросы.
+
+    # Загрузить и прогреть модель в этом же процессе, затем запустить сервер
+    python -m utils.warmup -- --server.port 8501
+
+    # Только замерить время импорта и время до первого результата
+    python -m utils.warmup --measure
+
+Streamlit перезапускает app.py на каждое действие, но модули из utils живут
+в процессе, поэтому прогретая здесь модель подхватывается `_load_model`.
+"""
+import sys
+import time
+import logging
+import argparse
+import importlib
+
+logger = logging.getLogger(__name__)
+
+# Модули, которые тянет каждая роль; замеряем их импорт отдельно
+ROLE_MODULES = {
+    "общие": ["streamlit", "utils.constants"],
+    "кандидат": ["utils.cached_app_utils", "utils.pipeline"],
+    "HR": ["pandas", "matplotlib.pyplot", "mplcyberpunk", "utils.email"],
+}
+
+
+def measure_imports() -> dict:
+    timings = {}
+    for role, modules in ROLE_MODULES.items():
+        started = time.perf_counter()
+        for name in modules:
+            importlib.import_module(name)
+        timings[role] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def warm() -> dict:
+    from utils.model import warm_up_model
+    started = time.perf_counter()
+    report = {"imports_s": measure_imports()}
+    report.update(warm_up_model())
+    report["time_to_first_result_s"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогрев модели и запуск Streamlit")
+    parser.add_argument("--measure", action="store_true", help="только вывести замеры и выйти")
+    parser.add_argument("streamlit_args", nargs="*", help="аргументы для `streamlit run app.py`")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+    report = warm()
+    logger.info(f"Прогрев завершён: {report}")
+    if args.measure:
+        for key, value in report.items():
+            print(f"{key}: {value}")
+        return
+
+    # Воркер очереди GitHub — сразу, чтобы задания до перезапуска не ждали первой заявки
+    from utils.constants import GITHUB_ENRICHMENT
+    if GITHUB_ENRICHMENT == "async":
+        from utils.enrichment import start_background_worker
+        from utils.model import get_warm_model
+        start_background_worker(get_warm_model)
+
+    # Сервер поднимается в этом же процессе — прогретая модель уже в памяти
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", "app.py", *args.streamlit_args]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()